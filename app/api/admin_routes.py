@@ -0,0 +1,114 @@
+import json
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from app.auth.dependencies import get_current_admin
+from app.core.fairness import rate_limiter
+from app.core.profiling import profile_path, summary_path
+from app.schemas.models import ModelInfo, ModelLoadRequest, ShadowRequest
+from app.services.patterns import PatternError, pattern_registry
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+def _existing(path_fn, profile_id: str) -> str:
+    try:
+        path = path_fn(profile_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid profile id")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return path
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile_summary(profile_id: str, admin = Depends(get_current_admin)):
+    with open(_existing(summary_path, profile_id)) as fh:
+        return json.load(fh)
+
+
+@router.get("/profiles/{profile_id}/download")
+def download_profile(profile_id: str, admin = Depends(get_current_admin)):
+    return FileResponse(
+        _existing(profile_path, profile_id),
+        media_type="application/octet-stream",
+        filename=f"{profile_id}.prof"
+    )
+
+
+# -------------------------------
+# Model registry
+# -------------------------------
+def _registry_call(fn, *args):
+    try:
+        return fn(*args)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/models")
+def list_models(request: Request, admin = Depends(get_current_admin)):
+    return request.app.state.model_registry.status()
+
+
+@router.post("/models/shadow")
+def start_shadow(request: Request, payload: ShadowRequest, admin = Depends(get_current_admin)):
+    registry = request.app.state.model_registry
+    return _registry_call(registry.start_shadow, payload.name, payload.sample_rate).stats()
+
+
+@router.delete("/models/shadow")
+def stop_shadow(request: Request, admin = Depends(get_current_admin)):
+    stats = request.app.state.model_registry.stop_shadow()
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No shadow run active")
+    return stats
+
+
+@router.post("/models", response_model=ModelInfo, status_code=202)
+def load_model(request: Request, payload: ModelLoadRequest, admin = Depends(get_current_admin)):
+    registry = request.app.state.model_registry
+    return _registry_call(registry.load, payload.name, payload.path).to_dict()
+
+
+@router.post("/models/{name}/activate", response_model=ModelInfo)
+def activate_model(request: Request, name: str, admin = Depends(get_current_admin)):
+    registry = request.app.state.model_registry
+    return _registry_call(registry.activate, name).to_dict()
+
+
+@router.delete("/models/{name}", status_code=204)
+def unload_model(request: Request, name: str, admin = Depends(get_current_admin)):
+    _registry_call(request.app.state.model_registry.unload, name)
+
+
+# -------------------------------
+# Regex patterns
+# -------------------------------
+@router.get("/patterns")
+def pattern_status(admin = Depends(get_current_admin)):
+    return pattern_registry.status()
+
+
+@router.post("/patterns/reload")
+def reload_patterns(admin = Depends(get_current_admin)):
+    try:
+        pattern_registry.reload()
+    except PatternError as e:
+        raise HTTPException(status_code=422, detail=f"Pattern file rejected: {e}")
+    return pattern_registry.status()
+
+
+# -------------------------------
+# Inference capacity
+# -------------------------------
+@router.get("/inference")
+def inference_status(request: Request, admin = Depends(get_current_admin)):
+    return {
+        "slots": request.app.state.pii_pipeline.slots.stats(),
+        "rate_limit": rate_limiter.stats(),
+    }
@@ -0,0 +1,40 @@
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+
+from app.auth.dependencies import get_user_from_token, is_admin
+from app.core.config import METRICS_TOKEN
+from app.core.metrics import REGISTRY, DB_POOL_CONNECTIONS, render_metrics
+from app.db.database import get_db, get_pool_stats
+
+router = APIRouter(tags=["Monitoring"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _collect_db_pool():
+    for engine_name, stats in get_pool_stats().items():
+        for state in ("checked_in", "checked_out", "overflow"):
+            DB_POOL_CONNECTIONS.labels(engine_name, state).set(stats[state])
+
+REGISTRY.add_collector(_collect_db_pool)
+
+
+def require_scraper(authorization: str = Header(None), db: Session = Depends(get_db)):
+    """METRICS_TOKEN as a bearer token, or an admin's access token."""
+    token = authorization[7:] if authorization and authorization.lower().startswith("bearer ") else ""
+    if not token:
+        raise HTTPException(
+            status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"}
+        )
+    if METRICS_TOKEN and hmac.compare_digest(token.encode("utf-8"), METRICS_TOKEN.encode("utf-8")):
+        return
+    if not is_admin(get_user_from_token(db, token)):
+        raise HTTPException(status_code=403, detail="Metrics require admin privileges or METRICS_TOKEN")
+
+
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_scraper)])
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,20 +1,29 @@
-from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form, Depends, Query
 from sqlalchemy.orm import Session
 import json
-import io
 
-from app.core.config import MAX_PLAIN_TEXT_LENGTH
+from app.core.config import (
+    MAX_PLAIN_TEXT_LENGTH,
+    PREVIEW_PDF_WINDOW,
+    PREVIEW_DOCX_WINDOW,
+    PREVIEW_MAX_WINDOW
+)
+from app.core.doc_cache import document_cache
+from app.core.fairness import rate_limiter, set_flow, ANONYMOUS_USER
 from app.schemas.redact import RedactRequest, RedactResponse
 from app.utils.csv_writer import create_redacted_csv
 
 from app.utils.docx_redactor import (
     redact_docx_paragraphwise,
-    redact_docx_preview
+    redact_docx_preview,
+    cached_docx
 )
 
 from app.utils.redaction_helper import redaction_helper
-from app.utils.file_size_validator import file_size_validator
+from app.utils.span_preview import load_units, preview_spans, decode_cursor, CursorError
+from app.utils.upload_reader import read_upload
+from app.utils.stream_redactor import StreamRedaction, DuplexStreamingResponse, STREAM_FORMATS
+from app.utils.output_stream import make_buffer_response, buffer_response, json_response, negotiate_encoding, compress_stream
 from app.services.file_extractors.csv_extractor import (
     extract_redacted_csv_data,
     get_csv_columns,
@@ -23,13 +32,69 @@ from app.services.file_extractors.csv_extractor import (
 
 from app.services.file_extractors.docx_extractor import extract_text_from_docx
 
-from app.db.database import get_db
+from app.db.database import get_db, run_db
+from starlette.concurrency import run_in_threadpool
 from app.schemas.user import UserStats
 from app.db.crud import create_redaction_log, get_user_stats, check_user_upload_limit
 from app.auth.dependencies import get_current_user
 
 router = APIRouter()
 
+def _pseudonym_scope(request: Request, pseudonymize: str, user=None):
+    """None, a per-request document scope, or the user's tenant scope."""
+    try:
+        return request.app.state.pseudonymizer.scope(
+            pseudonymize or None, str(user.id) if user is not None else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _preview_scope(request: Request, pseudonymize: str):
+    # Previews never add values to a tenant map
+    return _pseudonym_scope(request, "document" if pseudonymize else None)
+
+def _schedule(request: Request, kind: str, user=None):
+    """
+    Applies the caller's processing rate limit (429 when exhausted) and tags
+    this request's model calls for fair scheduling. Unauthenticated previews
+    share one flow; only their rate-limit bucket is keyed by client address.
+    """
+    if user is not None:
+        rate_limiter.admit(str(user.id))
+        set_flow(str(user.id), kind)
+        return
+    bucket = f"ip:{request.client.host if request.client else 'unknown'}"
+    rate_limiter.admit(bucket, ANONYMOUS_USER)
+    set_flow(ANONYMOUS_USER, kind, bucket)
+
+PREVIEW_FORMATS = ("text", "spans")
+DEFAULT_PREVIEW_WINDOWS = {"pdf": PREVIEW_PDF_WINDOW, "docx": PREVIEW_DOCX_WINDOW}
+
+def _preview_format(format: str) -> str:
+    format = (format or "text").lower()
+    if format not in PREVIEW_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(PREVIEW_FORMATS)}")
+    return format
+
+def _preview_window(window: int, kind: str) -> int:
+    if window is None:
+        return DEFAULT_PREVIEW_WINDOWS[kind]
+    if not 1 <= window <= PREVIEW_MAX_WINDOW:
+        raise HTTPException(status_code=400, detail=f"window must be between 1 and {PREVIEW_MAX_WINDOW}")
+    return window
+
+def _preview_client(request: Request) -> str:
+    # Span preview cursors are only valid for the client that started the preview
+    return request.client.host if request.client else "unknown"
+
+async def _span_preview(request: Request, kind: str, source, cached, entity_list, start: int, window: int):
+    def run():
+        load_units(kind, source, cached)
+        return preview_spans(
+            cached, kind, request.app.state.pii_pipeline, entity_list, start, window, _preview_client(request)
+        )
+    return await json_response(request, await run_in_threadpool(run))
+
 # Plain text redaction
 @router.post("/redact")
 def redact_plain_text(
@@ -49,9 +114,11 @@ def redact_plain_text(
             status_code=413,
             detail=f"Input text exceeds maximum allowed length of {MAX_PLAIN_TEXT_LENGTH} characters"
         )
+    _schedule(request, "interactive", current_user)
+    pseudonyms = _pseudonym_scope(request, payload.pseudonymize, current_user)
     try:
         pipeline = request.app.state.pii_pipeline
-        result = redaction_helper(payload.text, pipeline, payload.selected_entities)
+        result = redaction_helper(payload.text, pipeline, payload.selected_entities, pseudonyms)
 
         create_redaction_log(
         db=db,
@@ -60,21 +127,80 @@ def redact_plain_text(
         source_name="plain_text",
         entity_count=len(result.entities)
         )
-        return StreamingResponse(
-            io.StringIO(result.redacted_text),
-            media_type="text/plain"
+        return make_buffer_response(
+            request,
+            result.redacted_text.encode("utf-8"),
+            media_type="text/plain; charset=utf-8"
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Redaction failed: {str(e)}"
         )
 
+# Streaming line / NDJSON redaction
+@router.post("/redact/stream")
+async def redact_text_stream(
+    request: Request,
+    format: str = Query(None),
+    include_entities: bool = Query(False),
+    selected_entities: str = Query(None),
+    pseudonymize: str = Query(None),
+    current_user = Depends(get_current_user)
+):
+    if not await run_db(check_user_upload_limit, current_user.id):
+        raise HTTPException(status_code=429, detail="Daily upload limit reached")
+
+    _schedule(request, "bulk", current_user)
+    pseudonyms = _pseudonym_scope(request, pseudonymize, current_user)
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "lines"
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(STREAM_FORMATS)}")
+
+    entity_list = None
+    if selected_entities:
+        entity_list = [e.strip() for e in selected_entities.split(",") if e.strip()] or None
+
+    stream = StreamRedaction(
+        pipeline=request.app.state.pii_pipeline,
+        fmt=format,
+        selected_entities=entity_list,
+        include_entities=include_entities,
+        pseudonyms=pseudonyms
+    )
+
+    async def body():
+        async for chunk in stream.run(request.stream()):
+            yield chunk
+
+        await run_db(
+            create_redaction_log,
+            user_id=current_user.id,
+            input_type="stream",
+            source_name=f"stream:{format}",
+            entity_count=stream.entity_count
+        )
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is None:
+        return DuplexStreamingResponse(body(), media_type=stream.media_type)
+    return DuplexStreamingResponse(
+        compress_stream(body(), encoding),
+        media_type=stream.media_type,
+        headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+    )
+
 # PDF redaction
 from app.utils.pdf_redactor import (
     redact_pdf_file as redact_pdf_file_util,
-    redact_pdf_preview
+    redact_pdf_preview,
+    detect_pdf_entity_types,
+    cached_pdf
 )
 
 @router.post("/pdf")
@@ -82,17 +208,19 @@ async def redact_pdf_file(
     request: Request,
     file: UploadFile = File(...),
     selected_entities: str = Form(None),
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    pseudonymize: str = Form(None),
+    current_user = Depends(get_current_user)
 ):
-    if not check_user_upload_limit(db, current_user.id):
+    if not await run_db(check_user_upload_limit, current_user.id):
         raise HTTPException(status_code=429, detail="Daily upload limit reached")
 
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
 
-    file_bytes = await file.read()
-    await file_size_validator(file_bytes)
+    _schedule(request, "bulk", current_user)
+    pseudonyms = _pseudonym_scope(request, pseudonymize, current_user)
+
+    upload = await read_upload(file)
 
     try:
         pipeline = request.app.state.pii_pipeline
@@ -109,26 +237,29 @@ async def redact_pdf_file(
                     detail="Invalid selected_entities format"
                 )
 
-        pdf_file, entity_count = redact_pdf_file_util(
-            file_bytes=file_bytes,
+        pdf_file, entity_count = await run_in_threadpool(
+            redact_pdf_file_util,
+            source=upload.source,
             pipeline=pipeline,
-            selected_entities=entity_list
+            selected_entities=entity_list,
+            cached=cached_pdf(upload.source, digest=upload.sha256),
+            pseudonyms=pseudonyms
         )
         
-        create_redaction_log(
-            db=db,
+        await run_db(
+            create_redaction_log,
             user_id=current_user.id,
             input_type="pdf",
             source_name=file.filename,
             entity_count=entity_count
         )
 
-        return StreamingResponse(
+        return await buffer_response(
+            request,
             pdf_file,
             media_type="application/pdf",
-            headers={
-                "Content-Disposition": "attachment; filename=redacted.pdf"
-            }
+            filename="redacted.pdf",
+            compressible=False
         )
 
     except HTTPException:
@@ -138,17 +269,25 @@ async def redact_pdf_file(
             status_code=500,
             detail=f"PDF Redaction Failed: {str(e)}"
         )
+    finally:
+        upload.close()
 
 @router.post("/preview/pdf")
 async def redact_pdf_preview_endpoint(
     request: Request,
     file: UploadFile = File(...),
-    selected_entities: str = Form(None)
+    selected_entities: str = Form(None),
+    pseudonymize: str = Form(None),
+    format: str = Form("text"),
+    window: int = Form(None)
 ):
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    format = _preview_format(format)
+    window = _preview_window(window, "pdf")
+    _schedule(request, "interactive")
 
-    file_bytes = await file.read()
+    upload = await read_upload(file)
     
     try:
         pipeline = request.app.state.pii_pipeline
@@ -162,13 +301,20 @@ async def redact_pdf_preview_endpoint(
              except json.JSONDecodeError:
                 raise HTTPException(status_code=400, detail="Invalid selected_entities format")
 
-        preview_text = redact_pdf_preview(
-            file_bytes=file_bytes,
+        cached = cached_pdf(upload.source, digest=upload.sha256)
+        if format == "spans":
+            return await _span_preview(request, "pdf", upload.source, cached, entity_list, 0, window)
+
+        preview_text = await run_in_threadpool(
+            redact_pdf_preview,
+            source=upload.source,
             pipeline=pipeline,
-            selected_entities=entity_list
+            selected_entities=entity_list,
+            cached=cached,
+            pseudonyms=_preview_scope(request, pseudonymize)
         )
         
-        return {"preview_text": preview_text}
+        return await json_response(request, {"preview_text": preview_text})
             
     except HTTPException:
         raise
@@ -177,6 +323,8 @@ async def redact_pdf_preview_endpoint(
             status_code=500,
             detail=f"PDF Preview Failed: {str(e)}"
         )
+    finally:
+        upload.close()
 
 # DOCX redaction
 @router.post("/docx")
@@ -184,50 +332,61 @@ async def redact_docx_file(
     request: Request,
     file: UploadFile = File(...),
     selected_entities: str = Form(None),
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    pseudonymize: str = Form(None),
+    current_user = Depends(get_current_user)
 ):
-    if not check_user_upload_limit(db, current_user.id):
+    if not await run_db(check_user_upload_limit, current_user.id):
         raise HTTPException(status_code=429, detail="Daily upload limit reached")
 
-    file_bytes = await file.read()
-
+    _schedule(request, "bulk", current_user)
+    pseudonyms = _pseudonym_scope(request, pseudonymize, current_user)
     if not selected_entities:
         entity_list = None  
     else:
         parsed = json.loads(selected_entities)
         entity_list = parsed if parsed else None
 
-    docx_file, entity_count = redact_docx_paragraphwise(
-        original_doc_bytes=file_bytes,
-        pipeline=request.app.state.pii_pipeline,
-        selected_entities=entity_list
-    )
+    upload = await read_upload(file)
+    try:
+        docx_file, entity_count = await run_in_threadpool(
+            redact_docx_paragraphwise,
+            source=upload.source,
+            pipeline=request.app.state.pii_pipeline,
+            selected_entities=entity_list,
+            pseudonyms=pseudonyms,
+            cached=cached_docx(upload.source, digest=upload.sha256)
+        )
+    finally:
+        upload.close()
 
-    create_redaction_log(
-        db=db,
+    await run_db(
+        create_redaction_log,
         user_id=current_user.id,
         input_type="docx",
         source_name=file.filename,
         entity_count=entity_count
     )
 
-    return StreamingResponse(
+    return await buffer_response(
+        request,
         docx_file,
         media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        headers={
-            "Content-Disposition": "attachment; filename=redacted.docx"
-        }
+        filename="redacted.docx",
+        compressible=False
     )
 
 @router.post("/preview/docx")
 async def redact_docx_preview_endpoint(
     request: Request,
     file: UploadFile = File(...),
-    selected_entities: str = Form(None)
+    selected_entities: str = Form(None),
+    pseudonymize: str = Form(None),
+    format: str = Form("text"),
+    window: int = Form(None)
 ):
-    file_bytes = await file.read()
-
+    format = _preview_format(format)
+    window = _preview_window(window, "docx")
+    _schedule(request, "interactive")
     if not selected_entities:
         entity_list = None
     else:
@@ -237,15 +396,55 @@ async def redact_docx_preview_endpoint(
         except json.JSONDecodeError:
            raise HTTPException(status_code=400, detail="Invalid selected_entities format")
 
+    upload = await read_upload(file)
     try:
-        preview_text = redact_docx_preview(
-            original_doc_bytes=file_bytes,
+        cached = cached_docx(upload.source, digest=upload.sha256)
+        if format == "spans":
+            return await _span_preview(request, "docx", upload.source, cached, entity_list, 0, window)
+
+        preview_text = await run_in_threadpool(
+            redact_docx_preview,
+            source=upload.source,
             pipeline=request.app.state.pii_pipeline,
-            selected_entities=entity_list
+            selected_entities=entity_list,
+            pseudonyms=_preview_scope(request, pseudonymize),
+            cached=cached
         )
-        return {"preview_text": preview_text}
+        return await json_response(request, {"preview_text": preview_text})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        upload.close()
+
+# Next window of a span preview
+@router.get("/preview/spans")
+async def preview_spans_endpoint(
+    request: Request,
+    cursor: str = Query(...),
+    window: int = Query(None)
+):
+    try:
+        state = decode_cursor(cursor, _preview_client(request))
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    window = _preview_window(window if window is not None else state["window"], state["kind"])
+    _schedule(request, "interactive")
+
+    # Only documents a preview already loaded can be resumed
+    cached = document_cache.get(state["key"])
+    if cached is None or cached.pages is None:
+        raise HTTPException(status_code=410, detail="Preview expired; upload the file again")
+
+    try:
+        return await _span_preview(
+            request, state["kind"], None, cached, state["selected_entities"], state["start"], window
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Span Preview Failed: {str(e)}")
 
 # CSV column fetch
 @router.post("/csv/columns")
@@ -253,13 +452,15 @@ async def get_csv_column_names(file: UploadFile = File(...)):
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only CSV files are supported")
    
-    file_bytes = await file.read()
+    upload = await read_upload(file)
 
     try:
-        columns = get_csv_columns(file_bytes)
+        columns = get_csv_columns(upload.source)
         return {"columns": columns}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        upload.close()
 
 # CSV redaction
 @router.post("/redact/csv")
@@ -267,29 +468,41 @@ async def redact_csv_file(
     request: Request,
     file: UploadFile = File(...),
     selected_columns: str = Form(...),
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    mode: str = Form("mask"),
+    selected_entities: str = Form(None),
+    pseudonymize: str = Form(None),
+    current_user = Depends(get_current_user)
 ):
-    if not check_user_upload_limit(db, current_user.id):
+    if not await run_db(check_user_upload_limit, current_user.id):
         raise HTTPException(status_code=429, detail="Daily upload limit reached")
 
     if not file.filename.lower().endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only CSV files are supported")
 
-    file_bytes = await file.read()
+    _schedule(request, "bulk", current_user)
+    pseudonyms = _pseudonym_scope(request, pseudonymize, current_user)
+
+    upload = await read_upload(file)
 
     try:
         columns = json.loads(selected_columns)
-
-        headers, redacted_rows, entity_count = extract_redacted_csv_data(
-            file_bytes,
-            columns
+        entity_list = json.loads(selected_entities) if selected_entities else None
+
+        # Detect mode runs the model on every cell; keep it off the event loop
+        headers, redacted_rows, entity_count = await run_in_threadpool(
+            extract_redacted_csv_data,
+            upload.source,
+            columns,
+            mode=mode,
+            pipeline=request.app.state.pii_pipeline,
+            selected_entities=entity_list or None,
+            pseudonyms=pseudonyms
         )
 
         csv_file = create_redacted_csv(headers, redacted_rows)
 
-        create_redaction_log(
-            db=db,
+        await run_db(
+            create_redaction_log,
             user_id=current_user.id,
             input_type="csv",
             source_name=file.filename,
@@ -297,33 +510,54 @@ async def redact_csv_file(
             columns_redacted=columns
         )
 
-        return StreamingResponse(
+        return await buffer_response(
+            request,
             csv_file,
-            media_type="text/csv",
-            headers={
-                "Content-Disposition": "attachment; filename=redacted.csv"
-            }
+            media_type="text/csv; charset=utf-8",
+            filename="redacted.csv"
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        upload.close()
 
 @router.post("/preview/csv")
 async def redact_csv_preview(
+    request: Request,
     file: UploadFile = File(...),
-    selected_columns: str = Form(...)
+    selected_columns: str = Form(...),
+    mode: str = Form("mask"),
+    selected_entities: str = Form(None),
+    pseudonymize: str = Form(None)
 ):
     if not file.filename.lower().endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only CSV files are supported")
+    _schedule(request, "interactive")
 
-    file_bytes = await file.read()
+    upload = await read_upload(file)
 
     try:
         columns = json.loads(selected_columns)
-        preview_data = get_redacted_csv_preview(file_bytes, columns)
-        return preview_data
+        entity_list = json.loads(selected_entities) if selected_entities else None
+        preview_data = await run_in_threadpool(
+            get_redacted_csv_preview,
+            upload.source,
+            columns,
+            mode=mode,
+            pipeline=request.app.state.pii_pipeline,
+            selected_entities=entity_list or None,
+            pseudonyms=_preview_scope(request, pseudonymize)
+        )
+        return await json_response(request, preview_data)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        upload.close()
 
 @router.post("/detect/entities")
 async def detect_entities(
@@ -332,8 +566,11 @@ async def detect_entities(
     text: str = Form(None),
     current_user = Depends(get_current_user)
 ):
+    _schedule(request, "interactive", current_user)
+    upload = None
     try:
         content = ""
+        pdf_source = None
         
         if text:
             content = text
@@ -346,34 +583,42 @@ async def detect_entities(
                     detail="Only PDF and DOCX files are supported"
                 )
 
-            file_bytes = await file.read()
-            await file_size_validator(file_bytes)
+            upload = await read_upload(file)
 
             if filename.endswith(".pdf"):
-                import fitz
-                doc = fitz.open(stream=file_bytes, filetype="pdf")
-                for page in doc:
-                    content += page.get_text()
+                pdf_source = upload.source
             else:
-                content = extract_text_from_docx(file_bytes)
+                content = await run_in_threadpool(extract_text_from_docx, upload.source)
         else:
             raise HTTPException(
                 status_code=400,
                 detail="Either text or file must be provided"
             )
 
-        if not content.strip():
-            raise HTTPException(
-                status_code=400,
-                detail="No readable text found"
-            )
-
         pipeline = request.app.state.pii_pipeline
-        _, entities = pipeline.run(content)
 
-        detected_entities = sorted(
-            list({e.entity_type for e in entities})
-        )
+        if pdf_source is not None:
+            # Per-page detection through the document cache, so a following
+            # /preview/pdf or /pdf on the same file reuses it.
+            cached = cached_pdf(pdf_source, digest=upload.sha256)
+            entity_types = await run_in_threadpool(detect_pdf_entity_types, pdf_source, pipeline, cached=cached)
+            if not entity_types and not any(
+                p is not None and p.text.strip() for p in cached.pages
+            ):
+                raise HTTPException(
+                    status_code=400,
+                    detail="No readable text found"
+                )
+        else:
+            if not content.strip():
+                raise HTTPException(
+                    status_code=400,
+                    detail="No readable text found"
+                )
+            _, entities = await run_in_threadpool(pipeline.run, content)
+            entity_types = entities.entity_types()
+
+        detected_entities = sorted(entity_types)
 
         return {
             "detected_entities": detected_entities
@@ -386,6 +631,9 @@ async def detect_entities(
             status_code=500,
             detail=f"Entity detection failed: {str(e)}"
         )
+    finally:
+        if upload is not None:
+            upload.close()
 
 @router.get("/dashboard/user-stats", response_model=UserStats)
 def get_stats(
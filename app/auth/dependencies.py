@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from app.auth.jwt import decode_access_token
 from app.db.database import get_db
 from app.db.models import User
+from app.core.config import ADMIN_EMAILS
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
@@ -43,3 +44,21 @@ def get_current_user(
         )
     
     return user
+
+
+def is_admin(user) -> bool:
+    return bool(user and user.email and user.email.lower() in ADMIN_EMAILS)
+
+def get_current_admin(current_user = Depends(get_current_user)):
+    if not is_admin(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
+
+def get_user_from_token(db: Session, token: str):
+    payload = decode_access_token(token)
+    if not payload or not payload.get("sub"):
+        return None
+    return db.query(User).filter(User.id == int(payload["sub"])).first()
@@ -0,0 +1,370 @@
+# batch.py
+"""
+Offline batch redaction without the API: walks a directory (or reads a
+manifest of paths), redacts every PDF, DOCX, CSV and text file with a pool
+of worker processes, and mirrors the results into an output directory.
+
+    python -m app.cli.batch --input /archive/2023 --output /redacted/2023 --workers 4
+    python -m app.cli.batch --manifest todo.txt --output out --entities PERSON,EMAIL_ADDRESS
+    python -m app.cli.batch --input claims --output out --pseudonymize tenant --tenant acme
+
+Each worker loads its own PIIPipeline once. Progress is appended to
+<output>/.checkpoint.jsonl; rerunning the same command skips files that
+were already redacted and have not changed since. A summary with
+throughput numbers is written to <output>/summary.json.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = {".txt", ".log", ".md"}
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".csv"} | TEXT_EXTENSIONS
+CHECKPOINT_FILE = ".checkpoint.jsonl"
+SUMMARY_FILE = "summary.json"
+PSEUDONYM_DB_FILE = ".pseudonyms.sqlite"
+
+
+# -------------------------------
+# Inputs and checkpoint
+# -------------------------------
+def iter_directory(root: str, exclude: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """
+    (absolute path, path relative to root) for every supported file, in a
+    stable order. `exclude` (the output directory) is not descended into,
+    so `--input . --output ./out` doesn't redact its own results.
+    """
+    excluded = os.path.realpath(exclude) if exclude else None
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            d for d in dirnames if os.path.realpath(os.path.join(dirpath, d)) != excluded
+        )
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                path = os.path.join(dirpath, name)
+                yield path, os.path.relpath(path, root)
+
+
+def iter_manifest(manifest: str) -> Iterator[Tuple[str, str]]:
+    """One path per line; relative paths are resolved against the manifest's directory."""
+    base = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = line if os.path.isabs(line) else os.path.join(base, line)
+            rel = os.path.relpath(path, base) if not os.path.isabs(line) else line
+            yield path, _output_rel(rel)
+
+
+def _output_rel(rel: str) -> str:
+    """
+    `rel` made safe to join onto the output directory: drive and leading
+    separators are stripped and ".." components dropped, so manifest
+    entries like "../x.pdf" or "/a/../../b.pdf" land inside it.
+    """
+    rel = os.path.normpath(os.path.splitdrive(rel)[1]).lstrip("/\\")
+    parts = [p for p in rel.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    return os.path.join(*parts) if parts else "_"
+
+
+def _fingerprint(path: str) -> Optional[List[int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def load_checkpoint(path: str) -> Dict[str, list]:
+    """rel path -> fingerprint of every file that finished successfully."""
+    done: Dict[str, list] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn last line from an interrupted run
+                continue
+            if entry.get("status") == "ok":
+                done[entry["rel"]] = entry.get("fingerprint")
+            else:
+                done.pop(entry.get("rel"), None)
+    return done
+
+
+# -------------------------------
+# Worker side
+# -------------------------------
+_pipeline = None
+_pseudonymizer = None
+_options: dict = {}
+
+
+def _init_worker(options: dict):
+    global _pipeline, _pseudonymizer, _options
+    _options = options
+
+    from app.core.concurrency import InferenceSlots
+    from app.core.pipeline import PIIPipeline
+
+    # One inference slot per process; parallelism comes from the worker pool
+    threads = options.get("threads_per_worker") or max(1, (os.cpu_count() or 1) // options["workers"])
+    _pipeline = PIIPipeline(slots=InferenceSlots(slots=1, threads=threads, wait_seconds=0))
+
+    if options.get("pseudonymize"):
+        from app.services.pseudonymizer import Pseudonymizer
+        # Tenant maps go through the shared SQLite file so every worker hands
+        # out the same token for the same value
+        _pseudonymizer = Pseudonymizer(options["pseudonym_secret"], options.get("pseudonym_db"))
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.part"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def _redact_text_file(path: str, selected, pseudonyms) -> Tuple[bytes, int]:
+    from app.core.config import STREAM_BATCH_RECORDS
+    from app.utils.stream_redactor import StreamRedaction, parse_record
+
+    stream = StreamRedaction(_pipeline, "lines", selected_entities=selected, pseudonyms=pseudonyms)
+    out = []
+    entity_count = 0
+    batch = []
+    with open(path, encoding="utf-8", errors="replace", newline="") as fh:
+        for line in fh:
+            batch.append(parse_record(line.rstrip("\r\n"), "lines"))
+            if len(batch) >= STREAM_BATCH_RECORDS:
+                payload, count = stream.redact_batch(batch)
+                out.append(payload)
+                entity_count += count
+                batch = []
+    if batch:
+        payload, count = stream.redact_batch(batch)
+        out.append(payload)
+        entity_count += count
+    return b"".join(out), entity_count
+
+
+def redact_file(path: str, out_path: str) -> dict:
+    """Redact one file into out_path. Runs inside a worker process."""
+    ext = os.path.splitext(path)[1].lower()
+    selected = _options.get("entities")
+    start = time.perf_counter()
+    pseudonyms = None
+    if _pseudonymizer is not None:
+        pseudonyms = _pseudonymizer.scope(_options["pseudonymize"], _options.get("tenant"))
+
+    if ext == ".pdf":
+        from app.utils.pdf_redactor import redact_pdf_file
+        output, entity_count = redact_pdf_file(
+            source=path, pipeline=_pipeline, selected_entities=selected, pseudonyms=pseudonyms
+        )
+        data = output.getvalue()
+    elif ext == ".docx":
+        from app.utils.docx_redactor import redact_docx_paragraphwise
+        output, entity_count = redact_docx_paragraphwise(
+            source=path, pipeline=_pipeline, selected_entities=selected, pseudonyms=pseudonyms
+        )
+        data = output.getvalue()
+    elif ext == ".csv":
+        from app.services.file_extractors.csv_extractor import extract_redacted_csv_data, get_csv_columns
+        from app.utils.csv_writer import create_redacted_csv
+
+        wanted = _options.get("csv_columns") or []
+        columns = [c for c in get_csv_columns(path) if c in wanted]
+        if not columns:
+            return {"status": "skipped", "reason": "no --csv-columns in file", "seconds": 0.0}
+        headers, rows, entity_count = extract_redacted_csv_data(path, columns, pseudonyms=pseudonyms)
+        data = create_redacted_csv(headers, rows).getvalue().encode("utf-8")
+    else:
+        data, entity_count = _redact_text_file(path, selected, pseudonyms)
+
+    _write_atomic(out_path, data)
+    return {
+        "status": "ok",
+        "entities": entity_count,
+        "seconds": round(time.perf_counter() - start, 4),
+        "output_bytes": len(data),
+    }
+
+
+def _run_one(path: str, out_path: str) -> dict:
+    try:
+        return redact_file(path, out_path)
+    except Exception as e:
+        return {"status": "failed", "error": f"{type(e).__name__}: {e}", "seconds": 0.0}
+
+
+# -------------------------------
+# Driver
+# -------------------------------
+class Summary:
+    def __init__(self):
+        self.started = time.time()
+        self.by_type: Dict[str, Dict[str, float]] = {}
+        self.counts = {"ok": 0, "failed": 0, "skipped": 0, "resumed": 0}
+        self.input_bytes = 0
+        self.entities = 0
+        self.failures: List[dict] = []
+
+    def add(self, rel: str, ext: str, size: int, result: dict):
+        status = result["status"]
+        self.counts[status] += 1
+        if status == "failed":
+            self.failures.append({"file": rel, "error": result.get("error")})
+        if status != "ok":
+            return
+        self.input_bytes += size
+        self.entities += result.get("entities", 0)
+        t = self.by_type.setdefault(ext, {"files": 0, "bytes": 0, "seconds": 0.0, "entities": 0})
+        t["files"] += 1
+        t["bytes"] += size
+        t["seconds"] += result.get("seconds", 0.0)
+        t["entities"] += result.get("entities", 0)
+
+    def report(self, workers: int) -> dict:
+        wall = time.time() - self.started
+        by_type = {}
+        for ext, t in sorted(self.by_type.items()):
+            by_type[ext] = {
+                **t,
+                "seconds": round(t["seconds"], 3),
+                "mean_seconds_per_file": round(t["seconds"] / t["files"], 4) if t["files"] else None,
+            }
+        return {
+            "wall_seconds": round(wall, 3),
+            "workers": workers,
+            **self.counts,
+            "input_mb": round(self.input_bytes / (1024 * 1024), 3),
+            "entities": self.entities,
+            "files_per_s": round(self.counts["ok"] / wall, 3) if wall else None,
+            "mb_per_s": round(self.input_bytes / (1024 * 1024) / wall, 3) if wall else None,
+            "by_type": by_type,
+            "failures": self.failures,
+        }
+
+
+def run(args) -> dict:
+    os.makedirs(args.output, exist_ok=True)
+    checkpoint_path = os.path.join(args.output, CHECKPOINT_FILE)
+    if not args.resume and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    done = load_checkpoint(checkpoint_path)
+
+    files = iter_manifest(args.manifest) if args.manifest else iter_directory(args.input, args.output)
+    options = {
+        "entities": [e.strip() for e in args.entities.split(",") if e.strip()] if args.entities else None,
+        "csv_columns": [c.strip() for c in args.csv_columns.split(",") if c.strip()] if args.csv_columns else None,
+        "threads_per_worker": args.threads_per_worker,
+        "workers": args.workers,
+        "pseudonymize": args.pseudonymize,
+    }
+    if args.pseudonymize:
+        from app.core.config import PSEUDONYM_SECRET, PSEUDONYM_DB_PATH
+
+        secret = PSEUDONYM_SECRET
+        if not secret:
+            # Shared by this run's workers only; tokens won't match other runs
+            secret = os.urandom(32).hex()
+            logger.warning("PSEUDONYM_SECRET not set; pseudonyms are only consistent within this run")
+        options["pseudonym_secret"] = secret
+        options["tenant"] = args.tenant
+        if args.pseudonymize == "tenant":
+            options["pseudonym_db"] = args.pseudonym_db or PSEUDONYM_DB_PATH or os.path.join(
+                args.output, PSEUDONYM_DB_FILE
+            )
+    summary = Summary()
+    max_pending = args.workers * 4
+
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint, ProcessPoolExecutor(
+        max_workers=args.workers, initializer=_init_worker, initargs=(options,)
+    ) as pool:
+        pending = {}
+
+        def record(rel, ext, fingerprint, result):
+            summary.add(rel, ext, fingerprint[0] if fingerprint else 0, result)
+            checkpoint.write(json.dumps({"rel": rel, "fingerprint": fingerprint, **result}) + "\n")
+            checkpoint.flush()
+            if result["status"] == "failed":
+                logger.warning("%s: %s", rel, result.get("error"))
+
+        def drain(block: bool):
+            finished, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in finished:
+                rel, ext, fingerprint = pending.pop(future)
+                record(rel, ext, fingerprint, future.result())
+
+        for path, rel in files:
+            ext = os.path.splitext(path)[1].lower()
+            fingerprint = _fingerprint(path)
+            if fingerprint is None:
+                record(rel, ext, None, {"status": "failed", "error": "file not found", "seconds": 0.0})
+                continue
+            if ext not in SUPPORTED_EXTENSIONS:
+                record(rel, ext, fingerprint, {"status": "skipped", "reason": "unsupported type", "seconds": 0.0})
+                continue
+            if done.get(rel) == fingerprint:
+                summary.counts["resumed"] += 1
+                continue
+
+            # Keep the queue short so huge inputs are not materialised up front
+            while len(pending) >= max_pending:
+                drain(block=True)
+            future = pool.submit(_run_one, path, os.path.join(args.output, rel))
+            pending[future] = (rel, ext, fingerprint)
+
+        while pending:
+            drain(block=True)
+
+    report = summary.report(args.workers)
+    with open(os.path.join(args.output, SUMMARY_FILE), "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Redact a directory tree or manifest of files offline")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Directory to walk")
+    source.add_argument("--manifest", help="File with one input path per line")
+    parser.add_argument("--output", required=True, help="Directory for redacted files, checkpoint and summary")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Worker processes, each with its own model")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="torch intra-op threads per worker (default: CPUs / workers)")
+    parser.add_argument("--entities", help="Comma-separated entity types to redact (default: all)")
+    parser.add_argument("--csv-columns", help="Comma-separated CSV columns to redact; CSVs without any are skipped")
+    parser.add_argument("--pseudonymize", choices=("document", "tenant"),
+                        help="Replace entities with stable tokens ([NAME_17]) per file or across the whole run")
+    parser.add_argument("--tenant", default="batch", help="Tenant scope name for --pseudonymize tenant")
+    parser.add_argument("--pseudonym-db",
+                        help=f"SQLite token map for tenant scope (default: PSEUDONYM_DB_PATH or <output>/{PSEUDONYM_DB_FILE})")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="Ignore the checkpoint and redo every file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = parse_args(argv)
+    report = run(args)
+    print(json.dumps({k: v for k, v in report.items() if k != "failures"}, indent=2), file=sys.stderr)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+# patterns.py
+"""
+Validates a pattern file before it is deployed: compiles every pattern
+(defaults plus the file) and runs the catastrophic-backtracking check.
+
+    python -m app.cli.patterns patterns.json
+
+Exits non-zero if anything would be rejected by the running service.
+"""
+import argparse
+import json
+import sys
+
+from app.services.patterns import PatternError, compile_patterns, read_pattern_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a PII pattern file")
+    parser.add_argument("path", nargs="?", help="Pattern file (default: only the built-in patterns)")
+    args = parser.parse_args(argv)
+
+    try:
+        config = read_pattern_file(args.path) if args.path else None
+        detect, sweeps = compile_patterns(config)
+    except (PatternError, OSError) as e:
+        print(f"rejected: {e}", file=sys.stderr)
+        return 1
+
+    report = {
+        "patterns": {name: round(p.check_seconds * 1000, 3) for name, p in detect.items()},
+        "sweeps": {name: round(p.check_seconds * 1000, 3) for name, p in sweeps.items()},
+    }
+    print(json.dumps({"worst_check_ms": report}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
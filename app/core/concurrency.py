@@ -0,0 +1,198 @@
+# concurrency.py
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+
+from .config import (
+    PII_INFERENCE_SLOTS,
+    PII_TORCH_THREADS,
+    PII_TORCH_INTEROP_THREADS,
+    PII_SLOT_WAIT_SECONDS,
+)
+from .metrics import QUEUE_DEPTH, histogram
+from .fairness import FairScheduler, current_flow
+
+logger = logging.getLogger(__name__)
+
+SLOT_WAIT_SECONDS = histogram(
+    "pii_inference_slot_wait_seconds", "Time spent waiting for a free inference slot"
+)
+_waiting = QUEUE_DEPTH.labels("inference_wait")
+_running = QUEUE_DEPTH.labels("inference_running")
+
+_interop_configured = False
+_interop_lock = threading.Lock()
+
+
+class InferenceBusy(HTTPException):
+    """No inference slot became free within PII_SLOT_WAIT_SECONDS."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=503,
+            detail="All inference slots are busy, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
+def thread_budget(slots: int) -> int:
+    """Intra-op threads per slot: the configured value, or the CPUs split evenly across slots."""
+    if PII_TORCH_THREADS > 0:
+        return PII_TORCH_THREADS
+    return max(1, (os.cpu_count() or 1) // max(1, slots))
+
+
+def set_intraop_threads(n: int):
+    """
+    Caps intra-op parallelism for model calls made from the current
+    thread. OpenMP team size is a per-thread setting, so each inference
+    thread applies its own budget.
+    """
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(n)
+
+
+def configure_interop_threads():
+    """torch only accepts this once, before any parallel work has run."""
+    global _interop_configured
+    with _interop_lock:
+        if _interop_configured or PII_TORCH_INTEROP_THREADS <= 0:
+            return
+        _interop_configured = True
+        try:
+            import torch
+            torch.set_num_interop_threads(PII_TORCH_INTEROP_THREADS)
+        except ImportError:
+            pass
+        except RuntimeError:
+            logger.warning("torch inter-op threads already initialised; PII_TORCH_INTEROP_THREADS ignored")
+
+
+class SlotSession:
+    """
+    State owned by one inference thread. Model weights stay shared; what is
+    per-slot is the thread budget and anything a detector wants to keep per
+    caller (scratch buffers, ONNX run options) in .state.
+    """
+    __slots__ = ("index", "threads", "calls", "busy_seconds", "state")
+
+    def __init__(self, index: int, threads: int):
+        self.index = index
+        self.threads = threads
+        self.calls = 0
+        self.busy_seconds = 0.0
+        self.state: dict = {}
+
+
+class InferenceSlots:
+    """
+    Fixed number of dedicated inference threads. Callers from the request
+    threadpool hand model work over and block until it is done, so no more
+    than `slots` model calls ever run at once, each with its own
+    `threads`-sized intra-op pool: slots x threads stays within the budget
+    however many requests are in flight. Waiting callers are granted slots
+    in fair-share order across users (see FairScheduler).
+    """
+
+    def __init__(self, slots: int = PII_INFERENCE_SLOTS, threads: Optional[int] = None,
+                 wait_seconds: float = PII_SLOT_WAIT_SECONDS):
+        self.slots = max(1, slots)
+        self.threads = threads or thread_budget(self.slots)
+        self.wait_seconds = wait_seconds
+        self._scheduler = FairScheduler(self.slots)
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _init_thread(self):
+        with self._sessions_lock:
+            session = SlotSession(len(self._sessions), self.threads)
+            self._sessions.append(session)
+        self._local.session = session
+        set_intraop_threads(self.threads)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created on first use so building a pipeline (CLI, benchmarks) does
+        # not start threads until there is model work.
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    configure_interop_threads()
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.slots,
+                        thread_name_prefix="pii-inference",
+                        initializer=self._init_thread,
+                    )
+        return self._executor
+
+    def current_session(self) -> Optional[SlotSession]:
+        """The session of the slot running the current call, if called from an inference thread."""
+        return getattr(self._local, "session", None)
+
+    def _call(self, fn: Callable, args, kwargs):
+        session = self._local.session
+        start = time.perf_counter()
+        _running.inc()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _running.dec()
+            session.calls += 1
+            session.busy_seconds += time.perf_counter() - start
+
+    def run(self, fn: Callable, *args, **kwargs):
+        return self.run_with_cost(1, fn, *args, **kwargs)
+
+    def run_with_cost(self, cost: float, fn: Callable, *args, **kwargs):
+        """run() with the call's size (characters) used for fair-share ordering."""
+        if self.current_session() is not None:
+            # Already on an inference thread (nested call): run inline
+            return fn(*args, **kwargs)
+
+        start = time.perf_counter()
+        _waiting.inc()
+        try:
+            acquired = self._scheduler.acquire(
+                current_flow(), cost, timeout=self.wait_seconds if self.wait_seconds > 0 else None
+            )
+        finally:
+            _waiting.dec()
+        SLOT_WAIT_SECONDS.observe(time.perf_counter() - start)
+        if not acquired:
+            raise InferenceBusy()
+
+        try:
+            # Never queues: at most `slots` callers hold a permit. The context
+            # is copied so request profiles and stage timers still apply.
+            ctx = contextvars.copy_context()
+            return self._get_executor().submit(ctx.run, self._call, fn, args, kwargs).result()
+        finally:
+            self._scheduler.release()
+
+    def stats(self) -> dict:
+        with self._sessions_lock:
+            sessions = [
+                {"slot": s.index, "calls": s.calls, "busy_seconds": round(s.busy_seconds, 3)}
+                for s in self._sessions
+            ]
+        return {
+            "slots": self.slots,
+            "threads_per_slot": self.threads,
+            "sessions": sessions,
+            "queue": self._scheduler.stats(),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,6 +1,5 @@
 # config.py
 import os
-import re
 from presidio_anonymizer.entities import OperatorConfig
 
 
@@ -22,94 +21,306 @@ GLINER_LABELS = [
 ]
 
 
+# Entity types the regex patterns below fully cover on their own. When a
+# request only selects these, GLiNER is not run at all. Empty by default:
+# the built-in SSN and card patterns only match already-masked values and
+# the fax pattern needs a "fax" prefix, so the model is still needed for
+# raw values. List a type here only if its pattern detects raw values.
+REGEX_ONLY_TYPES = {
+    x.strip()
+    for x in os.getenv("PII_REGEX_ONLY_TYPES", "").split(",")
+    if x.strip()
+}
+
+# Number of distinct label sets whose encodings GLiNERDetector keeps cached
+GLINER_LABEL_CACHE_SIZE = int(os.getenv("PII_LABEL_CACHE_SIZE", "32"))
+# Inference concurrency: model calls run on PII_INFERENCE_SLOTS dedicated
+# threads, each limited to PII_TORCH_THREADS intra-op threads (0 = split the
+# CPUs evenly across slots). Callers wait up to PII_SLOT_WAIT_SECONDS for a
+# free slot (0 = forever) before the request fails with 503.
+PII_INFERENCE_SLOTS = int(os.getenv("PII_INFERENCE_SLOTS", "2"))
+PII_TORCH_THREADS = int(os.getenv("PII_TORCH_THREADS", "0"))
+PII_TORCH_INTEROP_THREADS = int(os.getenv("PII_TORCH_INTEROP_THREADS", "1"))
+PII_SLOT_WAIT_SECONDS = float(os.getenv("PII_SLOT_WAIT_SECONDS", "30"))
+# Waiting model calls are ordered by weighted fair queuing over per-user
+# flows, so one user's bulk uploads can't starve other users or anyone's
+# interactive calls. Weights are per request class.
+PII_INTERACTIVE_WEIGHT = float(os.getenv("PII_INTERACTIVE_WEIGHT", "4"))
+PII_BULK_WEIGHT = float(os.getenv("PII_BULK_WEIGHT", "1"))
+# Per-user token bucket in characters run through the pipeline (0 = no
+# limit). A request is admitted while the user's balance is not negative;
+# its real cost is charged as the text is processed, so a large file
+# finishes and the user's next request waits out the debt (429).
+PII_RATE_CHARS_PER_SECOND = float(os.getenv("PII_RATE_CHARS_PER_SECOND", "50000"))
+PII_RATE_BURST_CHARS = int(os.getenv("PII_RATE_BURST_CHARS", "2000000"))
+# Runtime model registry (admin API): models held in memory at once, and
+# how many sampled batches may wait for the shadow model before new
+# samples are dropped.
+MODEL_REGISTRY_MAX_MODELS = int(os.getenv("PII_MAX_MODELS", "2"))
+MODEL_SHADOW_MAX_QUEUE = int(os.getenv("PII_SHADOW_MAX_QUEUE", "4"))
+
+
 # -------------------------------
 # Regex patterns (configurable)
 # -------------------------------
-REGEX_PATTERNS = {
-    "US_SSN": re.compile(os.getenv("PATTERN_US_SSN", r"\*{3}-\*{2}-\d{4}")),
-    "CREDIT_CARD": re.compile(os.getenv("PATTERN_CREDIT_CARD", r"\*{4}\s?\d{4}")),
+# Defaults for the pattern registry (app/services/patterns.py). A JSON file
+# at PII_PATTERNS_FILE is layered on top and reloaded when it changes:
+#   {"patterns": {"MRN": {"pattern": "MRN\\d{6}", "ignorecase": false}, "US_SSN": null},
+#    "sweeps": {"NAME_FALLBACK": {"pattern": "...", "ignorecase": true}}}
+# "group" picks the capture group that is the entity (default: whole match);
+# null removes a default pattern.
+REGEX_PATTERN_SPECS = {
+    "US_SSN": {"pattern": os.getenv("PATTERN_US_SSN", r"\*{3}-\*{2}-\d{4}")},
+    "CREDIT_CARD": {"pattern": os.getenv("PATTERN_CREDIT_CARD", r"\*{4}\s?\d{4}")},
 
-    "FAX_NUMBER": re.compile(
-        os.getenv("PATTERN_FAX_NUMBER", r"fax[:\s]*\+?\d[\d\s().-]{6,}\d"),
-        re.I,
-    ),
+    "FAX_NUMBER": {
+        "pattern": os.getenv("PATTERN_FAX_NUMBER", r"fax[:\s]*\+?\d[\d\s().-]{6,}\d"),
+        "ignorecase": True,
+    },
 
-    "PATIENT_NAME": re.compile(
-        os.getenv(
+    "PATIENT_NAME": {
+        "pattern": os.getenv(
             "PATTERN_PATIENT_NAME",
             r"(patient name|doctor name)[:\s]*[A-Z][A-Za-zΛ.\s]{2,}",
         ),
-        re.I,
-    ),
+        "ignorecase": True,
+    },
 
-    "ROLE_NAME": re.compile(
-        os.getenv(
+    "ROLE_NAME": {
+        "pattern": os.getenv(
             "PATTERN_ROLE_NAME",
             r"(provider|primary care provider|guarantor|reviewed by|signed by|physician|consultant)"
             r"[:\s]+[A-Z][A-Za-z.\s]{2,}",
         ),
-        re.I,
-    ),
+        "ignorecase": True,
+    },
 
-    "TRAILING_NAME_WITH_CRED": re.compile(
-        os.getenv(
+    "TRAILING_NAME_WITH_CRED": {
+        "pattern": os.getenv(
             "PATTERN_TRAILING_NAME_WITH_CRED",
             r"\b[A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z.]+){0,3}\s*,\s*"
             r"(MD|DO|NP|PA|PT|RN|PharmD)\b\.?",
         ),
-        re.I,
-    ),
+        "ignorecase": True,
+    },
 
-    "BULLET_PROVIDER": re.compile(
-        os.getenv(
+    "BULLET_PROVIDER": {
+        "pattern": os.getenv(
             "PATTERN_BULLET_PROVIDER",
             r"(?:Provider|Guarantor)\s*\*{0,2}:?\*{0,2}\s*"
             r"([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z.]+){0,3})",
         ),
-        re.I,
-    ),
+        "ignorecase": True,
+        "group": 1,
+    },
 }
 
-NAME_FALLBACK_RE = re.compile(
-    os.getenv(
-        "PATTERN_NAME_FALLBACK",
-        r"(provider|primary care provider|guarantor|np|pt|md|do|rn|pa)\b"
-        r"[^.\n]*\b([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z.]+){0,3})",
-    ),
-    re.I,
-)
+# Post-anonymization name sweeps (pipeline.final_name_sweep and
+# possessive_name_sweep); group 2 / group 1 is the name.
+SWEEP_PATTERN_SPECS = {
+    "NAME_FALLBACK": {
+        "pattern": os.getenv(
+            "PATTERN_NAME_FALLBACK",
+            r"(provider|primary care provider|guarantor|np|pt|md|do|rn|pa)\b"
+            r"[^.\n]*\b([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z.]+){0,3})",
+        ),
+        "ignorecase": True,
+    },
+    "POSSESSIVE_NAME": {
+        "pattern": os.getenv(
+            "PATTERN_POSSESSIVE_NAME",
+            r"\b([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z.]+){0,3})'s\b",
+        ),
+    },
+}
 
-POSSESSIVE_NAME_RE = re.compile(
-    os.getenv(
-        "PATTERN_POSSESSIVE_NAME",
-        r"\b([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z.]+){0,3})'s\b",
-    )
-)
+PII_PATTERNS_FILE = os.getenv("PII_PATTERNS_FILE", "")
+# How often the file's mtime is checked (0 = only on POST /admin/patterns/reload)
+PATTERN_RELOAD_SECONDS = float(os.getenv("PII_PATTERN_RELOAD_SECONDS", "5"))
+# A single pattern call that runs longer than this is abandoned and its
+# matches for that text are dropped.
+REGEX_TIMEOUT_SECONDS = float(os.getenv("PII_REGEX_TIMEOUT_MS", "250")) / 1000
+# Load-time backtracking check: every pattern runs against pumped inputs of
+# PATTERN_CHECK_CHARS characters and is rejected if one takes longer than
+# PATTERN_CHECK_SECONDS.
+PATTERN_CHECK_CHARS = int(os.getenv("PII_PATTERN_CHECK_CHARS", "20000"))
+PATTERN_CHECK_SECONDS = float(os.getenv("PII_PATTERN_CHECK_MS", "100")) / 1000
+
+
+# -------------------------------
+# Model gating
+# -------------------------------
+# "off" always runs GLiNER; "heuristic" skips it for segments with no
+# digits, "@" or name-like capitalized tokens (regex detection still runs).
+PII_GATING = os.getenv("PII_GATING", "off").strip().lower()
+# Segments shorter than this are always gated in; too little signal to judge.
+PII_GATING_MIN_CHARS = int(os.getenv("PII_GATING_MIN_CHARS", "12"))
+
+
+# -------------------------------
+# Text normalization
+# -------------------------------
+# "on" cleans text before detection (no-break spaces, ligatures, zero-width
+# characters, typographic dashes/quotes, line-break hyphenation); spans are
+# mapped back to the original offsets. "off" detects on the raw text.
+PII_NORMALIZE = os.getenv("PII_NORMALIZE", "on").strip().lower()
+
+
+# -------------------------------
+# Overlap resolution
+# -------------------------------
+# Same-type spans separated by at most this many non-alphanumeric
+# characters are merged into one span. Types not listed only merge when
+# they touch or overlap.
+ENTITY_MERGE_GAPS = {
+    "PERSON": int(os.getenv("PERSON_MERGE_GAP", "2")),
+    "ADDRESS": int(os.getenv("ADDRESS_MERGE_GAP", "4")),
+}
+
+# When spans of different types overlap, the higher priority wins, then
+# the higher score, then the longer span.
+ENTITY_PRIORITY = {
+    "US_SSN": 100,
+    "CREDIT_CARD": 100,
+    "BANK_ACCOUNT": 90,
+    "EMAIL_ADDRESS": 90,
+    "MEDICAL_RECORD_NUMBER": 85,
+    "FAX_NUMBER": 80,
+    "PHONE_NUMBER": 75,
+    "PERSON": 60,
+    "ADDRESS": 50,
+    "DATE_TIME": 40,
+    "ORGANIZATION": 30,
+}
+
+# A losing span is trimmed to its non-overlapping part when at least this
+# many characters remain, otherwise it is dropped.
+MIN_TRIMMED_SPAN = 2
+
+
+# -------------------------------
+# Entity type table
+# -------------------------------
+# Single declarative source for label handling, shared by LabelMapper,
+# GLiNER label pushdown and the Presidio operators. Order matters: a raw
+# label maps to the first type whose "exact" list equals it or whose
+# "contains" keywords appear in it (case-insensitive).
+ENTITY_TYPES = {
+    "PERSON": {
+        "contains": ["role_name", "patient_name", "trailing_name_with_cred", "bullet_provider", "person", "name"],
+        "token": "[NAME]",
+    },
+    "EMAIL_ADDRESS": {"contains": ["email"], "token": "[EMAIL]"},
+    "PHONE_NUMBER": {"contains": ["phone"], "token": "[PHONE]"},
+    "FAX_NUMBER": {"contains": ["fax"], "token": "[FAX]"},
+    "US_SSN": {"contains": ["ssn"], "token": "[SSN]"},
+    "CREDIT_CARD": {"contains": ["credit"], "token": "[CARD]"},
+    "BANK_ACCOUNT": {"contains": ["bank"], "token": "[BANK]"},
+    "ADDRESS": {"contains": ["address", "location"], "token": "[ADDRESS]"},
+    "DATE_TIME": {"contains": ["date of birth"], "exact": ["date", "date_time"], "token": "[DATE]"},
+    "ORGANIZATION": {"contains": ["organization"], "token": "[ORG]"},
+    "MEDICAL_RECORD_NUMBER": {"contains": ["medical record number"], "exact": ["mrn"], "token": "[MRN]"},
+}
+DEFAULT_REDACTION_TOKEN = "[REDACTED]"
 
 
 # -------------------------------
 # Presidio operator configuration
 # -------------------------------
 PRESIDIO_OPERATORS = {
-    "PERSON": OperatorConfig("replace", {"new_value": "[NAME]"}),
-    "ADDRESS": OperatorConfig("replace", {"new_value": "[ADDRESS]"}),
-    "EMAIL_ADDRESS": OperatorConfig("replace", {"new_value": "[EMAIL]"}),
-    "PHONE_NUMBER": OperatorConfig("replace", {"new_value": "[PHONE]"}),
-    "FAX_NUMBER": OperatorConfig("replace", {"new_value": "[FAX]"}),
-    "US_SSN": OperatorConfig("replace", {"new_value": "[SSN]"}),
-    "CREDIT_CARD": OperatorConfig("replace", {"new_value": "[CARD]"}),
-    "BANK_ACCOUNT": OperatorConfig("replace", {"new_value": "[BANK]"}),
-    "DATE_TIME": OperatorConfig("replace", {"new_value": "[DATE]"}),
-    "ORGANIZATION": OperatorConfig("replace", {"new_value": "[ORG]"}),
-    "MEDICAL_RECORD_NUMBER": OperatorConfig("replace", {"new_value": "[MRN]"}),
-    "DEFAULT": OperatorConfig("replace", {"new_value": "[REDACTED]"}),
+    entity_type: OperatorConfig("replace", {"new_value": spec["token"]})
+    for entity_type, spec in ENTITY_TYPES.items()
 }
+PRESIDIO_OPERATORS["DEFAULT"] = OperatorConfig("replace", {"new_value": DEFAULT_REDACTION_TOKEN})
 
 #WebDev
 #Plain text length config
 MAX_PLAIN_TEXT_LENGTH = int(
     os.getenv("MAX_PLAIN_TEXT_LENGTH", "5000")
 )
-MAX_UPLOAD_SIZE_MB = 5
+# /redact/stream: records are grouped into pipeline batches of up to
+# STREAM_BATCH_RECORDS records / STREAM_BATCH_CHARS characters, with at most
+# STREAM_MAX_INFLIGHT batches being redacted while the body is still read.
+STREAM_BATCH_RECORDS = int(os.getenv("STREAM_BATCH_RECORDS", "32"))
+STREAM_BATCH_CHARS = int(os.getenv("STREAM_BATCH_CHARS", "32000"))
+STREAM_MAX_INFLIGHT = int(os.getenv("STREAM_MAX_INFLIGHT", "2"))
+STREAM_MAX_RECORD_CHARS = int(os.getenv("STREAM_MAX_RECORD_CHARS", str(MAX_PLAIN_TEXT_LENGTH)))
+# PDF redaction geometry: "char" unions exact character boxes from the
+# text layer, "word" redacts whole words that are at least half covered.
+PDF_REDACTION_MODE = os.getenv("PDF_REDACTION_MODE", "char").strip().lower()
+
+# OCR for image-only PDF pages (Tesseract through PyMuPDF). "auto" enables
+# it when Tesseract language data can be found.
+PDF_OCR = os.getenv("PDF_OCR", "auto").strip().lower()
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "2"))
+OCR_PAGE_TIMEOUT_SECONDS = float(os.getenv("OCR_PAGE_TIMEOUT_SECONDS", "60"))
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "256"))
+# What to do with an image-only page OCR could not read: "blank" covers
+# the whole page, "skip" leaves it untouched.
+OCR_ON_FAILURE = os.getenv("OCR_ON_FAILURE", "blank").strip().lower()
+
+# Short-lived cache of extracted page layouts and detections, keyed by the
+# upload's content hash, so /detect/entities -> /preview/pdf -> /pdf on the
+# same file only pays for extraction and inference once.
+DOC_CACHE_MAX_ENTRIES = int(os.getenv("DOC_CACHE_MAX_ENTRIES", "64"))
+DOC_CACHE_MAX_MB = int(os.getenv("DOC_CACHE_MAX_MB", "256"))
+DOC_CACHE_TTL_SECONDS = int(os.getenv("DOC_CACHE_TTL_SECONDS", "900"))
+
+# Structured span previews: default window in non-empty pages/paragraphs,
+# and the largest window a client may ask for.
+PREVIEW_PDF_WINDOW = int(os.getenv("PREVIEW_PDF_WINDOW", "1"))
+PREVIEW_DOCX_WINDOW = int(os.getenv("PREVIEW_DOCX_WINDOW", "20"))
+PREVIEW_MAX_WINDOW = int(os.getenv("PREVIEW_MAX_WINDOW", "50"))
+# Key for signing preview cursors; a random one per process when unset
+# (cursors then stop working on restart, like the cache entries they point to).
+PREVIEW_CURSOR_SECRET = os.getenv("PREVIEW_CURSOR_SECRET", "")
+
+MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", "5"))
 MAX_UPLOAD_SIZE_BYTES = MAX_UPLOAD_SIZE_MB * 1024 * 1024
+# Uploads are read in chunks; past this size they are spooled to a temp
+# file and handed to the extractors as a path instead of bytes.
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(1024 * 1024)))
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+# Multipart request bodies larger than the upload limit plus this much
+# room for boundaries and form fields are refused before they are parsed.
+UPLOAD_FORM_OVERHEAD_BYTES = int(os.getenv("UPLOAD_FORM_OVERHEAD_BYTES", str(256 * 1024)))
 MAX_DAILY_UPLOADS = 20
+
+# CSV "detect" mode runs the pipeline on every cell of the selected
+# columns. Row blocks of CSV_BLOCK_ROWS go to CSV_WORKERS processes (each
+# loads its own model; 0 = run in the request process).
+CSV_WORKERS = int(os.getenv("CSV_WORKERS", "0"))
+CSV_BLOCK_ROWS = int(os.getenv("CSV_BLOCK_ROWS", "512"))
+CSV_BATCH_CELLS = int(os.getenv("CSV_BATCH_CELLS", "32"))
+
+# Pseudonymization: entity values map to stable tokens ("[NAME_17]") per
+# document or per tenant. Values are keyed with PSEUDONYM_SECRET before
+# they reach the map; set PSEUDONYM_DB_PATH to keep tenant maps on disk.
+PSEUDONYM_SECRET = os.getenv("PSEUDONYM_SECRET", "")
+PSEUDONYM_DB_PATH = os.getenv("PSEUDONYM_DB_PATH", "")
+PSEUDONYM_CACHE_SIZE = int(os.getenv("PSEUDONYM_CACHE_SIZE", "100000"))
+
+# Response streaming: outputs are sent in fixed-size chunks; text outputs
+# of at least COMPRESS_MIN_BYTES are gzip/zstd encoded when accepted.
+OUTPUT_CHUNK_SIZE = int(os.getenv("OUTPUT_CHUNK_SIZE", str(64 * 1024)))
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+
+# Comma-separated emails allowed to use admin-only features (request profiling)
+ADMIN_EMAILS = {
+    x.strip().lower()
+    for x in os.getenv("ADMIN_EMAILS", "").split(",")
+    if x.strip()
+}
+
+# /metrics carries per-user labels, so it needs an admin login or this
+# bearer token (for Prometheus scrapers)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Opt-in request profiling (X-Profile: 1 header or ?profile=1, admins only)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_RETENTION = int(os.getenv("PROFILE_RETENTION", "200"))
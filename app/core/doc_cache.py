@@ -0,0 +1,135 @@
+# doc_cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .config import DOC_CACHE_MAX_ENTRIES, DOC_CACHE_MAX_MB, DOC_CACHE_TTL_SECONDS
+from .metrics import record_cache
+
+# Rough per-character footprint of a cached page: the text itself plus the
+# offset -> bbox arrays of a CharLayout.
+_BYTES_PER_CHAR = 48
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def selection_key(selected_entities: Optional[Iterable[str]]) -> Optional[Tuple[str, ...]]:
+    return None if selected_entities is None else tuple(sorted(set(selected_entities)))
+
+
+class CachedDocument:
+    """
+    What one upload has produced so far: per-page layouts (None for pages
+    with no text) and pipeline detections per (page, entity selection).
+    """
+    __slots__ = ("key", "pages", "detections", "size")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.pages: Optional[List] = None
+        self.detections: Dict[Tuple[int, Optional[Tuple[str, ...]]], object] = {}
+        self.size = 0
+
+    def set_pages(self, pages: List):
+        self.pages = pages
+        self.size = sum(len(p.text) for p in pages if p is not None) * _BYTES_PER_CHAR
+
+    def get_entities(self, page_index: int, selected_entities):
+        key = selection_key(selected_entities)
+        entities = self.detections.get((page_index, key))
+        if entities is None and key is not None:
+            # A run over all labels covers any selection
+            full = self.detections.get((page_index, None))
+            if full is not None:
+                entities = full.select(selected_entities)
+        record_cache("detections", entities is not None)
+        return entities
+
+    def put_entities(self, page_index: int, selected_entities, entities):
+        self.detections[(page_index, selection_key(selected_entities))] = entities
+
+    def entities_for(self, page_index: int, text: str, pipeline, selected_entities):
+        """Cached detections for one page/paragraph, running the pipeline on a miss."""
+        entities = self.get_entities(page_index, selected_entities)
+        if entities is None:
+            _, entities = pipeline.run(text, selected_entities)
+            self.put_entities(page_index, selected_entities, entities)
+        return entities
+
+
+class DocumentCache:
+    def __init__(
+        self,
+        max_entries: int = DOC_CACHE_MAX_ENTRIES,
+        max_bytes: int = DOC_CACHE_MAX_MB * 1024 * 1024,
+        ttl: float = DOC_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, CachedDocument]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def document(
+        self, data: Optional[bytes], namespace: str = "", digest: Optional[str] = None
+    ) -> CachedDocument:
+        """
+        Cached entry for this content, created empty on a miss. Pass digest
+        when the content hash is already known (e.g. computed while the
+        upload was streamed) instead of the bytes.
+        """
+        key = f"{namespace}:{digest or content_hash(data)}"
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[0] > now:
+                self._entries.move_to_end(key)
+                self._entries[key] = (now + self.ttl, item[1])
+                hit = True
+                doc = item[1]
+            else:
+                hit = False
+                doc = CachedDocument(key)
+                self._entries[key] = (now + self.ttl, doc)
+            self._evict(now)
+        record_cache("document", hit)
+        return doc
+
+    def get(self, key: str) -> Optional[CachedDocument]:
+        """Existing entry by full key (see CachedDocument.key), or None if gone."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[0] <= now:
+                return None
+            self._entries.move_to_end(key)
+            self._entries[key] = (now + self.ttl, item[1])
+            return item[1]
+
+    def _evict(self, now: float):
+        expired = [k for k, (expires, _) in self._entries.items() if expires <= now]
+        for k in expired:
+            del self._entries[k]
+        total = sum(doc.size for _, doc in self._entries.values())
+        while self._entries and (len(self._entries) > self.max_entries or total > self.max_bytes):
+            _, (_, doc) = self._entries.popitem(last=False)
+            total -= doc.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+document_cache = DocumentCache()
@@ -0,0 +1,286 @@
+# fairness.py
+"""
+Per-user admission and scheduling for model capacity.
+
+A request tags the calls it makes with a flow (user + request class)
+held in a context variable. RateLimiter keeps one token bucket per user,
+measured in characters processed; FairScheduler hands free inference
+slots to waiting calls in weighted-fair-queuing order over those flows.
+Unauthenticated callers share the "anonymous" flow and metric label and
+only get a bucket of their own, keyed by client address.
+"""
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .config import (
+    PII_INTERACTIVE_WEIGHT,
+    PII_BULK_WEIGHT,
+    PII_RATE_CHARS_PER_SECOND,
+    PII_RATE_BURST_CHARS,
+)
+from .metrics import counter, gauge, histogram
+
+FLOW_WEIGHTS = {"interactive": PII_INTERACTIVE_WEIGHT, "bulk": PII_BULK_WEIGHT}
+
+FAIR_QUEUE_WAITING = gauge(
+    "pii_fair_queue_waiting", "Model calls waiting for an inference slot", ("user", "class")
+)
+FAIR_QUEUE_GRANTED = counter(
+    "pii_fair_queue_granted_chars_total", "Characters admitted to the model", ("user", "class")
+)
+FAIR_QUEUE_WAIT_SECONDS = histogram(
+    "pii_fair_queue_wait_seconds", "Time a model call waited in the fair queue", ("class",)
+)
+RATE_LIMITED = counter("pii_rate_limited_total", "Requests rejected by the per-user rate limit", ("user",))
+RATE_CHARGED = counter("pii_rate_charged_chars_total", "Characters charged to a user's bucket", ("user",))
+
+
+class Flow:
+    __slots__ = ("user", "kind", "weight", "bucket")
+
+    def __init__(self, user: str, kind: str, bucket: Optional[str] = None):
+        if kind not in FLOW_WEIGHTS:
+            raise ValueError(f"unknown request class {kind!r}")
+        self.user = user
+        self.kind = kind
+        self.weight = FLOW_WEIGHTS[kind]
+        # Rate-limit bucket; defaults to the user
+        self.bucket = bucket or user
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.user, self.kind
+
+
+ANONYMOUS_USER = "anonymous"
+_ANONYMOUS = Flow(ANONYMOUS_USER, "bulk")
+_current_flow: contextvars.ContextVar[Optional[Flow]] = contextvars.ContextVar("pii_flow", default=None)
+
+
+def set_flow(user: str, kind: str, bucket: Optional[str] = None) -> Flow:
+    """Tags model calls made from the current context (request) with this flow."""
+    flow = Flow(user, kind, bucket)
+    _current_flow.set(flow)
+    return flow
+
+
+def current_flow() -> Flow:
+    return _current_flow.get() or _ANONYMOUS
+
+
+# -------------------------------
+# Rate limiting
+# -------------------------------
+class RateLimited(HTTPException):
+    def __init__(self, retry_after: float):
+        seconds = max(1, int(retry_after + 0.999))
+        super().__init__(
+            status_code=429,
+            detail=f"Processing rate limit reached, retry in {seconds}s",
+            headers={"Retry-After": str(seconds)},
+        )
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+
+    def refill(self, rate: float, burst: float, now: float):
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+
+class RateLimiter:
+    """
+    One bucket per user. Admission only needs a non-negative balance and
+    charges happen as text is processed, so a single request may take the
+    balance below zero; the user then waits until it has refilled.
+    """
+
+    def __init__(self, rate: float = PII_RATE_CHARS_PER_SECOND, burst: int = PII_RATE_BURST_CHARS,
+                 max_users: int = 10000):
+        self.rate = rate
+        self.burst = float(burst)
+        self.max_users = max_users
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, user: str, now: float) -> TokenBucket:
+        bucket = self._buckets.get(user)
+        if bucket is None:
+            if len(self._buckets) >= self.max_users:
+                # Full buckets carry no state worth keeping
+                for name, b in list(self._buckets.items()):
+                    b.refill(self.rate, self.burst, now)
+                    if b.tokens >= self.burst:
+                        del self._buckets[name]
+            bucket = self._buckets[user] = TokenBucket(self.burst, now)
+        else:
+            bucket.refill(self.rate, self.burst, now)
+        return bucket
+
+    def admit(self, user: str, label: Optional[str] = None):
+        """`label` names the user in metrics when the bucket key shouldn't (client addresses)."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            bucket = self._bucket(user, time.monotonic())
+            tokens = bucket.tokens
+        if tokens < 0:
+            RATE_LIMITED.labels(label or user).inc()
+            raise RateLimited(-tokens / self.rate)
+
+    def charge(self, user: str, chars: int, label: Optional[str] = None):
+        RATE_CHARGED.labels(label or user).inc(chars)
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._bucket(user, time.monotonic()).tokens -= chars
+
+    def balance(self, user: str) -> Optional[float]:
+        if self.rate <= 0:
+            return None
+        with self._lock:
+            return self._bucket(user, time.monotonic()).tokens
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            users = {}
+            for user, bucket in self._buckets.items():
+                bucket.refill(self.rate, self.burst, now)
+                users[user] = round(bucket.tokens)
+        return {"chars_per_second": self.rate, "burst_chars": int(self.burst), "balances": users}
+
+
+rate_limiter = RateLimiter()
+
+
+def charge_current(chars: int):
+    """Charges processed characters to the current request's user."""
+    flow = _current_flow.get()
+    if flow is not None:
+        rate_limiter.charge(flow.bucket, chars, flow.user)
+
+
+# -------------------------------
+# Fair scheduling
+# -------------------------------
+class _Waiter:
+    __slots__ = ("flow", "start_tag", "event", "granted", "cancelled")
+
+    def __init__(self, flow: Flow, start_tag: float):
+        self.flow = flow
+        self.start_tag = start_tag
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class FairScheduler:
+    """
+    Counting semaphore that grants permits in weighted-fair-queuing order.
+    Each call gets a finish tag = max(virtual time, its flow's last tag) +
+    cost / weight, and the smallest tag goes next: a flow with weight 4
+    gets four times the characters of a weight-1 flow while both are
+    backlogged, and a newly arrived flow never waits behind another
+    flow's whole backlog.
+    """
+
+    def __init__(self, permits: int, max_flows: int = 4096):
+        self.permits = permits
+        self._free = permits
+        self.max_flows = max_flows
+        self._lock = threading.Lock()
+        self._heap = []
+        self._seq = itertools.count()
+        self._vtime = 0.0
+        self._last_tag: Dict[Tuple[str, str], float] = {}
+        self._stats: Dict[Tuple[str, str], list] = {}
+
+    def acquire(self, flow: Flow, cost: float = 1.0, timeout: Optional[float] = None) -> bool:
+        cost = max(1.0, float(cost))
+        with self._lock:
+            start_tag = max(self._vtime, self._last_tag.get(flow.key, 0.0))
+            finish_tag = start_tag + cost / flow.weight
+            self._last_tag[flow.key] = finish_tag
+            stats = self._stats.setdefault(flow.key, [0, 0, 0.0])
+            stats[0] += 1
+            if self._free > 0 and not self._heap:
+                self._free -= 1
+                self._grant(flow, start_tag, cost, 0.0)
+                return True
+            waiter = _Waiter(flow, start_tag)
+            heapq.heappush(self._heap, (finish_tag, next(self._seq), waiter))
+
+        waiting = FAIR_QUEUE_WAITING.labels(*flow.key)
+        waiting.inc()
+        start = time.perf_counter()
+        try:
+            waiter.event.wait(timeout)
+            with self._lock:
+                if not waiter.granted:
+                    waiter.cancelled = True
+                    stats[0] -= 1
+                    return False
+                self._grant(flow, None, cost, time.perf_counter() - start)
+                return True
+        finally:
+            waiting.dec()
+
+    def _grant(self, flow: Flow, start_tag: Optional[float], cost: float, waited: float):
+        if start_tag is not None:
+            self._vtime = max(self._vtime, start_tag)
+        stats = self._stats[flow.key]
+        stats[0] -= 1
+        stats[1] += cost
+        stats[2] += waited
+        FAIR_QUEUE_GRANTED.labels(*flow.key).inc(cost)
+        FAIR_QUEUE_WAIT_SECONDS.labels(flow.kind).observe(waited)
+
+    def resize(self, permits: int):
+        """Changes the number of permits; permits held past a smaller count are absorbed as they come back."""
+        with self._lock:
+            self._free += permits - self.permits
+            self.permits = permits
+            self._dispatch()
+
+    def release(self):
+        with self._lock:
+            self._free += 1
+            self._dispatch()
+            if len(self._last_tag) > self.max_flows:
+                # Flows whose tags are behind virtual time would restart from it anyway
+                self._last_tag = {k: t for k, t in self._last_tag.items() if t > self._vtime}
+            if len(self._stats) > self.max_flows:
+                # Totals of idle flows go; flows with calls waiting keep theirs
+                self._stats = {k: s for k, s in self._stats.items() if s[0] > 0}
+
+    def _dispatch(self):
+        # Hands free permits to waiters, smallest finish tag first
+        while self._free > 0 and self._heap:
+            _, _, waiter = heapq.heappop(self._heap)
+            if waiter.cancelled:
+                continue
+            self._free -= 1
+            waiter.granted = True
+            self._vtime = max(self._vtime, waiter.start_tag)
+            waiter.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            flows = [
+                {"user": user, "class": kind, "waiting": s[0], "granted_chars": int(s[1]),
+                 "wait_seconds": round(s[2], 3)}
+                for (user, kind), s in self._stats.items()
+            ]
+            return {"free_slots": self._free, "queued": len(self._heap), "flows": flows}
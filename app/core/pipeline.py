@@ -1,68 +1,172 @@
 # pipeline.py
-from typing import Tuple, List
+from typing import Iterable, List, Optional, Tuple
 
-from .config import PRESIDIO_OPERATORS, NAME_FALLBACK_RE, POSSESSIVE_NAME_RE
+from .config import PRESIDIO_OPERATORS, PII_NORMALIZE
+from .metrics import stage_timer, CHARS_PROCESSED, MODEL_BATCH_SIZE
+from .profiling import profiled
+from .concurrency import InferenceSlots
+from .fairness import charge_current
 from app.services.detector import (
     GLiNERDetector,
     LabelMapper,
+    labels_for_types,
     regex_detect,
-    merge_person_entities,
-    normalize_addresses,
-    PIIEntity,
+    model_entities,
+    resolve_overlaps,
+    EntityBatch,
 )
 from app.services.anonymizer import PresidioWrapper
+from app.services.gating import should_run_model
+from app.services.normalizer import normalize_text
+from app.services.patterns import pattern_registry
 
 
-def final_name_sweep(text: str) -> str:
+def final_name_sweep(text: str, pseudonyms=None) -> str:
     def repl(m):
         whole = m.group(0)
         name = m.group(2)
-        return whole.replace(name, "[NAME]")
+        if pseudonyms is None:
+            return whole.replace(name, "[NAME]")
+        if m.start(2) > 0 and text[m.start(2) - 1] == "[":
+            # Label inside a token already emitted ("[NAME_3]")
+            return whole
+        return whole.replace(name, pseudonyms.token("PERSON", name))
 
-    return NAME_FALLBACK_RE.sub(repl, text)
+    return pattern_registry.current().sweeps["NAME_FALLBACK"].sub(repl, text)
 
 
-def possessive_name_sweep(text: str) -> str:
+def possessive_name_sweep(text: str, pseudonyms=None) -> str:
     def repl(m):
-        return "[NAME]'s"
-    return POSSESSIVE_NAME_RE.sub(repl, text)
+        if pseudonyms is None:
+            return "[NAME]'s"
+        return pseudonyms.token("PERSON", m.group(1)) + "'s"
+    return pattern_registry.current().sweeps["POSSESSIVE_NAME"].sub(repl, text)
+
+
+def detect_texts(detector, texts: List[str], labels) -> List[list]:
+    detect_batch = getattr(detector, "detect_batch", None)
+    if detect_batch is not None:
+        return detect_batch(texts, labels=labels)
+    return [detector.detect(t, labels=labels) for t in texts]
 
 
 class PIIPipeline:
-    def __init__(self):
-        self.detector = GLiNERDetector()
+    def __init__(
+        self,
+        detector=None,
+        slots: Optional[InferenceSlots] = None,
+        normalize: bool = PII_NORMALIZE != "off",
+    ):
+        self.detector = detector if detector is not None else GLiNERDetector()
+        self.slots = slots if slots is not None else InferenceSlots()
+        self.normalize = normalize
         self.mapper = LabelMapper()
         self.anonymizer = PresidioWrapper()
+        # Optional ShadowRunner (see model_registry) fed with each call's model input/output
+        self.shadow = None
+
+    @profiled("pipeline.run")
+    def run(
+        self,
+        text: str,
+        selected_entities: Optional[Iterable[str]] = None,
+        pseudonyms=None,
+    ) -> Tuple[str, EntityBatch]:
+        # The detector is read once so a model swap mid-call cannot mix models.
+        # Only ask the model for labels that can produce a selected type.
+        detector = self.detector
+        labels = labels_for_types(selected_entities, detector.labels)
+        clean, offsets = self._normalize(text)
+        raw = self._model_raw(detector, [clean], labels)[0]
+        return self._finish(text, raw, pseudonyms, clean, offsets)
 
-    def run(self, text: str) -> Tuple[str, List[PIIEntity]]:
-        raw = self.detector.detect(text)
-
-        entities: List[PIIEntity] = [
-            PIIEntity(
-                entity_type=self.mapper.normalize(e["label"]),
-                start=int(e["start"]),
-                end=int(e["end"]),
-                score=float(e["score"]),
-                text=text[int(e["start"]):int(e["end"])],
-            )
-            for e in raw
+    @profiled("pipeline.run_batch")
+    def run_batch(
+        self,
+        texts: List[str],
+        selected_entities: Optional[Iterable[str]] = None,
+        pseudonyms=None,
+    ) -> List[Tuple[str, EntityBatch]]:
+        """Same as run() per text, with one model call for the whole batch."""
+        detector = self.detector
+        labels = labels_for_types(selected_entities, detector.labels)
+        cleaned = [self._normalize(text) for text in texts]
+        raws = self._model_raw(detector, [clean for clean, _ in cleaned], labels)
+        return [
+            self._finish(text, raw, pseudonyms, clean, offsets)
+            for text, raw, (clean, offsets) in zip(texts, raws, cleaned)
         ]
 
-        regex_entities = regex_detect(text)
-        for e in regex_entities:
-            e.entity_type = self.mapper.normalize(e.entity_type)
-        entities.extend(regex_entities)
+    def _normalize(self, text: str):
+        if not self.normalize:
+            return text, None
+        with stage_timer("normalize"):
+            return normalize_text(text)
+
+    def _model_raw(self, detector, texts: List[str], labels) -> List[list]:
+        raws = [[] for _ in texts]
+        if not labels:
+            return raws
+
+        with stage_timer("gating"):
+            todo = [i for i, text in enumerate(texts) if should_run_model(text)]
+        if todo:
+            batch = [texts[i] for i in todo]
+            with stage_timer("gliner_detect") as timer:
+                MODEL_BATCH_SIZE.observe(len(todo))
+                results = self.slots.run_with_cost(
+                    sum(len(t) for t in batch), detect_texts, detector, batch, labels
+                )
+            for i, raw in zip(todo, results):
+                raws[i] = raw
+
+            shadow = self.shadow
+            if shadow is not None:
+                shadow.maybe_submit(batch, labels, results, timer.elapsed)
+        return raws
+
+    def _finish(
+        self, original: str, raw: list, pseudonyms=None, text: Optional[str] = None, offsets=None
+    ) -> Tuple[str, EntityBatch]:
+        """
+        Detection and anonymization run on the normalized text, so the
+        redacted output is normalized too; the returned spans are mapped
+        back to offsets in the original.
+        """
+        CHARS_PROCESSED.inc(len(original))
+        charge_current(len(original))
+        if text is None:
+            text = original
+
+        with stage_timer("regex_detect"):
+            entities = model_entities(text, raw)
+            entities.extend(regex_detect(text))
+
+        with stage_timer("label_normalize"):
+            entities.map_types(self.mapper.normalize)
 
-        entities = merge_person_entities(text, entities)
-        entities = normalize_addresses(text, entities)
+        with stage_timer("resolve_overlaps"):
+            entities = resolve_overlaps(text, entities)
 
-        anonymized = self.anonymizer.anonymize(
-            text=text,
-            entities=entities,
-            operators=PRESIDIO_OPERATORS,
-        )
+        if pseudonyms is None:
+            with stage_timer("presidio_anonymize"):
+                anonymized = self.anonymizer.anonymize(
+                    text=text,
+                    entities=entities,
+                    operators=PRESIDIO_OPERATORS,
+                )
+        else:
+            # Spans are already non-overlapping; Presidio's custom operator
+            # would also call the token function on a dummy value.
+            with stage_timer("pseudonymize"):
+                anonymized = pseudonyms.replace(text, entities)
 
-        anonymized = final_name_sweep(anonymized)
-        anonymized = possessive_name_sweep(anonymized)
+        with stage_timer("name_sweeps"):
+            anonymized = final_name_sweep(anonymized, pseudonyms)
+            anonymized = possessive_name_sweep(anonymized, pseudonyms)
 
+        if offsets is not None:
+            offsets.remap(entities, original)
+        elif text is not original:
+            entities.text = original
         return anonymized, entities
@@ -0,0 +1,168 @@
+# profiling.py
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from .config import PROFILE_DIR, PROFILE_RETENTION
+
+
+class RequestProfile:
+    """
+    Profile of a single opted-in request: one cProfile per thread that did
+    pipeline work, plus wall-clock totals per pipeline stage.
+    """
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.time()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._profilers: Dict[int, cProfile.Profile] = {}
+        self._depth: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def record_stage(self, name: str, seconds: float):
+        with self._lock:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            stage["seconds"] += seconds
+            stage["calls"] += 1
+
+    def enter(self):
+        tid = threading.get_ident()
+        with self._lock:
+            depth = self._depth.get(tid, 0)
+            self._depth[tid] = depth + 1
+            if depth:
+                return
+            profiler = self._profilers.get(tid)
+            if profiler is None:
+                profiler = self._profilers[tid] = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler already owns this thread; keep the stage timings only.
+            pass
+
+    def exit(self):
+        tid = threading.get_ident()
+        with self._lock:
+            self._depth[tid] -= 1
+            if self._depth[tid]:
+                return
+            profiler = self._profilers.get(tid)
+        if profiler is not None:
+            profiler.disable()
+
+    def _stats(self) -> Optional[pstats.Stats]:
+        stats = None
+        for profiler in self._profilers.values():
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profiler)
+                else:
+                    stats.add(profiler)
+            except TypeError:
+                # Profiler never collected anything (enable() was refused)
+                continue
+        return stats
+
+    def summary(self, top: int = 30) -> dict:
+        stats = self._stats()
+        hotspots = ""
+        if stats is not None:
+            buf = io.StringIO()
+            stats.stream = buf
+            stats.sort_stats("cumulative").print_stats(top)
+            hotspots = buf.getvalue()
+        return {
+            "request_id": self.request_id,
+            "started": self.started,
+            "wall_seconds": round(time.time() - self.started, 6),
+            "stages": self.stages,
+            "hotspots": hotspots,
+        }
+
+    def save(self, directory: str = PROFILE_DIR) -> dict:
+        os.makedirs(directory, exist_ok=True)
+        summary = self.summary()
+        stats = self._stats()
+        if stats is not None:
+            stats.dump_stats(profile_path(self.request_id, directory))
+        with open(summary_path(self.request_id, directory), "w") as fh:
+            json.dump(summary, fh, indent=2)
+        _prune(directory)
+        return summary
+
+
+_active: ContextVar[Optional[RequestProfile]] = ContextVar("pii_request_profile", default=None)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _active.get()
+
+
+def start_profile(request_id: str):
+    return _active.set(RequestProfile(request_id))
+
+
+def stop_profile(token) -> Optional[RequestProfile]:
+    profile = _active.get()
+    _active.reset(token)
+    return profile
+
+
+def profiled(name: str):
+    """
+    Decorator for pipeline entry points. When no profile is active the only
+    cost is one ContextVar lookup.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profile = _active.get()
+            if profile is None:
+                return fn(*args, **kwargs)
+
+            profile.enter()
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.record_stage(name, time.perf_counter() - start)
+                profile.exit()
+        return wrapper
+    return decorator
+
+
+def _safe_id(request_id: str) -> str:
+    if not request_id or not all(c.isalnum() or c in "-_" for c in request_id):
+        raise ValueError("Invalid profile id")
+    return request_id
+
+
+def profile_path(request_id: str, directory: str = PROFILE_DIR) -> str:
+    return os.path.join(directory, f"{_safe_id(request_id)}.prof")
+
+
+def summary_path(request_id: str, directory: str = PROFILE_DIR) -> str:
+    return os.path.join(directory, f"{_safe_id(request_id)}.json")
+
+
+def _prune(directory: str):
+    summaries = sorted(
+        (f for f in os.listdir(directory) if f.endswith(".json")),
+        key=lambda f: os.path.getmtime(os.path.join(directory, f)),
+    )
+    for name in summaries[:-PROFILE_RETENTION] if PROFILE_RETENTION > 0 else []:
+        stem = name[:-len(".json")]
+        for ext in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(directory, stem + ext))
+            except FileNotFoundError:
+                pass
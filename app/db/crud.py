@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, cast, Date
-from app.db.models import RedactionLog, User
+from app.db.models import RedactionLog, User, UserStatTotal, UserDailyStat
 from app.auth.password import hash_password
 import json
 from datetime import date, datetime, timedelta, timezone
@@ -22,11 +22,103 @@ def create_redaction_log(
     )
 
     db.add(log)
+    db.flush()
+    _bump_user_stats(db, user_id, input_type, entity_count or 0)
     db.commit()
     db.refresh(log)
 
     return log
 
+STATS_WINDOW_DAYS = 30
+
+def _utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+def _bump_user_stats(db: Session, user_id: int | None, input_type: str, entity_count: int):
+    if user_id is None:
+        return
+
+    has_rollups = db.query(UserStatTotal.id).filter(UserStatTotal.user_id == user_id).first()
+    if not has_rollups:
+        # First write for this user (or a user whose logs predate the rollup
+        # tables): rebuild from history once, which already counts this log.
+        rebuild_user_stats(db, user_id)
+        return
+
+    _upsert_rollup(db, UserStatTotal, {"user_id": user_id, "input_type": input_type}, 1, entity_count)
+    _upsert_rollup(
+        db, UserDailyStat, {"user_id": user_id, "day": _utc_today(), "input_type": input_type}, 1, entity_count
+    )
+
+def _upsert_rollup(db: Session, model, key: dict, documents: int, entities: int, increment: bool = True):
+    """
+    Adds to (or with increment=False, overwrites) one rollup row. On SQLite
+    and PostgreSQL this is a single INSERT ... ON CONFLICT DO UPDATE, so two
+    concurrent first writes of the day can't both insert and fail the commit.
+    """
+    dialect = db.get_bind().dialect.name
+    if increment:
+        updates = {
+            "documents_processed": model.documents_processed + documents,
+            "redactions_done": model.redactions_done + entities,
+        }
+    else:
+        updates = {"documents_processed": documents, "redactions_done": entities}
+    if hasattr(model, "updated_at"):
+        updates["updated_at"] = func.now()
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(model).values(**key, documents_processed=documents, redactions_done=entities)
+        db.execute(stmt.on_conflict_do_update(index_elements=list(key), set_=updates))
+        return
+
+    row = db.query(model).filter_by(**key).with_for_update().first()
+    if row is None:
+        db.add(model(**key, documents_processed=documents, redactions_done=entities))
+    else:
+        for column, value in updates.items():
+            setattr(row, column, value)
+    db.flush()
+
+def rebuild_user_stats(db: Session, user_id: int):
+    db.query(UserStatTotal).filter(UserStatTotal.user_id == user_id).delete()
+    db.query(UserDailyStat).filter(UserDailyStat.user_id == user_id).delete()
+
+    totals = db.query(
+        RedactionLog.input_type,
+        func.count(RedactionLog.id),
+        func.coalesce(func.sum(RedactionLog.entity_count), 0)
+    ).filter(RedactionLog.user_id == user_id).group_by(RedactionLog.input_type).all()
+
+    for input_type, documents, entities in totals:
+        _upsert_rollup(
+            db, UserStatTotal, {"user_id": user_id, "input_type": input_type}, documents, entities, increment=False
+        )
+
+    day_col = func.date(RedactionLog.created_at)
+    daily = db.query(
+        day_col,
+        RedactionLog.input_type,
+        func.count(RedactionLog.id),
+        func.coalesce(func.sum(RedactionLog.entity_count), 0)
+    ).filter(RedactionLog.user_id == user_id).group_by(day_col, RedactionLog.input_type).all()
+
+    for day, input_type, documents, entities in daily:
+        if day is None:
+            continue
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        _upsert_rollup(
+            db, UserDailyStat, {"user_id": user_id, "day": day, "input_type": input_type},
+            documents, entities, increment=False
+        )
+
+    db.flush()
+
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
@@ -46,15 +138,55 @@ def create_user(db: Session, email: str, password: str, name: str):
     return user
 
 def get_user_stats(db: Session, user_id: int):
-    total_files = db.query(RedactionLog).filter(RedactionLog.user_id == user_id).count()
-    total_entities = db.query(func.sum(RedactionLog.entity_count)).filter(RedactionLog.user_id == user_id).scalar() or 0
-    
+    totals = db.query(UserStatTotal).filter(UserStatTotal.user_id == user_id).all()
+
+    if not totals:
+        has_logs = db.query(RedactionLog.id).filter(RedactionLog.user_id == user_id).first()
+        if has_logs:
+            rebuild_user_stats(db, user_id)
+            db.commit()
+            totals = db.query(UserStatTotal).filter(UserStatTotal.user_id == user_id).all()
+
+    today = _utc_today()
+    window_start = today - timedelta(days=STATS_WINDOW_DAYS - 1)
+    week_start = today - timedelta(days=6)
+
+    daily_rows = db.query(UserDailyStat).filter(
+        UserDailyStat.user_id == user_id,
+        UserDailyStat.day >= window_start
+    ).all()
+
+    last_7 = {"documents_processed": 0, "redactions_done": 0}
+    last_30 = {"documents_processed": 0, "redactions_done": 0}
+    per_day = {}
+
+    for row in daily_rows:
+        last_30["documents_processed"] += row.documents_processed
+        last_30["redactions_done"] += row.redactions_done
+        if row.day >= week_start:
+            last_7["documents_processed"] += row.documents_processed
+            last_7["redactions_done"] += row.redactions_done
+        per_day[row.day] = per_day.get(row.day, 0) + row.documents_processed
+
     user = db.query(User).filter(User.id == user_id).first()
-    
+
     return {
         "name": user.name if user else None,
-        "documents_processed": total_files,
-        "redactions_done": total_entities,
+        "documents_processed": sum(t.documents_processed for t in totals),
+        "redactions_done": sum(t.redactions_done for t in totals),
+        "last_7_days": last_7,
+        "last_30_days": last_30,
+        "by_input_type": {
+            t.input_type: {
+                "documents_processed": t.documents_processed,
+                "redactions_done": t.redactions_done,
+            }
+            for t in totals
+        },
+        "daily": [
+            {"date": day.isoformat(), "count": per_day[day]}
+            for day in sorted(per_day)
+        ],
     }
 
 def check_user_upload_limit(db: Session, user_id: int):
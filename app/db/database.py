@@ -1,5 +1,7 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 import os
 
@@ -10,19 +12,99 @@ DATABASE_URL = os.getenv(
     "sqlite:///./redactions.db"   # fallback
 )
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+# Optional async driver URL, e.g. postgresql+asyncpg://... or sqlite+aiosqlite:///...
+DATABASE_ASYNC_URL = os.getenv("DATABASE_ASYNC_URL")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine
-)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return _is_sqlite(url) and (":memory:" in url or url.rstrip("/").endswith("sqlite:"))
+
+
+def _sqlite_on_connect(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    if SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _engine_kwargs(url: str) -> dict:
+    kwargs = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING}
+
+    if _is_sqlite_memory(url):
+        # One shared connection, otherwise every checkout sees an empty database.
+        kwargs["poolclass"] = StaticPool
+        return kwargs
+
+    kwargs.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return kwargs
+
+
+def build_engine(url: str = DATABASE_URL):
+    kwargs = _engine_kwargs(url)
+
+    if _is_sqlite(url):
+        kwargs["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+
+    db_engine = create_engine(url, **kwargs)
+
+    if _is_sqlite(url):
+        event.listen(db_engine, "connect", _sqlite_on_connect)
+
+    return db_engine
 
+
+def build_async_engine(url: str | None = DATABASE_ASYNC_URL):
+    if not url:
+        return None
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    kwargs = _engine_kwargs(url)
+    if _is_sqlite(url):
+        kwargs["connect_args"] = {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+
+    db_engine = create_async_engine(url, **kwargs)
+
+    if _is_sqlite(url):
+        event.listen(db_engine.sync_engine, "connect", _sqlite_on_connect)
+
+    return db_engine
+
+
+engine = build_engine()
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+async_engine = build_async_engine()
+AsyncSessionLocal = None
+if async_engine is not None:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -31,3 +113,46 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("DATABASE_ASYNC_URL is not configured")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Run a sync crud function from an async route without blocking the event loop.
+    Uses the async engine when configured, otherwise a pooled sync session in the threadpool.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(lambda session: fn(session, *args, **kwargs))
+
+    def _call():
+        db = SessionLocal()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    return await run_in_threadpool(_call)
+
+
+def get_pool_stats() -> dict:
+    stats = {}
+    for name, db_engine in (("sync", engine), ("async", async_engine)):
+        if db_engine is None:
+            continue
+        pool = db_engine.pool if name == "sync" else db_engine.sync_engine.pool
+        size = getattr(pool, "size", None)
+        stats[name] = {
+            "pool": type(pool).__name__,
+            "size": size() if callable(size) else 0,
+            "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else 0,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else 0,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else 0,
+        }
+    return stats
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, DateTime, String, Boolean
+from sqlalchemy import Column, Integer, Text, DateTime, String, Boolean, Date, UniqueConstraint
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -25,4 +25,26 @@ class User(Base):
     name = Column(String, nullable=True)
     upload_limit = Column(Integer, default=20)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class UserStatTotal(Base):
+    __tablename__ = "user_stat_totals"
+    __table_args__ = (UniqueConstraint("user_id", "input_type"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    input_type = Column(String, nullable=False)
+    documents_processed = Column(Integer, nullable=False, default=0)
+    redactions_done = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class UserDailyStat(Base):
+    __tablename__ = "user_daily_stats"
+    __table_args__ = (UniqueConstraint("user_id", "day", "input_type"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    day = Column(Date, nullable=False, index=True)
+    input_type = Column(String, nullable=False)
+    documents_processed = Column(Integer, nullable=False, default=0)
+    redactions_done = Column(Integer, nullable=False, default=0)
@@ -1,22 +1,49 @@
+import time
+import uuid
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from app.api.routes import router
 from app.core.pipeline import PIIPipeline
-from app.db.database import engine
+from app.services.model_registry import ModelRegistry
+from app.services.pseudonymizer import Pseudonymizer
+from app.services.patterns import pattern_registry
+from app.utils.pdf_ocr import shutdown_pool as shutdown_ocr_pool
+from app.utils.upload_reader import UploadSizeLimit
+from app.services.file_extractors.csv_parallel import shutdown_pool as shutdown_csv_pool
+from app.db.database import engine, async_engine, get_pool_stats, run_db
 from app.db.models import Base
 from app.api.auth_routes import router as auth_router
+from app.api.metrics_routes import router as metrics_router
+from app.api.admin_routes import router as admin_router
+from app.core.metrics import HTTP_REQUEST_SECONDS, QUEUE_DEPTH
+from app.core.profiling import start_profile, stop_profile
+from app.auth.dependencies import get_user_from_token, is_admin
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Loading Pipeline..")
     try:
         app.state.pii_pipeline = PIIPipeline()
+        app.state.model_registry = ModelRegistry(app.state.pii_pipeline)
+        app.state.pseudonymizer = Pseudonymizer()
+        # Compile and check the patterns now rather than on the first request
+        pattern_registry.current()
         print("Pipeline Loaded Successfully!")
     except Exception:
         raise
     yield
     print("Shutting down Pipeline!")
+    app.state.model_registry.shutdown()
+    app.state.pii_pipeline.slots.shutdown()
+    app.state.pseudonymizer.close()
+    shutdown_ocr_pool()
+    shutdown_csv_pool()
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
 
 app = FastAPI(
     title="Insurance PII Redaction API",
@@ -32,6 +59,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(UploadSizeLimit)
+
+_inflight = QUEUE_DEPTH.labels("http_inflight")
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status_code = 500
+    _inflight.inc()
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        _inflight.dec()
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        HTTP_REQUEST_SECONDS.labels(request.method, path, str(status_code)).observe(
+            time.perf_counter() - start
+        )
+
+def _wants_profile(request: Request) -> bool:
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    return flag is not None and flag.lower() in ("1", "true", "yes")
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    if not _wants_profile(request):
+        return await call_next(request)
+
+    auth = request.headers.get("authorization", "")
+    token = auth[7:] if auth.lower().startswith("bearer ") else ""
+    user = await run_db(get_user_from_token, token) if token else None
+    if not is_admin(user):
+        return JSONResponse(status_code=403, content={"detail": "Profiling requires admin privileges"})
+
+    request_id = uuid.uuid4().hex
+    ctx = start_profile(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        profile = stop_profile(ctx)
+    await run_in_threadpool(profile.save)
+    response.headers["X-Profile-Id"] = request_id
+    return response
+
 Base.metadata.create_all(bind=engine)
 
 app.include_router(router)
@@ -40,4 +113,10 @@ app.include_router(router)
 def health():
     return {"status": "ok"}
 
-app.include_router(auth_router)
\ No newline at end of file
+@app.get("/health/db")
+def db_pool_health():
+    return get_pool_stats()
+
+app.include_router(auth_router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
\ No newline at end of file
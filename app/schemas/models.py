@@ -0,0 +1,18 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class ModelLoadRequest(BaseModel):
+    name: str = Field(min_length=1, max_length=64)
+    path: str = Field(min_length=1)
+
+class ShadowRequest(BaseModel):
+    name: str
+    sample_rate: float = Field(0.05, gt=0, le=1)
+
+class ModelInfo(BaseModel):
+    name: str
+    path: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+    load_seconds: Optional[float] = None
+    loaded_at: Optional[float] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import List
+from typing import List, Dict
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -26,7 +26,15 @@ class RedactionStat(BaseModel):
     date: str
     count: int
 
+class StatWindow(BaseModel):
+    documents_processed: int = 0
+    redactions_done: int = 0
+
 class UserStats(BaseModel):
     name: str | None = None
     documents_processed: int
     redactions_done: int
+    last_7_days: StatWindow = StatWindow()
+    last_30_days: StatWindow = StatWindow()
+    by_input_type: Dict[str, StatWindow] = {}
+    daily: List[RedactionStat] = []
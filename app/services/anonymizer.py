@@ -1,10 +1,10 @@
 # anonymizer.py
-from typing import List, Dict
+from typing import Dict
 
 from presidio_anonymizer import AnonymizerEngine
 from presidio_anonymizer.entities import OperatorConfig, RecognizerResult
 
-from .detector import PIIEntity
+from .entities import EntityBatch
 
 
 class PresidioWrapper:
@@ -14,17 +14,17 @@ class PresidioWrapper:
     def anonymize(
         self,
         text: str,
-        entities: List[PIIEntity],
+        entities: EntityBatch,
         operators: Dict[str, OperatorConfig],
     ) -> str:
         results = [
             RecognizerResult(
-                entity_type=e.entity_type,
-                start=e.start,
-                end=e.end,
-                score=e.score,
+                entity_type=entity_type,
+                start=start,
+                end=end,
+                score=score,
             )
-            for e in entities
+            for entity_type, start, end, score in entities.spans()
         ]
         return self.engine.anonymize(
             text=text,
@@ -1,152 +1,279 @@
 # detector.py
 import logging
-from dataclasses import dataclass
-from typing import List, Dict, Any
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 
-from gliner import GLiNER
-from app.core.config import GLINER_MODEL_PATH, GLINER_SCORE_THRESHOLD, GLINER_LABELS, REGEX_PATTERNS
+from app.core.config import (
+    GLINER_MODEL_PATH,
+    GLINER_SCORE_THRESHOLD,
+    GLINER_LABELS,
+    REGEX_PATTERN_SPECS,
+    REGEX_ONLY_TYPES,
+    GLINER_LABEL_CACHE_SIZE,
+    ENTITY_TYPES,
+    ENTITY_MERGE_GAPS,
+    ENTITY_PRIORITY,
+    MIN_TRIMMED_SPAN,
+)
+from .entities import EntityBatch, type_code
+from .patterns import pattern_registry
+from app.core.metrics import record_cache
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class PIIEntity:
-    entity_type: str
-    start: int
-    end: int
-    score: float
-    text: str
+def _match_entity_type(label: str) -> str:
+    l = label.lower()
+    for entity_type, spec in ENTITY_TYPES.items():
+        if l in spec.get("exact", ()):
+            return entity_type
+        for keyword in spec.get("contains", ()):
+            if keyword in l:
+                return entity_type
+    return label.upper()
+
+
+def _build_label_table() -> Dict[str, str]:
+    known = set(GLINER_LABELS) | set(REGEX_PATTERN_SPECS) | set(ENTITY_TYPES)
+    for spec in ENTITY_TYPES.values():
+        known.update(spec.get("exact", ()))
+    table = {}
+    for label in known:
+        table[label] = _match_entity_type(label)
+        table[label.lower()] = _match_entity_type(label.lower())
+    return table
 
 
 class LabelMapper:
+    # Built once from ENTITY_TYPES for every label this process knows about;
+    # anything else falls back to the rule scan, memoized.
+    _table: Dict[str, str] = _build_label_table()
+
     @staticmethod
     def normalize(label: str) -> str:
-        l = label.lower()
-
-        if "role_name" in l or "patient_name" in l:
-            return "PERSON"
-        if "trailing_name_with_cred" in l or "bullet_provider" in l:
-            return "PERSON"
-
-        if "person" in l or "name" in l:
-            return "PERSON"
-        if "email" in l:
-            return "EMAIL_ADDRESS"
-        if "phone" in l:
-            return "PHONE_NUMBER"
-        if "fax" in l:
-            return "FAX_NUMBER"
-        if "ssn" in l:
-            return "US_SSN"
-        if "credit" in l:
-            return "CREDIT_CARD"
-        if "bank" in l:
-            return "BANK_ACCOUNT"
-        if "address" in l or "location" in l:
-            return "ADDRESS"
-        if "date of birth" in l:
-            return "DATE_TIME"
-        if l == "date":
-            return "DATE_TIME"
-        if "organization" in l:
-            return "ORGANIZATION"
-        if "medical record number" in l or l == "mrn":
-            return "MEDICAL_RECORD_NUMBER"
-
-        return label.upper()
+        hit = LabelMapper._table.get(label)
+        if hit is not None:
+            return hit
+        return _normalize_unknown(label)
+
+
+@lru_cache(maxsize=1024)
+def _normalize_unknown(label: str) -> str:
+    return _match_entity_type(label)
+
+
+@lru_cache(maxsize=64)
+def _types_by_label(labels: Tuple[str, ...]) -> Tuple[Tuple[str, str], ...]:
+    return tuple((label, LabelMapper.normalize(label)) for label in labels)
+
+
+def labels_for_types(
+    selected_entities: Optional[Iterable[str]],
+    labels: List[str] = GLINER_LABELS,
+) -> List[str]:
+    """
+    Minimal GLiNER label set that can produce the selected entity types,
+    i.e. the inverse of LabelMapper.normalize over the configured labels.
+    Returns [] when the model is not needed at all.
+    """
+    if selected_entities is None:
+        return list(labels)
+    wanted = set(selected_entities)
+    if wanted <= REGEX_ONLY_TYPES:
+        return []
+    return [label for label, entity_type in _types_by_label(tuple(labels)) if entity_type in wanted]
 
 
 class GLiNERDetector:
-    def __init__(self):
-        logger.info("Loading GLiNER model from %s", GLINER_MODEL_PATH)
-        self.model = GLiNER.from_pretrained(GLINER_MODEL_PATH)
+    def __init__(self, model_path: Optional[str] = None):
+        # Imported here so regex-only tooling (benchmarks, stub detectors) can
+        # use this module without pulling in torch.
+        from gliner import GLiNER
+
+        self.model_path = model_path or GLINER_MODEL_PATH
+        logger.info("Loading GLiNER model from %s", self.model_path)
+        self.model = GLiNER.from_pretrained(self.model_path)
         self.score_threshold = GLINER_SCORE_THRESHOLD
         self.labels = GLINER_LABELS
 
-    def detect(self, text: str) -> List[Dict[str, Any]]:
+        # Bi-encoder GLiNER models encode labels separately from the text, so
+        # their label embeddings can be computed once per label set. Uni-encoder
+        # models fold labels into the prompt and have nothing to cache.
+        self._label_cache: "OrderedDict[Tuple[str, ...], Any]" = OrderedDict()
+        self._label_lock = threading.Lock()
+        self.supports_label_cache = bool(
+            getattr(getattr(self.model, "config", None), "labels_encoder", None)
+            and hasattr(self.model, "encode_labels")
+            and hasattr(self.model, "batch_predict_with_embeds")
+        )
+
+    def _label_embeddings(self, labels: Tuple[str, ...]):
+        with self._label_lock:
+            cached = self._label_cache.get(labels)
+            if cached is not None:
+                self._label_cache.move_to_end(labels)
+        record_cache("gliner_labels", cached is not None)
+        if cached is not None:
+            return cached
+
+        embeddings = self.model.encode_labels(list(labels))
+        with self._label_lock:
+            self._label_cache[labels] = embeddings
+            while len(self._label_cache) > GLINER_LABEL_CACHE_SIZE:
+                self._label_cache.popitem(last=False)
+        return embeddings
+
+    def detect(self, text: str, labels: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         if not text.strip():
             return []
+        labels = self.labels if labels is None else labels
+        if not labels:
+            return []
+
+        if self.supports_label_cache:
+            key = tuple(labels)
+            return self.model.batch_predict_with_embeds(
+                [text],
+                self._label_embeddings(key),
+                list(key),
+                threshold=self.score_threshold,
+            )[0]
+
         return self.model.predict_entities(
             text=text,
-            labels=self.labels,
+            labels=labels,
             threshold=self.score_threshold,
         )
 
+    def detect_batch(
+        self, texts: List[str], labels: Optional[List[str]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        labels = self.labels if labels is None else labels
+        results: List[List[Dict[str, Any]]] = [[] for _ in texts]
+        todo = [i for i, text in enumerate(texts) if text.strip()]
+        if not todo or not labels:
+            return results
 
-def regex_detect(text: str) -> List[PIIEntity]:
-    entities: List[PIIEntity] = []
-    for etype, pattern in REGEX_PATTERNS.items():
-        for m in pattern.finditer(text):
-            if etype == "BULLET_PROVIDER":
-                start, end = m.start(1), m.end(1)
-            else:
-                start, end = m.start(), m.end()
-            entities.append(
-                PIIEntity(
-                    entity_type=etype,
-                    start=start,
-                    end=end,
-                    score=1.0,
-                    text=text[start:end],
-                )
+        batch = [texts[i] for i in todo]
+        if self.supports_label_cache:
+            key = tuple(labels)
+            predicted = self.model.batch_predict_with_embeds(
+                batch,
+                self._label_embeddings(key),
+                list(key),
+                threshold=self.score_threshold,
             )
-    return entities
-
-
-def merge_person_entities(text: str, entities: List[PIIEntity]) -> List[PIIEntity]:
-    entities = sorted(entities, key=lambda e: e.start)
-    merged: List[PIIEntity] = []
-    i = 0
-
-    while i < len(entities):
-        cur = entities[i]
-        if cur.entity_type == "PERSON":
-            j = i + 1
-            end = cur.end
-            score = cur.score
-            while (
-                j < len(entities)
-                and entities[j].entity_type == "PERSON"
-                and entities[j].start - end <= 2
-            ):
-                end = entities[j].end
-                score = max(score, entities[j].score)
-                j += 1
-
-            merged.append(
-                PIIEntity(
-                    entity_type="PERSON",
-                    start=cur.start,
-                    end=end,
-                    score=score,
-                    text=text[cur.start:end],
-                )
+        elif hasattr(self.model, "batch_predict_entities"):
+            predicted = self.model.batch_predict_entities(
+                batch,
+                labels,
+                threshold=self.score_threshold,
             )
-            i = j
         else:
-            merged.append(cur)
-            i += 1
+            predicted = [self.detect(text, labels) for text in batch]
+
+        for i, entities in zip(todo, predicted):
+            results[i] = entities
+        return results
+
+
+def model_entities(text: str, raw: List[Dict[str, Any]]) -> EntityBatch:
+    batch = EntityBatch(text)
+    for e in raw:
+        batch.append(e["label"], int(e["start"]), int(e["end"]), float(e["score"]))
+    return batch
+
+
+def regex_detect(text: str) -> EntityBatch:
+    entities = EntityBatch(text)
+    for etype, pattern in pattern_registry.current().detect_items:
+        code = type_code(etype)
+        for start, end in pattern.spans(text):
+            entities.append_code(code, start, end, 1.0)
+    return entities
 
-    return merged
 
+def _is_separator(text: str, start: int, end: int) -> bool:
+    for i in range(start, end):
+        if text[i].isalnum():
+            return False
+    return True
 
-def normalize_addresses(text: str, entities: List[PIIEntity]) -> List[PIIEntity]:
-    addr = [e for e in entities if e.entity_type == "ADDRESS"]
-    others = [e for e in entities if e.entity_type != "ADDRESS"]
 
-    if not addr:
+def resolve_overlaps(text: str, entities: EntityBatch) -> EntityBatch:
+    """
+    Single sort plus two linear sweeps:
+
+    1. Same-type spans that overlap or sit within ENTITY_MERGE_GAPS of each
+       other (separators only) are merged into one cluster. This also drops
+       duplicate hits, e.g. GLiNER and regex finding the same name.
+    2. Overlapping clusters of different types are resolved by priority,
+       score, then length: clusters are placed best first, and each later
+       one keeps only the parts (head, tail or gaps) no kept span covers,
+       when enough of a part remains. The result never overlaps.
+    """
+    n = len(entities)
+    if n == 0:
         return entities
 
-    start = min(e.start for e in addr)
-    end = max(e.end for e in addr)
+    starts, ends, scores, codes = entities.starts, entities.ends, entities.scores, entities.codes
+    order = sorted(range(n), key=lambda i: (starts[i], -ends[i]))
 
-    others.append(
-        PIIEntity(
-            entity_type="ADDRESS",
-            start=start,
-            end=end,
-            score=max(e.score for e in addr),
-            text=text[start:end],
-        )
-    )
-    return others
+    gaps = {type_code(t): g for t, g in ENTITY_MERGE_GAPS.items()}
+    priority = {type_code(t): p for t, p in ENTITY_PRIORITY.items()}
+
+    # clusters: [code, start, end, score], created in start order
+    clusters: List[list] = []
+    open_cluster: Dict[int, list] = {}
+
+    for i in order:
+        code, start, end, score = codes[i], starts[i], ends[i], scores[i]
+        cur = open_cluster.get(code)
+        if cur is not None and (
+            start <= cur[2]
+            or (start - cur[2] <= gaps.get(code, 0) and _is_separator(text, cur[2], start))
+        ):
+            if end > cur[2]:
+                cur[2] = end
+            if score > cur[3]:
+                cur[3] = score
+            continue
+        cur = [code, start, end, score]
+        clusters.append(cur)
+        open_cluster[code] = cur
+
+    def rank(c):
+        return (priority.get(c[0], 0), c[3], c[2] - c[1])
+
+    # Kept spans, sorted and non-overlapping, so their ends are sorted too
+    kept_starts: List[int] = []
+    kept_ends: List[int] = []
+    kept: List[list] = []
+    for c in sorted(clusters, key=rank, reverse=True):
+        code, start, end, score = c
+        k = bisect_right(kept_ends, start)
+        if k == len(kept) or kept_starts[k] >= end:
+            pieces = [(start, end)]
+        else:
+            pieces = []
+            pos = start
+            while k < len(kept) and kept_starts[k] < end:
+                if kept_starts[k] - pos >= MIN_TRIMMED_SPAN and not _is_separator(text, pos, kept_starts[k]):
+                    pieces.append((pos, kept_starts[k]))
+                pos = max(pos, kept_ends[k])
+                k += 1
+            if end - pos >= MIN_TRIMMED_SPAN and not _is_separator(text, pos, end):
+                pieces.append((pos, end))
+        for piece_start, piece_end in pieces:
+            at = bisect_right(kept_starts, piece_start)
+            kept_starts.insert(at, piece_start)
+            kept_ends.insert(at, piece_end)
+            kept.insert(at, [code, piece_start, piece_end, score])
+
+    resolved = EntityBatch(text)
+    for code, start, end, score in kept:
+        resolved.append_code(code, start, end, score)
+    return resolved
@@ -0,0 +1,153 @@
+# entities.py
+import threading
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# -------------------------------
+# Entity type interning
+# -------------------------------
+# Entity types are stored as small integer codes. The table only grows and
+# is shared process-wide, so codes are stable for the life of the process.
+_TYPE_NAMES: List[str] = []
+_TYPE_CODES: Dict[str, int] = {}
+_TYPE_LOCK = threading.Lock()
+
+
+def type_code(entity_type: str) -> int:
+    code = _TYPE_CODES.get(entity_type)
+    if code is None:
+        with _TYPE_LOCK:
+            code = _TYPE_CODES.get(entity_type)
+            if code is None:
+                code = len(_TYPE_NAMES)
+                _TYPE_NAMES.append(entity_type)
+                _TYPE_CODES[entity_type] = code
+    return code
+
+
+def type_name(code: int) -> str:
+    return _TYPE_NAMES[code]
+
+
+class PIIEntity:
+    """
+    Read-only view of one row of an EntityBatch. The matched substring is
+    only sliced out of the source text when .text is accessed.
+    """
+    __slots__ = ("_batch", "_i")
+
+    def __init__(self, batch: "EntityBatch", index: int):
+        self._batch = batch
+        self._i = index
+
+    @property
+    def entity_type(self) -> str:
+        return _TYPE_NAMES[self._batch.codes[self._i]]
+
+    @property
+    def start(self) -> int:
+        return self._batch.starts[self._i]
+
+    @property
+    def end(self) -> int:
+        return self._batch.ends[self._i]
+
+    @property
+    def score(self) -> float:
+        return self._batch.scores[self._i]
+
+    @property
+    def text(self) -> str:
+        return self._batch.text[self.start:self.end]
+
+    def __repr__(self):
+        return (
+            f"PIIEntity(entity_type={self.entity_type!r}, start={self.start}, "
+            f"end={self.end}, score={self.score})"
+        )
+
+
+class EntityBatch:
+    """
+    Struct-of-arrays container for the entities found in one text: parallel
+    start/end/score arrays plus interned type codes.
+    """
+    __slots__ = ("text", "starts", "ends", "scores", "codes")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.starts = array("l")
+        self.ends = array("l")
+        self.scores = array("d")
+        self.codes = array("H")
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self) -> Iterator[PIIEntity]:
+        for i in range(len(self.starts)):
+            yield PIIEntity(self, i)
+
+    def __getitem__(self, index: int) -> PIIEntity:
+        if index < 0:
+            index += len(self.starts)
+        if not 0 <= index < len(self.starts):
+            raise IndexError("entity index out of range")
+        return PIIEntity(self, index)
+
+    def append(self, entity_type: str, start: int, end: int, score: float):
+        self.append_code(type_code(entity_type), start, end, score)
+
+    def append_code(self, code: int, start: int, end: int, score: float):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.scores.append(score)
+        self.codes.append(code)
+
+    def extend(self, other: "EntityBatch"):
+        self.starts.extend(other.starts)
+        self.ends.extend(other.ends)
+        self.scores.extend(other.scores)
+        self.codes.extend(other.codes)
+
+    def take(self, indices: Iterable[int]) -> "EntityBatch":
+        out = EntityBatch(self.text)
+        starts, ends, scores, codes = self.starts, self.ends, self.scores, self.codes
+        for i in indices:
+            out.starts.append(starts[i])
+            out.ends.append(ends[i])
+            out.scores.append(scores[i])
+            out.codes.append(codes[i])
+        return out
+
+    def map_types(self, fn: Callable[[str], str]):
+        """Rewrite every type through fn, calling it once per distinct type rather than per entity."""
+        remap: Dict[int, int] = {}
+        codes = self.codes
+        for i, code in enumerate(codes):
+            new = remap.get(code)
+            if new is None:
+                new = remap[code] = type_code(fn(_TYPE_NAMES[code]))
+            codes[i] = new
+
+    def select(self, entity_types: Optional[Iterable[str]]) -> "EntityBatch":
+        if entity_types is None:
+            return self
+        wanted = {_TYPE_CODES[t] for t in entity_types if t in _TYPE_CODES}
+        return self.take(i for i, code in enumerate(self.codes) if code in wanted)
+
+    def spans(self) -> Iterator[Tuple[str, int, int, float]]:
+        names = _TYPE_NAMES
+        return zip(
+            (names[c] for c in self.codes), self.starts, self.ends, self.scores
+        )
+
+    def entity_types(self) -> set:
+        return {_TYPE_NAMES[c] for c in set(self.codes)}
+
+    def to_dicts(self) -> List[dict]:
+        return [
+            {"entity_type": t, "start": s, "end": e, "score": sc}
+            for t, s, e, sc in self.spans()
+        ]
@@ -1,26 +1,59 @@
 import pandas as pd
-from io import BytesIO
+from app.utils.upload_reader import as_file
 
-def get_csv_columns(file_bytes: bytes) -> list[str]:
-    df = pd.read_csv(BytesIO(file_bytes), encoding="utf-8-sig")
-    df.columns = df.columns.str.strip()
-    return df.columns.tolist()
+from app.core.metrics import PAGES_PROCESSED
+from app.core.profiling import profiled
+from .csv_parallel import detect_columns
 
-def extract_redacted_csv_data(
-    file_bytes: bytes,
-    selected_columns: list[str]
-) -> tuple[list[str], list, int]:
-    df = pd.read_csv(BytesIO(file_bytes), encoding="utf-8-sig")
+CSV_MODES = ("mask", "detect")
+
+def get_csv_columns(source: bytes | str) -> list[str]:
+    df = pd.read_csv(as_file(source), encoding="utf-8-sig", nrows=0)
     df.columns = df.columns.str.strip()
+    return df.columns.tolist()
 
+def _redact_columns(df, selected_columns, mode, pipeline, selected_entities, workers=None, pseudonyms=None) -> int:
+    """
+    "mask" replaces whole columns; "detect" redacts only the PII found in
+    each cell of those columns. With pseudonyms, masked cells become one
+    token per distinct value.
+    """
     missing = set(selected_columns) - set(df.columns)
     if missing:
         raise ValueError(f"Invalid columns selected: {missing}")
+    if mode not in CSV_MODES:
+        raise ValueError(f"mode must be one of: {', '.join(CSV_MODES)}")
 
-    entity_count = len(df) * len(selected_columns)
+    if mode == "detect":
+        if workers is None:
+            return detect_columns(df, selected_columns, pipeline, selected_entities, pseudonyms=pseudonyms)
+        return detect_columns(
+            df, selected_columns, pipeline, selected_entities, workers=workers, pseudonyms=pseudonyms
+        )
 
     for col in selected_columns:
-        df[col] = "[REDACTED]"
+        if pseudonyms is None:
+            df[col] = "[REDACTED]"
+        else:
+            original = df[col]
+            tokens = {value: pseudonyms.token("DEFAULT", str(value)) for value in original.dropna().unique()}
+            df[col] = original.map(tokens).where(original.notna(), original)
+    return len(df) * len(selected_columns)
+
+@profiled("csv.redact")
+def extract_redacted_csv_data(
+    source: bytes | str,
+    selected_columns: list[str],
+    mode: str = "mask",
+    pipeline=None,
+    selected_entities: list[str] | None = None,
+    pseudonyms=None
+) -> tuple[list[str], list, int]:
+    df = pd.read_csv(as_file(source), encoding="utf-8-sig")
+    df.columns = df.columns.str.strip()
+
+    PAGES_PROCESSED.labels("csv_rows").inc(len(df))
+    entity_count = _redact_columns(df, selected_columns, mode, pipeline, selected_entities, pseudonyms=pseudonyms)
 
     headers = df.columns.tolist()
     rows = df.values.tolist()
@@ -28,20 +61,19 @@ def extract_redacted_csv_data(
     return headers, rows, entity_count
 
 def get_redacted_csv_preview(
-    file_bytes: bytes,
+    source: bytes | str,
     selected_columns: list[str],
-    limit: int = 5
+    limit: int = 5,
+    mode: str = "mask",
+    pipeline=None,
+    selected_entities: list[str] | None = None,
+    pseudonyms=None
 ) -> dict:
-    df = pd.read_csv(BytesIO(file_bytes), encoding="utf-8-sig", nrows=limit)
+    df = pd.read_csv(as_file(source), encoding="utf-8-sig", nrows=limit)
     df.columns = df.columns.str.strip()
 
-    missing = set(selected_columns) - set(df.columns)
-    if missing:
-        raise ValueError(f"Invalid columns selected: {missing}")
-
-    for col in selected_columns:
-        if col in df.columns:
-            df[col] = "[REDACTED]"
+    # A handful of rows is not worth shipping to the worker pool
+    _redact_columns(df, selected_columns, mode, pipeline, selected_entities, workers=0, pseudonyms=pseudonyms)
 
     return {
         "headers": df.columns.tolist(),
@@ -0,0 +1,296 @@
+# csv_parallel.py
+"""
+Cell-level PII detection for CSV columns, split into row blocks.
+
+The selected columns are packed once into a shared-memory segment (UTF-8
+cell bytes plus an offsets table and a null mask). Worker processes attach
+to the segment by name and decode only their own block, so the input is
+never pickled per task; only the redacted strings travel back. Blocks
+wait for a worker in fair-share order across users, like model calls
+wait for an inference slot.
+"""
+import logging
+import os
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from app.core.config import CSV_WORKERS, CSV_BLOCK_ROWS, CSV_BATCH_CELLS, PII_SLOT_WAIT_SECONDS
+from app.core.concurrency import InferenceBusy
+from app.core.fairness import FairScheduler, charge_current, current_flow
+from app.core.metrics import PAGES_PROCESSED, stage_timer
+
+logger = logging.getLogger(__name__)
+
+_OFFSET_SIZE = array("q").itemsize
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_model: Optional[tuple] = None
+_pool_lock = threading.Lock()
+# One permit per worker process, so submitted blocks never queue in the pool.
+# It outlives pool rebuilds: requests holding permits on a pool that broke
+# still count against the one that replaced it.
+_scheduler = FairScheduler(max(1, CSV_WORKERS))
+
+# Worker-process state
+_worker_pipeline = None
+
+
+class PackedColumns:
+    """
+    Layout of the shared segment:
+    [offsets: int64 x (ncols * nrows + 1)][nulls: uint8 x ncols * nrows][cell bytes]
+    Cell (col, row) is data[offsets[i]:offsets[i + 1]] with i = col * nrows + row.
+    """
+    __slots__ = ("shm", "nrows", "ncols", "nulls_at", "data_at", "data_bytes", "offsets")
+
+    def __init__(self, df: pd.DataFrame, columns: List[str]):
+        nrows, ncols = len(df), len(columns)
+        n = nrows * ncols
+        offsets = array("q", [0])
+        nulls = bytearray(n)
+        chunks = []
+        total = 0
+        i = 0
+        for col in columns:
+            for value in df[col].tolist():
+                if value is None or (isinstance(value, float) and value != value):
+                    nulls[i] = 1
+                else:
+                    encoded = str(value).encode("utf-8")
+                    chunks.append(encoded)
+                    total += len(encoded)
+                offsets.append(total)
+                i += 1
+
+        self.nrows, self.ncols = nrows, ncols
+        self.data_bytes = total
+        self.offsets = offsets
+        self.nulls_at = len(offsets) * _OFFSET_SIZE
+        self.data_at = self.nulls_at + n
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, self.data_at + total))
+        buf = self.shm.buf
+        buf[:self.nulls_at] = offsets.tobytes()
+        buf[self.nulls_at:self.data_at] = nulls
+        pos = self.data_at
+        for encoded in chunks:
+            buf[pos:pos + len(encoded)] = encoded
+            pos += len(encoded)
+
+    def block_bytes(self, col: int, row_start: int, row_end: int) -> int:
+        base = col * self.nrows
+        return self.offsets[base + row_end] - self.offsets[base + row_start]
+
+    @property
+    def layout(self) -> tuple:
+        return self.shm.name, self.nrows, self.nulls_at, self.data_at
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def read_block(layout: tuple, col: int, row_start: int, row_end: int) -> List[Optional[str]]:
+    name, nrows, nulls_at, data_at = layout
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        buf = shm.buf
+        offsets = buf[:nulls_at].cast("q")
+        base = col * nrows
+        cells = []
+        for i in range(base + row_start, base + row_end):
+            if buf[nulls_at + i]:
+                cells.append(None)
+            else:
+                cells.append(bytes(buf[data_at + offsets[i]:data_at + offsets[i + 1]]).decode("utf-8"))
+        del offsets, buf
+        return cells
+    finally:
+        shm.close()
+
+
+def redact_cells(
+    pipeline, cells: List[Optional[str]], selected_entities=None, pseudonyms=None
+) -> Tuple[List[Optional[str]], int]:
+    from app.utils.redaction_helper import apply_selection
+
+    out: List[Optional[str]] = list(cells)
+    todo = [i for i, cell in enumerate(cells) if cell and cell.strip()]
+    entity_count = 0
+    run_pseudonyms = None if selected_entities else pseudonyms
+    for start in range(0, len(todo), CSV_BATCH_CELLS):
+        chunk = todo[start:start + CSV_BATCH_CELLS]
+        texts = [cells[i] for i in chunk]
+        results = pipeline.run_batch(texts, selected_entities, run_pseudonyms)
+        for i, text, (redacted, entities) in zip(chunk, texts, results):
+            out[i], entities = apply_selection(text, redacted, entities, selected_entities, pseudonyms)
+            entity_count += len(entities)
+    return out, entity_count
+
+
+def _init_worker(detector_cls, model_path: Optional[str], threads: int):
+    global _worker_pipeline
+    from app.core.concurrency import InferenceSlots
+    from app.core.pipeline import PIIPipeline
+
+    # Same detector class (and model) as the pipeline that submitted the work
+    detector = detector_cls(model_path) if model_path else detector_cls()
+    _worker_pipeline = PIIPipeline(
+        detector=detector,
+        slots=InferenceSlots(slots=1, threads=threads, wait_seconds=0),
+    )
+
+
+def _redact_block(layout: tuple, col: int, row_start: int, row_end: int, selected_entities, pseudonymize: bool):
+    from app.services.pseudonymizer import DeferredScope
+
+    cells = read_block(layout, col, row_start, row_end)
+    if not pseudonymize:
+        return (*redact_cells(_worker_pipeline, cells, selected_entities), None)
+    # Tokens are numbered by the caller's scope; send back the values instead
+    deferred = DeferredScope()
+    return (*redact_cells(_worker_pipeline, cells, selected_entities, deferred), deferred.pending)
+
+
+def _get_pool(detector, workers: int) -> Tuple[ProcessPoolExecutor, FairScheduler]:
+    """
+    One model per worker; the pool is rebuilt if the active model changed.
+    Returns the pool with the scheduler that hands out its workers.
+    """
+    global _pool, _pool_model
+    model = (type(detector), getattr(detector, "model_path", None), workers)
+    with _pool_lock:
+        if _pool is not None and _pool_model != model:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(model[0], model[1], threads),
+            )
+            _pool_model = model
+            if _scheduler.permits != workers:
+                _scheduler.resize(workers)
+        return _pool, _scheduler
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Forgets a pool that lost a worker, unless another caller already replaced it."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _submit_blocks(pool, scheduler: FairScheduler, packed: PackedColumns, blocks, selected_entities,
+                   pseudonymize: bool) -> list:
+    """
+    Submits each block once the scheduler grants it a worker; the permit
+    is returned when the block finishes. Raises InferenceBusy (after
+    cancelling what it queued) if a worker doesn't free up in time.
+    """
+    flow = current_flow()
+    timeout = PII_SLOT_WAIT_SECONDS if PII_SLOT_WAIT_SECONDS > 0 else None
+    futures = []
+    try:
+        for c, start, end in blocks:
+            if not scheduler.acquire(flow, packed.block_bytes(c, start, end), timeout=timeout):
+                raise InferenceBusy()
+            try:
+                future = pool.submit(_redact_block, packed.layout, c, start, end, selected_entities, pseudonymize)
+            except BaseException:
+                scheduler.release()
+                raise
+            future.add_done_callback(lambda _: scheduler.release())
+            futures.append(future)
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return futures
+
+
+def detect_columns(
+    df: pd.DataFrame,
+    columns: List[str],
+    pipeline,
+    selected_entities=None,
+    workers: int = CSV_WORKERS,
+    block_rows: int = CSV_BLOCK_ROWS,
+    pseudonyms=None,
+) -> int:
+    """
+    Replaces PII inside the given columns cell by cell, in place. With
+    workers > 0 blocks run on the process pool, otherwise in this process
+    with the caller's pipeline. Returns the number of entities redacted.
+    """
+    if df.empty or not columns:
+        return 0
+
+    nrows = len(df)
+    blocks = [
+        (c, start, min(start + block_rows, nrows))
+        for c in range(len(columns))
+        for start in range(0, nrows, block_rows)
+    ]
+
+    entity_count = 0
+    results = {}
+    with stage_timer("csv_detect"):
+        packed = PackedColumns(df, columns)
+        try:
+            if workers > 0:
+                # Worker pipelines can't see the request's user; charge the cells here
+                charge_current(packed.data_bytes)
+                for attempt in range(2):
+                    pool, scheduler = _get_pool(pipeline.detector, workers)
+                    try:
+                        futures = _submit_blocks(
+                            pool, scheduler, packed, blocks, selected_entities, pseudonyms is not None
+                        )
+                        for block, future in zip(blocks, futures):
+                            results[block] = future.result()
+                        break
+                    except BrokenProcessPool:
+                        # A worker died (OOM kill, crash in native code); start a new pool once
+                        _discard_pool(pool)
+                        if attempt:
+                            raise
+                        logger.warning("CSV worker pool broke, retrying on a new pool")
+            else:
+                for c, start, end in blocks:
+                    cells = read_block(packed.layout, c, start, end)
+                    results[(c, start, end)] = (*redact_cells(pipeline, cells, selected_entities, pseudonyms), None)
+        finally:
+            packed.close()
+
+    # Reassemble each column from its blocks in row order
+    for c, col in enumerate(columns):
+        values: List[Optional[str]] = []
+        for start in range(0, nrows, block_rows):
+            cells, count, pending = results[(c, start, min(start + block_rows, nrows))]
+            if pending:
+                cells = [pseudonyms.resolve(cell, pending) if cell else cell for cell in cells]
+            values.extend(cells)
+            entity_count += count
+        original = df[col]
+        df[col] = pd.Series(values, index=df.index, dtype=object).where(original.notna(), original)
+
+    PAGES_PROCESSED.labels("csv_cells").inc(nrows * len(columns))
+    return entity_count
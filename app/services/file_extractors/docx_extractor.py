@@ -1,8 +1,9 @@
 from docx import Document
-from io import BytesIO
 
-def extract_text_from_docx(file_bytes: bytes) -> str:
-    document = Document(BytesIO(file_bytes))
+from app.utils.upload_reader import as_file
+
+def extract_text_from_docx(source: bytes | str) -> str:
+    document = Document(as_file(source))
     paragraphs = []
     for para in document.paragraphs:
         if para.text:
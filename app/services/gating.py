@@ -0,0 +1,73 @@
+# gating.py
+import re
+
+from app.core.config import PII_GATING, PII_GATING_MIN_CHARS
+from app.core.metrics import counter
+
+
+GATING_DECISIONS = counter(
+    "pii_gating_decisions_total", "Segments sent to the model or skipped by the gate", ("decision",)
+)
+_to_model = GATING_DECISIONS.labels("model")
+_skipped = GATING_DECISIONS.labels("skipped")
+
+# Anything numeric or email-like can hold dates, phones, accounts, MRNs.
+_HARD_SIGNAL = re.compile(r"[0-9@]")
+_CAP_TOKEN = re.compile(r"\b[A-Z][A-Za-z'’.-]*")
+_SENTENCE_BREAK = set(".!?:;\n\r\t\"'(*•-–—[")
+
+# Capitalized words that routinely appear mid-sentence in policy/claim
+# boilerplate without being names.
+COMMON_CAPITALIZED = frozenset(
+    w.lower() for w in """
+    I A An The This That These Those It Its If In On Of For To By At As Or And But Not No Yes
+    Please Note Notice Section Page Policy Policyholder Plan Coverage Claim Claims Member
+    Insurance Insured Benefits Benefit Terms Conditions Statement Summary Total Date Amount
+    Department Services Service Company Provider Patient Review Reviewed Approved Denied
+    Monday Tuesday Wednesday Thursday Friday Saturday Sunday
+    January February March April May June July August September October November December
+    """.split()
+)
+
+
+def _is_sentence_initial(text: str, pos: int) -> bool:
+    j = pos - 1
+    while j >= 0 and text[j] == " ":
+        j -= 1
+    return j < 0 or text[j] in _SENTENCE_BREAK
+
+
+def may_contain_model_pii(text: str) -> bool:
+    """
+    Cheap check for whether GLiNER could find anything in this segment.
+    Errs towards True: only text with no digits, no "@" and no name-like
+    capitalized tokens is rejected.
+    """
+    if len(text) < PII_GATING_MIN_CHARS:
+        return True
+    if _HARD_SIGNAL.search(text):
+        return True
+
+    prev_end = -2
+    prev_common = True
+    for m in _CAP_TOKEN.finditer(text):
+        common = m.group().rstrip(".'’-").lower() in COMMON_CAPITALIZED
+
+        if not common and not _is_sentence_initial(text, m.start()):
+            return True
+        # Two capitalized tokens in a row ("John Smith"), even at sentence start
+        if m.start() - prev_end <= 1 and not (common and prev_common):
+            return True
+
+        prev_end = m.end()
+        prev_common = common
+
+    return False
+
+
+def should_run_model(text: str, mode: str = PII_GATING) -> bool:
+    if mode == "off":
+        return True
+    decision = may_contain_model_pii(text)
+    (_to_model if decision else _skipped).inc()
+    return decision
@@ -0,0 +1,292 @@
+# model_registry.py
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from app.core.concurrency import set_intraop_threads
+from app.core.config import MODEL_REGISTRY_MAX_MODELS, MODEL_SHADOW_MAX_QUEUE
+from app.core.metrics import counter, histogram
+from app.core.pipeline import detect_texts
+from .detector import GLiNERDetector, LabelMapper
+
+logger = logging.getLogger(__name__)
+
+SHADOW_SECONDS = histogram(
+    "pii_shadow_model_seconds", "Model inference time of shadowed batches", ("model", "role")
+)
+SHADOW_SPANS = counter(
+    "pii_shadow_spans_total", "Shadow comparison of model spans against the active model", ("model", "result")
+)
+SHADOW_BATCHES = counter(
+    "pii_shadow_batches_total", "Batches sampled for shadow evaluation", ("model", "outcome")
+)
+
+
+class ModelEntry:
+    __slots__ = ("name", "path", "status", "detector", "error", "load_seconds", "loaded_at")
+
+    def __init__(self, name: str, path: Optional[str], status: str = "loading", detector=None):
+        self.name = name
+        self.path = path
+        self.status = status
+        self.detector = detector
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.loaded_at: Optional[float] = time.time() if detector is not None else None
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "path": self.path,
+            "status": self.status,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "loaded_at": self.loaded_at,
+        }
+
+
+class ShadowRunner:
+    """
+    Re-runs a sampled fraction of the active model's batches through a
+    candidate model on a background thread and compares normalized spans.
+    Work beyond max_queue pending batches is dropped rather than queued,
+    so the shadow can never back up into request latency or memory.
+    """
+
+    def __init__(self, name: str, detector, sample_rate: float, max_queue: int = MODEL_SHADOW_MAX_QUEUE):
+        self.name = name
+        self.detector = detector
+        self.sample_rate = sample_rate
+        self.mapper = LabelMapper()
+        self._slots = threading.BoundedSemaphore(max(1, max_queue))
+        # One intra-op thread: the shadow must not compete with the
+        # inference slots for the CPU budget.
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="pii-shadow",
+            initializer=set_intraop_threads,
+            initargs=(1,),
+        )
+        self._lock = threading.Lock()
+        self._stats = {
+            "sampled": 0,
+            "dropped": 0,
+            "failed": 0,
+            "texts": 0,
+            "texts_identical": 0,
+            "matched": 0,
+            "primary_only": 0,
+            "shadow_only": 0,
+            "primary_seconds": 0.0,
+            "shadow_seconds": 0.0,
+        }
+        self._by_type: Dict[str, Dict[str, int]] = {}
+        self._primary_seconds = SHADOW_SECONDS.labels(name, "primary")
+        self._shadow_seconds = SHADOW_SECONDS.labels(name, "shadow")
+
+    def maybe_submit(self, texts: List[str], labels, primary: List[list], primary_seconds: float):
+        if random.random() >= self.sample_rate:
+            return
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["dropped"] += 1
+            SHADOW_BATCHES.labels(self.name, "dropped").inc()
+            return
+        try:
+            self._executor.submit(self._run, list(texts), labels, primary, primary_seconds)
+        except RuntimeError:
+            # Executor shut down by stop_shadow() while a request was finishing
+            self._slots.release()
+
+    def _spans(self, raw: list) -> set:
+        normalize = self.mapper.normalize
+        return {(normalize(e["label"]), int(e["start"]), int(e["end"])) for e in raw}
+
+    def _run(self, texts: List[str], labels, primary: List[list], primary_seconds: float):
+        try:
+            start = time.perf_counter()
+            try:
+                shadow = detect_texts(self.detector, texts, labels)
+            except Exception:
+                logger.exception("Shadow model %s failed", self.name)
+                with self._lock:
+                    self._stats["failed"] += 1
+                SHADOW_BATCHES.labels(self.name, "failed").inc()
+                return
+            elapsed = time.perf_counter() - start
+            self._primary_seconds.observe(primary_seconds)
+            self._shadow_seconds.observe(elapsed)
+            SHADOW_BATCHES.labels(self.name, "compared").inc()
+
+            matched = primary_only = shadow_only = identical = 0
+            by_type: Dict[str, Dict[str, int]] = {}
+            for p_raw, s_raw in zip(primary, shadow):
+                p, s = self._spans(p_raw), self._spans(s_raw)
+                both, p_extra, s_extra = p & s, p - s, s - p
+                matched += len(both)
+                primary_only += len(p_extra)
+                shadow_only += len(s_extra)
+                identical += not p_extra and not s_extra
+                for key, spans in (("matched", both), ("primary_only", p_extra), ("shadow_only", s_extra)):
+                    for entity_type, _, _ in spans:
+                        counts = by_type.setdefault(entity_type, {"matched": 0, "primary_only": 0, "shadow_only": 0})
+                        counts[key] += 1
+
+            for result, n in (("matched", matched), ("primary_only", primary_only), ("shadow_only", shadow_only)):
+                SHADOW_SPANS.labels(self.name, result).inc(n)
+            with self._lock:
+                stats = self._stats
+                stats["sampled"] += 1
+                stats["texts"] += len(texts)
+                stats["texts_identical"] += identical
+                stats["matched"] += matched
+                stats["primary_only"] += primary_only
+                stats["shadow_only"] += shadow_only
+                stats["primary_seconds"] += primary_seconds
+                stats["shadow_seconds"] += elapsed
+                for entity_type, counts in by_type.items():
+                    total = self._by_type.setdefault(entity_type, {"matched": 0, "primary_only": 0, "shadow_only": 0})
+                    for key, n in counts.items():
+                        total[key] += n
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            by_type = {k: dict(v) for k, v in self._by_type.items()}
+        spans = stats["matched"] + stats["primary_only"] + stats["shadow_only"]
+        sampled = stats["sampled"]
+        return {
+            "model": self.name,
+            "sample_rate": self.sample_rate,
+            **stats,
+            "span_agreement": round(stats["matched"] / spans, 4) if spans else None,
+            "mean_primary_seconds": round(stats["primary_seconds"] / sampled, 4) if sampled else None,
+            "mean_shadow_seconds": round(stats["shadow_seconds"] / sampled, 4) if sampled else None,
+            "by_type": by_type,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ModelRegistry:
+    """
+    Named detectors for one PIIPipeline. Extra models load on a background
+    thread; activate() swaps pipeline.detector in a single assignment, and
+    calls already in flight finish on the detector they started with.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        loader: Optional[Callable[[str], object]] = None,
+        max_models: int = MODEL_REGISTRY_MAX_MODELS,
+    ):
+        self.pipeline = pipeline
+        self.loader = loader or GLiNERDetector
+        self.max_models = max_models
+        self._lock = threading.Lock()
+        self._load_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pii-model-load")
+
+        default = ModelEntry("default", getattr(pipeline.detector, "model_path", None), "ready", pipeline.detector)
+        self.models: Dict[str, ModelEntry] = {"default": default}
+        self.active = "default"
+        self.shadow: Optional[ShadowRunner] = None
+
+    def _get(self, name: str) -> ModelEntry:
+        entry = self.models.get(name)
+        if entry is None:
+            raise KeyError(f"Unknown model: {name}")
+        return entry
+
+    def _ready(self, name: str) -> ModelEntry:
+        entry = self._get(name)
+        if entry.status != "ready":
+            raise ValueError(f"Model {name} is {entry.status}")
+        return entry
+
+    def load(self, name: str, path: str) -> ModelEntry:
+        with self._lock:
+            existing = self.models.get(name)
+            if existing is not None and existing.status != "failed":
+                raise ValueError(f"Model {name} already exists")
+            if existing is None and len(self.models) >= self.max_models:
+                raise ValueError(f"At most {self.max_models} models can be loaded")
+            entry = self.models[name] = ModelEntry(name, path)
+        self._load_pool.submit(self._load, entry)
+        return entry
+
+    def _load(self, entry: ModelEntry):
+        start = time.perf_counter()
+        try:
+            detector = self.loader(entry.path)
+        except Exception as e:
+            logger.exception("Loading model %s from %s failed", entry.name, entry.path)
+            entry.error = f"{type(e).__name__}: {e}"
+            entry.status = "failed"
+            return
+        entry.detector = detector
+        entry.load_seconds = round(time.perf_counter() - start, 3)
+        entry.loaded_at = time.time()
+        entry.status = "ready"
+        logger.info("Model %s ready in %.1fs", entry.name, entry.load_seconds)
+
+    def activate(self, name: str) -> ModelEntry:
+        with self._lock:
+            entry = self._ready(name)
+            if self.shadow is not None and self.shadow.name == name:
+                self._stop_shadow()
+            self.pipeline.detector = entry.detector
+            self.active = name
+        logger.info("Active model switched to %s", name)
+        return entry
+
+    def unload(self, name: str):
+        with self._lock:
+            self._get(name)
+            if name == self.active:
+                raise ValueError("Cannot unload the active model")
+            if self.shadow is not None and self.shadow.name == name:
+                raise ValueError("Stop the shadow run before unloading its model")
+            if self.models[name].status == "loading":
+                raise ValueError(f"Model {name} is still loading")
+            del self.models[name]
+
+    def start_shadow(self, name: str, sample_rate: float) -> ShadowRunner:
+        with self._lock:
+            entry = self._ready(name)
+            if name == self.active:
+                raise ValueError("Cannot shadow the active model against itself")
+            self._stop_shadow()
+            self.shadow = ShadowRunner(name, entry.detector, sample_rate)
+            self.pipeline.shadow = self.shadow
+        return self.shadow
+
+    def _stop_shadow(self) -> Optional[dict]:
+        runner = self.shadow
+        if runner is None:
+            return None
+        self.pipeline.shadow = None
+        self.shadow = None
+        runner.close()
+        return runner.stats()
+
+    def stop_shadow(self) -> Optional[dict]:
+        with self._lock:
+            return self._stop_shadow()
+
+    def status(self) -> dict:
+        return {
+            "active": self.active,
+            "models": [entry.to_dict() for entry in self.models.values()],
+            "shadow": self.shadow.stats() if self.shadow is not None else None,
+        }
+
+    def shutdown(self):
+        self.stop_shadow()
+        self._load_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,139 @@
+# normalizer.py
+"""
+Text cleanup ahead of detection. Regexes and the model see one canonical
+form of spacing, dashes, quotes and ligatures; the offset map translates
+spans found in the cleaned text back to the caller's original offsets.
+
+Pure ASCII text is returned as is. Everything else is one regex pass
+over a replacement table; only text with characters that change length
+(ligatures, zero-width characters, joined hyphenation) builds an offset map.
+"""
+import re
+from array import array
+from bisect import bisect_right
+from typing import Optional, Tuple
+
+from app.core.metrics import counter
+from .entities import EntityBatch
+
+NORMALIZED_TEXTS = counter(
+    "pii_normalized_texts_total", "Texts through the normalizer, by the path they took", ("path",)
+)
+_ascii = NORMALIZED_TEXTS.labels("ascii")
+_same_length = NORMALIZED_TEXTS.labels("same_length")
+_remapped = NORMALIZED_TEXTS.labels("remap")
+
+# One character for one character, so offsets don't move
+_SAME_LENGTH = {
+    # No-break, figure, thin, narrow and ideographic spaces
+    **{c: " " for c in "\u00a0\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u202f\u205f\u3000"},
+    # Hyphens, dashes and minus signs
+    **{c: "-" for c in "\u2010\u2011\u2012\u2013\u2014\u2015\u2212\ufe58\ufe63\uff0d"},
+    **{c: "'" for c in "\u2018\u2019\u201a\u201b\u2032\uff07"},
+    **{c: '"' for c in "\u201c\u201d\u201e\u201f\u2033\uff02"},
+    "\uff20": "@",
+    "\u2024": ".",
+    # Fullwidth digits
+    **{chr(0xFF10 + d): str(d) for d in range(10)},
+}
+
+# Length-changing substitutions
+_EXPAND = {
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi", "\ufb04": "ffl",
+    "\ufb05": "st", "\ufb06": "st",
+}
+# Soft hyphen, Mongolian vowel separator, zero-width space/joiners, word joiner, BOM
+_DROP = "\u00ad\u180e\u200b\u200c\u200d\u2060\ufeff"
+
+# Character -> replacement for everything the normalizer rewrites
+_TABLE = {**_SAME_LENGTH, **_EXPAND, **{c: "" for c in _DROP}}
+
+# One pass finds every character in the table plus hyphen/soft hyphen
+# before a line break; the latter is only joined between lowercase letters
+# ("exam-\nple"), so "Smith-\nJones" keeps its hyphen.
+_CHANGES = re.compile("[-\u00ad]\n|[" + "".join(_TABLE) + "]")
+
+
+class OffsetMap:
+    """
+    Breakpoints where normalized and original offsets diverge: from
+    norm_at[i] up to the next breakpoint, normalized offset n is original
+    orig_at[i] + (n - norm_at[i]). Each character of an expanded ligature
+    gets its own breakpoint pointing at the ligature.
+    """
+    __slots__ = ("norm_at", "orig_at", "original_length")
+
+    def __init__(self, original_length: int):
+        self.norm_at = array("l", [0])
+        self.orig_at = array("l", [0])
+        self.original_length = original_length
+
+    def _mark(self, norm: int, orig: int):
+        if self.norm_at[-1] == norm:
+            self.orig_at[-1] = orig
+        else:
+            self.norm_at.append(norm)
+            self.orig_at.append(orig)
+
+    def to_original(self, n: int) -> int:
+        i = bisect_right(self.norm_at, n) - 1
+        return min(self.orig_at[i] + (n - self.norm_at[i]), self.original_length)
+
+    def span_to_original(self, start: int, end: int) -> Tuple[int, int]:
+        # The end is mapped through the last character it covers, so a span
+        # ending inside a ligature covers the whole ligature.
+        orig_start = self.to_original(start)
+        orig_end = self.to_original(end - 1) + 1 if end > start else orig_start
+        return orig_start, min(orig_end, self.original_length)
+
+    def remap(self, entities: EntityBatch, original: str) -> EntityBatch:
+        """Rewrites the batch's offsets (in place) to refer to the original text."""
+        starts, ends = entities.starts, entities.ends
+        for i in range(len(starts)):
+            starts[i], ends[i] = self.span_to_original(starts[i], ends[i])
+        entities.text = original
+        return entities
+
+
+def normalize_text(text: str) -> Tuple[str, Optional[OffsetMap]]:
+    """(normalized text, offset map); the map is None when offsets are unchanged."""
+    if text.isascii() and "-\n" not in text:
+        _ascii.inc()
+        return text, None
+
+    offsets = None
+    parts = []
+    pos = 0
+    out = 0
+    for m in _CHANGES.finditer(text):
+        start, end = m.span()
+        found = m.group()
+        if len(found) == 2:
+            if text[start - 1:start].islower() and text[end:end + 1].islower():
+                replacement = ""
+            elif found[0] == "-":
+                continue
+            else:
+                # Stray soft hyphen: drop it, keep the line break
+                end = start + 1
+                replacement = ""
+        else:
+            replacement = _TABLE[found]
+        parts.append(text[pos:start])
+        out += start - pos
+        if len(replacement) != end - start:
+            if offsets is None:
+                offsets = OffsetMap(len(text))
+            for k in range(len(replacement)):
+                offsets._mark(out + k, start)
+            offsets._mark(out + len(replacement), end)
+        parts.append(replacement)
+        out += len(replacement)
+        pos = end
+
+    if not parts:
+        _same_length.inc()
+        return text, None
+    parts.append(text[pos:])
+    (_same_length if offsets is None else _remapped).inc()
+    return "".join(parts), offsets
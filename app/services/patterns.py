@@ -0,0 +1,327 @@
+# patterns.py
+"""
+Regex pattern registry. Patterns are compiled with the `regex` engine,
+checked for catastrophic backtracking before they are used, run with a
+per-call timeout, and timed per pattern. The set is swapped atomically
+when PII_PATTERNS_FILE changes, so a bad edit never reaches live traffic:
+the previous set stays active and the error is reported instead.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import regex
+
+from app.core.config import (
+    REGEX_PATTERN_SPECS,
+    SWEEP_PATTERN_SPECS,
+    PII_PATTERNS_FILE,
+    PATTERN_RELOAD_SECONDS,
+    REGEX_TIMEOUT_SECONDS,
+    PATTERN_CHECK_CHARS,
+    PATTERN_CHECK_SECONDS,
+)
+from app.core.metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+REGEX_SECONDS = histogram(
+    "pii_regex_seconds",
+    "Time per pattern call on one text",
+    ("pattern",),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 1.0),
+)
+REGEX_TIMEOUTS = counter("pii_regex_timeouts_total", "Pattern calls abandoned after the timeout", ("pattern",))
+PATTERN_RELOADS = counter("pii_pattern_reloads_total", "Pattern file loads", ("outcome",))
+PATTERN_VERSION = gauge("pii_pattern_version", "Version of the active pattern set")
+
+# Capture groups a sweep's replacement function reads
+SWEEP_GROUPS = {"NAME_FALLBACK": 2, "POSSESSIVE_NAME": 1}
+
+
+class PatternError(ValueError):
+    pass
+
+
+# -------------------------------
+# Backtracking check
+# -------------------------------
+# Escapes and character classes are blanked out before looking for words
+_NOT_LITERAL = regex.compile(r"\\.|\[(?:\\.|[^\]])*\]|\{[^}]*\}")
+_LITERAL_WORD = regex.compile(r"[A-Za-z]+")
+_BASE_PUMPS = ("a", "A", "Aa ", "1", "1 ", " ", "*", ".", "-", "a1 ", "A.", "Aa\n")
+
+
+def attack_inputs(source: str, length: int) -> List[Tuple[str, str]]:
+    """
+    (label, text) inputs built by repeating short seeds up to `length`
+    characters: generic character classes, plus the pattern's own literal
+    words (keywords like "provider") so the expensive branches are reached.
+    Each seed is also tried with a tail that makes the final match fail.
+    """
+    literals = _NOT_LITERAL.sub(" ", source)
+    words = sorted(set(w.lower() for w in _LITERAL_WORD.findall(literals)))[:8]
+    seeds = list(_BASE_PUMPS)
+    for w in words:
+        seeds += [w, w + " ", w + ": Aa ", w.capitalize() + " Aa Bb "]
+    inputs = []
+    for seed in seeds:
+        text = (seed * (length // len(seed) + 1))[:length]
+        inputs.append((seed, text))
+        inputs.append((seed + "|tail", text[:-1] + "!"))
+    return inputs
+
+
+def check_backtracking(
+    compiled, source: str, length: int = PATTERN_CHECK_CHARS, budget: float = PATTERN_CHECK_SECONDS
+) -> float:
+    """Worst time over attack_inputs(); raises PatternError when one exceeds the budget."""
+    worst = 0.0
+    for label, text in attack_inputs(source, length):
+        start = time.perf_counter()
+        try:
+            for _ in compiled.finditer(text, timeout=budget):
+                pass
+        except TimeoutError:
+            raise PatternError(f"backtracks on {length} chars of {label!r} (over {budget * 1000:g} ms)")
+        worst = max(worst, time.perf_counter() - start)
+    if worst > budget:
+        raise PatternError(f"took {worst * 1000:.1f} ms on {length} chars (budget {budget * 1000:g} ms)")
+    return worst
+
+
+# -------------------------------
+# Compiled patterns
+# -------------------------------
+class CompiledPattern:
+    __slots__ = ("name", "source", "ignorecase", "group", "regex", "check_seconds", "_seconds", "_timeouts")
+
+    def __init__(self, name: str, spec: dict, min_groups: int = 0, check: bool = True):
+        if not isinstance(spec, dict) or not isinstance(spec.get("pattern"), str):
+            raise PatternError(f"{name}: expected an object with a \"pattern\" string")
+        self.name = name
+        self.source = spec["pattern"]
+        self.ignorecase = bool(spec.get("ignorecase", False))
+        self.group = int(spec.get("group", 0))
+
+        flags = regex.V0 | (regex.IGNORECASE if self.ignorecase else 0)
+        try:
+            self.regex = regex.compile(self.source, flags)
+        except regex.error as e:
+            raise PatternError(f"{name}: {e}")
+        needed = max(self.group, min_groups)
+        if self.regex.groups < needed:
+            raise PatternError(f"{name}: needs at least {needed} capture group(s)")
+
+        self.check_seconds = None
+        if check:
+            try:
+                self.check_seconds = check_backtracking(self.regex, self.source)
+            except PatternError as e:
+                raise PatternError(f"{name}: {e}")
+
+        self._seconds = REGEX_SECONDS.labels(name)
+        self._timeouts = REGEX_TIMEOUTS.labels(name)
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """Match spans of the configured group; empty if the call times out."""
+        group = self.group
+        out = []
+        start = time.perf_counter()
+        try:
+            for m in self.regex.finditer(text, timeout=REGEX_TIMEOUT_SECONDS):
+                s, e = m.span(group)
+                if s >= 0:
+                    out.append((s, e))
+        except TimeoutError:
+            self._timeouts.inc()
+            logger.warning("Pattern %s timed out on %d chars", self.name, len(text))
+            out = []
+        finally:
+            self._seconds.observe(time.perf_counter() - start)
+        return out
+
+    def sub(self, repl: Callable, text: str) -> str:
+        """regex.sub with the timeout; the text is returned unchanged if it times out."""
+        start = time.perf_counter()
+        try:
+            return self.regex.sub(repl, text, timeout=REGEX_TIMEOUT_SECONDS)
+        except TimeoutError:
+            self._timeouts.inc()
+            logger.warning("Pattern %s timed out on %d chars", self.name, len(text))
+            return text
+        finally:
+            self._seconds.observe(time.perf_counter() - start)
+
+    def to_dict(self) -> dict:
+        calls, seconds = self._seconds.count, self._seconds.sum
+        return {
+            "name": self.name,
+            "pattern": self.source,
+            "ignorecase": self.ignorecase,
+            "group": self.group,
+            "check_ms": round(self.check_seconds * 1000, 3) if self.check_seconds is not None else None,
+            "calls": calls,
+            "mean_ms": round(seconds / calls * 1000, 4) if calls else None,
+            "timeouts": int(self._timeouts.value),
+        }
+
+
+class PatternSet:
+    """One immutable generation of compiled patterns."""
+
+    def __init__(self, version: int, source: Optional[str], detect: Dict[str, CompiledPattern],
+                 sweeps: Dict[str, CompiledPattern]):
+        self.version = version
+        self.source = source
+        self.detect = detect
+        self.detect_items = list(detect.items())
+        self.sweeps = sweeps
+        self.loaded_at = time.time()
+
+
+def _merge(defaults: dict, overrides) -> dict:
+    if overrides is None:
+        return dict(defaults)
+    if not isinstance(overrides, dict):
+        raise PatternError("\"patterns\" and \"sweeps\" must be objects")
+    merged = dict(defaults)
+    for name, spec in overrides.items():
+        if spec is None:
+            merged.pop(name, None)
+        else:
+            merged[name] = spec
+    return merged
+
+
+def compile_patterns(config: Optional[dict], check: bool = True) -> Tuple[dict, dict]:
+    """Layers a pattern file's contents over the defaults and compiles everything."""
+    config = config or {}
+    if not isinstance(config, dict):
+        raise PatternError("pattern file must contain a JSON object")
+    unknown = set(config) - {"patterns", "sweeps"}
+    if unknown:
+        raise PatternError(f"unknown keys: {', '.join(sorted(unknown))}")
+
+    detect_specs = _merge(REGEX_PATTERN_SPECS, config.get("patterns"))
+    sweep_specs = _merge(SWEEP_PATTERN_SPECS, config.get("sweeps"))
+    missing = set(SWEEP_GROUPS) - set(sweep_specs)
+    if missing or set(sweep_specs) - set(SWEEP_GROUPS):
+        raise PatternError(f"sweeps must be exactly: {', '.join(sorted(SWEEP_GROUPS))}")
+
+    errors = []
+    detect, sweeps = {}, {}
+    for name, spec in detect_specs.items():
+        try:
+            detect[name] = CompiledPattern(name, spec, check=check)
+        except PatternError as e:
+            errors.append(str(e))
+    for name, spec in sweep_specs.items():
+        try:
+            sweeps[name] = CompiledPattern(name, spec, min_groups=SWEEP_GROUPS[name], check=check)
+        except PatternError as e:
+            errors.append(str(e))
+    if errors:
+        raise PatternError("; ".join(errors))
+    return detect, sweeps
+
+
+def read_pattern_file(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except json.JSONDecodeError as e:
+        raise PatternError(f"{path}: invalid JSON: {e}")
+
+
+# -------------------------------
+# Registry
+# -------------------------------
+class PatternRegistry:
+    def __init__(self, path: Optional[str] = PII_PATTERNS_FILE or None,
+                 reload_seconds: float = PATTERN_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.error: Optional[str] = None
+        self._mtime: Optional[int] = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._set: Optional[PatternSet] = None
+        self._version = 0
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self) -> PatternSet:
+        """
+        Compiles the defaults plus the file and swaps them in. On failure
+        the active set is kept and PatternError is raised; at first load
+        the defaults alone are used.
+        """
+        with self._reload_lock:
+            mtime = self._file_mtime() if self.path else None
+            try:
+                config = read_pattern_file(self.path) if mtime is not None else None
+                detect, sweeps = compile_patterns(config)
+            except (PatternError, OSError) as e:
+                self.error = str(e)
+                self._mtime = mtime
+                PATTERN_RELOADS.labels("rejected").inc()
+                logger.error("Pattern file rejected, keeping version %s: %s", self._version or "defaults", e)
+                if self._set is None:
+                    self._install(*compile_patterns(None), source=None)
+                raise PatternError(self.error)
+            self.error = None
+            self._mtime = mtime
+            PATTERN_RELOADS.labels("loaded").inc()
+            return self._install(detect, sweeps, source=self.path if mtime is not None else None)
+
+    def _install(self, detect, sweeps, source) -> PatternSet:
+        self._version += 1
+        self._set = PatternSet(self._version, source, detect, sweeps)
+        PATTERN_VERSION.set(self._version)
+        logger.info("Pattern set %d active (%d patterns)", self._version, len(detect))
+        return self._set
+
+    def current(self) -> PatternSet:
+        active = self._set
+        if active is None:
+            try:
+                return self.reload()
+            except PatternError:
+                return self._set
+        if self.path and self.reload_seconds > 0:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self.reload_seconds
+                if self._file_mtime() != self._mtime and not self._reload_lock.locked():
+                    # The backtracking check takes a while; don't hold up the caller
+                    threading.Thread(target=self._reload_quietly, name="pii-pattern-reload", daemon=True).start()
+        return active
+
+    def _reload_quietly(self):
+        try:
+            self.reload()
+        except PatternError:
+            pass
+
+    def status(self) -> dict:
+        active = self.current()
+        return {
+            "version": active.version,
+            "file": self.path,
+            "source": active.source,
+            "loaded_at": active.loaded_at,
+            "error": self.error,
+            "patterns": [p.to_dict() for p in active.detect.values()],
+            "sweeps": [p.to_dict() for p in active.sweeps.values()],
+        }
+
+
+pattern_registry = PatternRegistry()
@@ -0,0 +1,223 @@
+# pseudonymizer.py
+import hashlib
+import hmac
+import logging
+import os
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import (
+    ENTITY_TYPES,
+    DEFAULT_REDACTION_TOKEN,
+    PSEUDONYM_SECRET,
+    PSEUDONYM_DB_PATH,
+    PSEUDONYM_CACHE_SIZE,
+)
+from .entities import EntityBatch
+
+logger = logging.getLogger(__name__)
+
+PSEUDONYM_SCOPES = ("document", "tenant")
+
+# "[NAME]" -> "NAME", so tokens read "[NAME_17]"
+_LABELS = {entity_type: spec["token"].strip("[]") for entity_type, spec in ENTITY_TYPES.items()}
+_DEFAULT_LABEL = DEFAULT_REDACTION_TOKEN.strip("[]")
+
+# DeferredScope placeholders, delimited by private-use characters
+_PLACEHOLDER_RE = re.compile("\ue000(\\d+)\ue001")
+
+
+def token_label(entity_type: str) -> str:
+    return _LABELS.get(entity_type, _DEFAULT_LABEL)
+
+
+def normalize_value(value: str) -> str:
+    # "John  Smith" and "JOHN SMITH" are the same person
+    return " ".join(value.split()).casefold()
+
+
+class MemoryTokenMap:
+    """(scope, entity type, value digest) -> token number, numbered per scope and type."""
+
+    def __init__(self):
+        self._numbers: Dict[Tuple[str, str, bytes], int] = {}
+        self._counters: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def number(self, scope: str, entity_type: str, digest: bytes) -> int:
+        key = (scope, entity_type, digest)
+        n = self._numbers.get(key)
+        if n is not None:
+            return n
+        with self._lock:
+            n = self._numbers.get(key)
+            if n is None:
+                n = self._counters.get((scope, entity_type), 0) + 1
+                self._counters[(scope, entity_type)] = n
+                self._numbers[key] = n
+        return n
+
+    def close(self):
+        pass
+
+
+class SqliteTokenMap:
+    """
+    Persistent token map shared by every process that opens the same file
+    (API workers, batch jobs). Assignments never change once made, so
+    lookups are served from an in-process dict and only misses touch SQLite.
+    """
+
+    def __init__(self, path: str, cache_size: int = PSEUDONYM_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: Dict[Tuple[str, str, bytes], int] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pseudonyms ("
+            " scope TEXT NOT NULL, entity_type TEXT NOT NULL, digest BLOB NOT NULL, number INTEGER NOT NULL,"
+            " PRIMARY KEY (scope, entity_type, digest)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pseudonym_counters ("
+            " scope TEXT NOT NULL, entity_type TEXT NOT NULL, last INTEGER NOT NULL,"
+            " PRIMARY KEY (scope, entity_type)) WITHOUT ROWID"
+        )
+
+    def number(self, scope: str, entity_type: str, digest: bytes) -> int:
+        key = (scope, entity_type, digest)
+        n = self._cache.get(key)
+        if n is not None:
+            return n
+        with self._lock:
+            conn = self._conn
+            # IMMEDIATE takes the write lock up front, so two processes can't
+            # hand out the same number.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT number FROM pseudonyms WHERE scope = ? AND entity_type = ? AND digest = ?", key
+                ).fetchone()
+                if row is not None:
+                    n = row[0]
+                else:
+                    n = conn.execute(
+                        "INSERT INTO pseudonym_counters VALUES (?, ?, 1)"
+                        " ON CONFLICT (scope, entity_type) DO UPDATE SET last = last + 1 RETURNING last",
+                        (scope, entity_type),
+                    ).fetchone()[0]
+                    conn.execute("INSERT INTO pseudonyms VALUES (?, ?, ?, ?)", (*key, n))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[key] = n
+        return n
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _Replacer(ABC):
+    @abstractmethod
+    def token(self, entity_type: str, value: str) -> str:
+        """Replacement for one detected value."""
+
+    def replace(self, text: str, entities: EntityBatch) -> str:
+        """Text with every entity span replaced by its token; overlapping spans keep the first."""
+        parts = []
+        pos = 0
+        for entity_type, start, end, _ in sorted(entities.spans(), key=lambda s: (s[1], -s[2])):
+            start, end = max(start, 0), min(end, len(text))
+            if start < pos or start >= end:
+                continue
+            parts.append(text[pos:start])
+            parts.append(self.token(entity_type, text[start:end]))
+            pos = end
+        parts.append(text[pos:])
+        return "".join(parts)
+
+
+class PseudonymScope(_Replacer):
+    """
+    Hands out stable tokens within one scope: the same value of the same
+    type always gets the same "[NAME_17]", different values never share one.
+    """
+
+    def __init__(self, name: str, key: bytes, store):
+        self.name = name
+        self.key = key
+        self.store = store
+
+    def digest(self, entity_type: str, value: str) -> bytes:
+        # Keyed, so the token map never holds anything that can be
+        # brute-forced back to the original value.
+        message = f"{entity_type}\x1f{normalize_value(value)}".encode("utf-8")
+        return hmac.new(self.key, message, hashlib.sha256).digest()
+
+    def token(self, entity_type: str, value: str) -> str:
+        n = self.store.number(self.name, entity_type, self.digest(entity_type, value))
+        return f"[{token_label(entity_type)}_{n}]"
+
+    def resolve(self, text: str, pending: List[Tuple[str, str]]) -> str:
+        """Replaces the placeholders a DeferredScope left in text with this scope's tokens."""
+        return _PLACEHOLDER_RE.sub(lambda m: self.token(*pending[int(m.group(1))]), text)
+
+
+class DeferredScope(_Replacer):
+    """
+    Stand-in used in worker processes, which can't see the caller's map:
+    emits placeholders and records the values, and the caller's scope
+    numbers them with resolve() in the original order.
+    """
+
+    def __init__(self):
+        self.pending: List[Tuple[str, str]] = []
+
+    def token(self, entity_type: str, value: str) -> str:
+        self.pending.append((entity_type, value))
+        return f"\ue000{len(self.pending) - 1}\ue001"
+
+
+class Pseudonymizer:
+    """
+    Document scopes live only as long as the request; tenant scopes share
+    one map, kept in SQLite when PSEUDONYM_DB_PATH is set so tokens stay
+    stable across restarts, workers and batch jobs.
+    """
+
+    def __init__(self, secret: Optional[str] = PSEUDONYM_SECRET, db_path: Optional[str] = PSEUDONYM_DB_PATH):
+        if secret:
+            self.key = secret.encode("utf-8")
+        else:
+            self.key = os.urandom(32)
+            logger.warning("PSEUDONYM_SECRET not set; tenant pseudonyms will change on restart")
+        self.tenant_store = SqliteTokenMap(db_path) if db_path else MemoryTokenMap()
+
+    def document_scope(self) -> PseudonymScope:
+        return PseudonymScope("document", self.key, MemoryTokenMap())
+
+    def tenant_scope(self, tenant: str) -> PseudonymScope:
+        return PseudonymScope(f"tenant:{tenant}", self.key, self.tenant_store)
+
+    def scope(self, kind: Optional[str], tenant: Optional[str] = None) -> Optional[PseudonymScope]:
+        if not kind:
+            return None
+        if kind not in PSEUDONYM_SCOPES:
+            raise ValueError(f"pseudonymize must be one of: {', '.join(PSEUDONYM_SCOPES)}")
+        if kind == "tenant":
+            if tenant is None:
+                raise ValueError("Tenant pseudonyms require an authenticated user")
+            return self.tenant_scope(tenant)
+        return self.document_scope()
+
+    def close(self):
+        self.tenant_store.close()
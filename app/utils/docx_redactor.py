@@ -1,46 +1,101 @@
 from docx import Document
 from io import BytesIO
 
+from app.core.metrics import PAGES_PROCESSED
+from app.core.profiling import profiled
+from app.utils.upload_reader import as_file
+
+
+class ParagraphText:
+    """Cached text of one paragraph, indexed like doc.paragraphs."""
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def paragraph_text(para) -> str:
+    return "".join([run.text for run in para.runs])
+
+
+def redactable_span(start: int, end: int, text_length: int) -> bool:
+    # Very long spans are usually the model tagging a whole paragraph
+    span_len = end - start
+    if start < 0 or end > text_length:
+        return False
+    return not (span_len > 60 or (text_length > 50 and span_len / text_length > 0.8))
+
+
+def cached_docx(source: bytes | str, digest: str = None):
+    from app.core.doc_cache import document_cache, file_hash
+    if digest is None and isinstance(source, str):
+        digest = file_hash(source)
+    return document_cache.document(source, namespace="docx", digest=digest)
+
+
+def document_paragraphs(source: bytes | str, cached=None, doc=None) -> list:
+    if cached is not None and cached.pages is not None:
+        return cached.pages
+    if doc is None:
+        doc = Document(as_file(source))
+    paragraphs = [ParagraphText(paragraph_text(para)) for para in doc.paragraphs]
+    if cached is not None:
+        cached.set_pages(paragraphs)
+    return paragraphs
+
+
+def _paragraph_entities(text: str, index: int, pipeline, selected_entities, cached=None):
+    if cached is not None:
+        return cached.entities_for(index, text, pipeline, selected_entities)
+    _, entities = pipeline.run(text, selected_entities)
+    return entities
+
+
+@profiled("docx.redact")
 def redact_docx_paragraphwise(
-    original_doc_bytes: bytes,
+    source: bytes | str,
     pipeline,
-    selected_entities: list[str] | None
+    selected_entities: list[str] | None,
+    pseudonyms=None,
+    cached=None
 ) -> tuple[BytesIO, int]:
-    doc = Document(BytesIO(original_doc_bytes))
+    doc = Document(as_file(source))
     total_entity_count = 0
+    if cached is not None:
+        document_paragraphs(source, cached, doc)
 
-    for para in doc.paragraphs:
-        full_text = "".join([run.text for run in para.runs])
+    for index, para in enumerate(doc.paragraphs):
+        full_text = paragraph_text(para)
 
         if not full_text:
             continue
 
-        _, entities = pipeline.run(full_text)
+        PAGES_PROCESSED.labels("docx").inc()
+        entities = _paragraph_entities(full_text, index, pipeline, selected_entities, cached)
         
         chars_to_redact = [False] * len(full_text)
+        # With pseudonyms the token replaces the first character of the
+        # span and the rest of the span is dropped, across runs if needed
+        labels = {}
         
-        for e in entities:
-            if selected_entities is not None and e.entity_type not in selected_entities:
-                continue
-
-            if e.start < 0 or e.end > len(full_text):
-                 continue
-                 
-            span_len = e.end - e.start
-            if span_len > 60 or (len(full_text) > 50 and span_len / len(full_text) > 0.8):
+        entities = entities.select(selected_entities)
+        for entity_type, start, end, _ in entities.spans():
+            if not redactable_span(start, end, len(full_text)):
                  continue
 
+            span_len = end - start
             total_entity_count += 1
 
-            for i in range(e.start, e.end):
-                chars_to_redact[i] = True
+            chars_to_redact[start:end] = [True] * span_len
+            if pseudonyms is not None:
+                labels[start] = pseudonyms.token(entity_type, full_text[start:end])
 
         current_global_idx = 0
         for run in para.runs:
             run_chars = list(run.text)
             for i in range(len(run_chars)):
                 if current_global_idx < len(chars_to_redact) and chars_to_redact[current_global_idx]:
-                    run_chars[i] = "*"
+                    run_chars[i] = "*" if pseudonyms is None else labels.get(current_global_idx, "")
                 current_global_idx += 1
             run.text = "".join(run_chars)
 
@@ -49,41 +104,41 @@ def redact_docx_paragraphwise(
     output.seek(0)
     return output, total_entity_count
 
+@profiled("docx.preview")
 def redact_docx_preview(
-    original_doc_bytes: bytes,
+    source: bytes | str,
     pipeline,
     selected_entities: list[str] | None,
-    limit_paragraphs: int = 20
+    limit_paragraphs: int = 20,
+    pseudonyms=None,
+    cached=None
 ) -> str:
-    doc = Document(BytesIO(original_doc_bytes))
     preview_text = ""
     
     count = 0
-    for para in doc.paragraphs:
+    for index, para in enumerate(document_paragraphs(source, cached)):
         if count >= limit_paragraphs:
             break
             
-        full_text = "".join([run.text for run in para.runs])
+        full_text = para.text
         if not full_text.strip():
             continue
             
-        _, entities = pipeline.run(full_text)
+        PAGES_PROCESSED.labels("docx_preview").inc()
+        entities = _paragraph_entities(full_text, index, pipeline, selected_entities, cached)
         
         chars = list(full_text)
         
-        for e in entities:
-             if selected_entities is not None and e.entity_type not in selected_entities:
-                 continue
-
-             if e.start < 0 or e.end > len(full_text):
-                  continue
-                  
-             span_len = e.end - e.start
-             if span_len > 60 or (len(full_text) > 50 and span_len / len(full_text) > 0.8):
+        entities = entities.select(selected_entities)
+        for entity_type, start, end, _ in entities.spans():
+             if not redactable_span(start, end, len(full_text)):
                   continue
 
-             for i in range(e.start, e.end):
-                 chars[i] = "*"
+             span_len = end - start
+             if pseudonyms is None:
+                  chars[start:end] = "*" * span_len
+             else:
+                  chars[start:end] = [pseudonyms.token(entity_type, full_text[start:end])] + [""] * (span_len - 1)
         
         preview_text += "".join(chars) + "\n\n"
         count += 1
@@ -0,0 +1,146 @@
+# output_stream.py
+import gzip
+import io
+import json
+import zlib
+from typing import AsyncIterator, Iterator, Optional, Union
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+
+from app.core.config import OUTPUT_CHUNK_SIZE, COMPRESS_MIN_BYTES, GZIP_LEVEL, ZSTD_LEVEL
+
+try:
+    import zstandard
+except ImportError:  # optional: only gzip is offered without it
+    zstandard = None
+
+Buffer = Union[bytes, bytearray, memoryview, io.BytesIO, io.StringIO]
+
+
+def supported_encodings() -> tuple:
+    return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best supported Content-Encoding for an Accept-Encoding header, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in supported_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _as_bytes_view(data: Buffer) -> memoryview:
+    if isinstance(data, io.StringIO):
+        return memoryview(data.getvalue().encode("utf-8"))
+    if isinstance(data, io.BytesIO):
+        # getbuffer() exposes the BytesIO storage without copying it
+        return data.getbuffer()
+    return memoryview(data)
+
+
+def compress(data: memoryview, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def iter_chunks(view: memoryview, chunk_size: int = OUTPUT_CHUNK_SIZE) -> Iterator[memoryview]:
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+
+def _disposition(filename: Optional[str]) -> dict:
+    return {"Content-Disposition": f"attachment; filename={filename}"} if filename else {}
+
+
+def make_buffer_response(
+    request: Request,
+    data: Buffer,
+    media_type: str,
+    filename: Optional[str] = None,
+    compressible: bool = True,
+) -> StreamingResponse:
+    """
+    Streams a finished output in fixed-size memoryview chunks with an exact
+    Content-Length. Text outputs are compressed when the client accepts
+    zstd or gzip; already-compressed formats (PDF, DOCX) are sent as is.
+    Compresses inline, so call it from sync routes (already in the
+    threadpool) and use buffer_response() from async ones.
+    """
+    view = _as_bytes_view(data)
+    headers = _disposition(filename)
+
+    encoding = None
+    if compressible:
+        headers["Vary"] = "Accept-Encoding"
+        if len(view) >= COMPRESS_MIN_BYTES:
+            encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None:
+        view = memoryview(compress(view, encoding))
+        headers["Content-Encoding"] = encoding
+
+    headers["Content-Length"] = str(len(view))
+    return StreamingResponse(iter_chunks(view), media_type=media_type, headers=headers)
+
+
+async def buffer_response(request: Request, data: Buffer, media_type: str, **kwargs) -> StreamingResponse:
+    return await run_in_threadpool(make_buffer_response, request, data, media_type, **kwargs)
+
+
+async def json_response(request: Request, payload) -> StreamingResponse:
+    # Same encoding rules as FastAPI's default JSONResponse
+    body = json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+    return await buffer_response(request, body, "application/json")
+
+
+class _StreamCompressor:
+    """Incremental compressor that flushes after every chunk so streamed records arrive promptly."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        else:
+            self._obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "gzip":
+            return self._obj.compress(chunk) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+        return self._obj.compress(chunk) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+async def compress_stream(chunks: AsyncIterator[bytes], encoding: str) -> AsyncIterator[bytes]:
+    compressor = _StreamCompressor(encoding)
+    async for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    tail = compressor.finish()
+    if tail:
+        yield tail
@@ -0,0 +1,187 @@
+# pdf_ocr.py
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from app.core.config import (
+    PDF_OCR,
+    OCR_LANGUAGE,
+    OCR_DPI,
+    OCR_WORKERS,
+    OCR_PAGE_TIMEOUT_SECONDS,
+    OCR_CACHE_SIZE,
+)
+from app.core.metrics import PAGES_PROCESSED, record_cache, stage_timer
+
+logger = logging.getLogger(__name__)
+
+# Words in OCR-page coordinates plus that page's (width, height)
+OcrResult = Tuple[List[tuple], Tuple[float, float]]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_cache: "OrderedDict[str, OcrResult]" = OrderedDict()
+_cache_lock = threading.Lock()
+_available: Optional[bool] = None
+
+
+def ocr_available() -> bool:
+    global _available
+    if PDF_OCR == "off":
+        return False
+    if _available is None:
+        try:
+            fitz.get_tessdata()
+            _available = True
+        except Exception:
+            _available = False
+            if PDF_OCR == "on":
+                logger.error("PDF_OCR=on but Tesseract language data was not found")
+            else:
+                logger.info("Tesseract not found, OCR for scanned PDF pages is disabled")
+    return _available
+
+
+def needs_ocr(page, layout) -> bool:
+    return (layout is None or not layout.text.strip()) and bool(page.get_images(full=False))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+        return _pool
+
+
+def _kill_pool(pool: ProcessPoolExecutor):
+    """
+    Terminates a pool whose workers are stuck on pages that timed out;
+    a running task can't be cancelled, so this is the only way to get the
+    worker back. Calls still waiting on that pool fail and leave their
+    pages unread, and the next call starts a fresh pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    # Python < 3.14 has no public terminate_workers()
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _ocr_png(png_bytes: bytes, language: str) -> OcrResult:
+    # Runs in a worker process
+    pix = fitz.Pixmap(png_bytes)
+    ocr_doc = fitz.open("pdf", pix.pdfocr_tobytes(language=language))
+    ocr_page = ocr_doc[0]
+    words = [tuple(w) for w in ocr_page.get_text("words")]
+    return words, (ocr_page.rect.width, ocr_page.rect.height)
+
+
+def _cache_get(key: str) -> Optional[OcrResult]:
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+    record_cache("ocr", hit is not None)
+    return hit
+
+
+def _cache_put(key: str, result: OcrResult):
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > OCR_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _scale_words(result: OcrResult, page_rect) -> List[tuple]:
+    words, (width, height) = result
+    sx = page_rect.width / width if width else 1.0
+    sy = page_rect.height / height if height else 1.0
+    return [
+        (page_rect.x0 + w[0] * sx, page_rect.y0 + w[1] * sy,
+         page_rect.x0 + w[2] * sx, page_rect.y0 + w[3] * sy) + tuple(w[4:])
+        for w in words
+    ]
+
+
+def ocr_pages(doc, page_indices: List[int]) -> Dict[int, Optional[List[tuple]]]:
+    """
+    OCR the given pages in the process pool. Returns word tuples in page
+    coordinates (get_text("words") layout) per page, or None for pages that
+    failed or timed out.
+
+    The whole batch shares one deadline of OCR_PAGE_TIMEOUT_SECONDS per
+    round of OCR_WORKERS pages; pages still running at the deadline come
+    back as None and the pool is terminated so its workers are freed.
+    """
+    results: Dict[int, Optional[List[tuple]]] = {}
+    pending = {}
+    not_done = set()
+    pool = None
+
+    with stage_timer("pdf_ocr"):
+        for i in page_indices:
+            page = doc[i]
+            pix = page.get_pixmap(dpi=OCR_DPI)
+            key = hashlib.sha256(pix.samples).hexdigest()
+            cached = _cache_get(key)
+            if cached is not None:
+                results[i] = _scale_words(cached, page.rect)
+                continue
+            if pool is None:
+                pool = _get_pool()
+                started = time.monotonic()
+            png = pix.tobytes("png")
+            try:
+                future = pool.submit(_ocr_png, png, OCR_LANGUAGE)
+            except (BrokenProcessPool, RuntimeError):
+                # Killed by another call's timeout since we picked it up
+                pool = _get_pool()
+                future = pool.submit(_ocr_png, png, OCR_LANGUAGE)
+            pending[i] = (key, future, page.rect)
+
+        if pending:
+            rounds = math.ceil(len(pending) / max(1, OCR_WORKERS))
+            deadline = started + OCR_PAGE_TIMEOUT_SECONDS * rounds
+            _, not_done = wait(
+                [future for _, future, _ in pending.values()],
+                timeout=max(0.0, deadline - time.monotonic()),
+            )
+            if not_done:
+                logger.warning("OCR timed out on %d of %d pages", len(not_done), len(pending))
+                _kill_pool(pool)
+
+        for i, (key, future, rect) in pending.items():
+            if future in not_done:
+                results[i] = None
+                continue
+            try:
+                result = future.result()
+            except Exception:
+                logger.exception("OCR failed on page %d", i)
+                results[i] = None
+                continue
+            _cache_put(key, result)
+            results[i] = _scale_words(result, rect)
+            PAGES_PROCESSED.labels("pdf_ocr").inc()
+
+    return results
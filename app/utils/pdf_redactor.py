@@ -1,100 +1,300 @@
+import bisect
+from array import array
+
 import fitz  # PyMuPDF
 from io import BytesIO
 
+from app.core.config import PDF_REDACTION_MODE, PDF_OCR, OCR_ON_FAILURE
+from app.core.metrics import PAGES_PROCESSED, stage_timer
+from app.core.profiling import profiled
+from app.utils.pdf_ocr import ocr_available, needs_ocr, ocr_pages
+
+
+# -------------------------------
+# Page layouts
+# -------------------------------
+# A layout is the text the pipeline sees for one page plus an index from
+# text offsets back to page geometry.
+
+class CharLayout:
+    """
+    Text rebuilt from get_text("rawdict") in reading order, one "\n" per
+    line like get_text("text"), with a bbox per character.
+    """
+    __slots__ = ("text", "x0", "y0", "x1", "y1", "line_ids")
+
+    def __init__(self, page):
+        parts = []
+        self.x0, self.y0 = array("d"), array("d")
+        self.x1, self.y1 = array("d"), array("d")
+        # Line number per character, -1 for the synthetic newlines
+        self.line_ids = array("l")
+
+        raw = page.get_text("rawdict")
+        line_no = 0
+        for block in raw["blocks"]:
+            if block.get("type", 0) != 0:
+                continue
+            for line in block["lines"]:
+                for span in line["spans"]:
+                    for ch in span["chars"]:
+                        x0, y0, x1, y1 = ch["bbox"]
+                        parts.append(ch["c"])
+                        self.x0.append(x0)
+                        self.y0.append(y0)
+                        self.x1.append(x1)
+                        self.y1.append(y1)
+                        self.line_ids.append(line_no)
+                parts.append("\n")
+                for arr in (self.x0, self.y0, self.x1, self.y1):
+                    arr.append(0.0)
+                self.line_ids.append(-1)
+                line_no += 1
+
+        self.text = "".join(parts)
+
+    def redaction_rects(self, starts, ends):
+        """One rect per contiguous run of covered characters on a line."""
+        intervals = sorted(
+            (max(0, s), min(len(self.text), e)) for s, e in zip(starts, ends) if s < e
+        )
+        merged = []
+        for s, e in intervals:
+            if merged and s <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], e)
+            else:
+                merged.append([s, e])
+
+        line_ids, x0, y0, x1, y1 = self.line_ids, self.x0, self.y0, self.x1, self.y1
+        for s, e in merged:
+            i = s
+            while i < e:
+                line = line_ids[i]
+                if line < 0:
+                    i += 1
+                    continue
+                rx0, ry0, rx1, ry1 = x0[i], y0[i], x1[i], y1[i]
+                j = i + 1
+                while j < e and line_ids[j] == line:
+                    rx0 = min(rx0, x0[j])
+                    ry0 = min(ry0, y0[j])
+                    rx1 = max(rx1, x1[j])
+                    ry1 = max(ry1, y1[j])
+                    j += 1
+                yield fitz.Rect(rx0, ry0, rx1, ry1), j - i
+                i = j
+
+
+class WordLayout:
+    """
+    Words from get_text("words") (or OCR) joined with single spaces; a word
+    is redacted when at least half of it is covered by an entity.
+    """
+    __slots__ = ("text", "word_starts", "word_ends", "rects")
+
+    def __init__(self, words):
+        parts = []
+        self.word_starts = []
+        self.word_ends = []
+        self.rects = []
+
+        current_idx = 0
+        for w in words:
+            word_str = w[4]
+            self.word_starts.append(current_idx)
+            self.word_ends.append(current_idx + len(word_str))
+            self.rects.append(fitz.Rect(w[0], w[1], w[2], w[3]))
+            parts.append(word_str)
+            current_idx += len(word_str) + 1
+
+        self.text = " ".join(parts) + (" " if parts else "")
+
+    def redaction_rects(self, starts, ends):
+        hit = set()
+        for e_start, e_end in zip(starts, ends):
+            k = max(0, bisect.bisect_right(self.word_starts, e_start) - 1)
+            while k < len(self.word_starts) and self.word_starts[k] < e_end:
+                w_start, w_end = self.word_starts[k], self.word_ends[k]
+                overlap = min(e_end, w_end) - max(e_start, w_start)
+                if w_end > w_start and overlap / (w_end - w_start) >= 0.5:
+                    hit.add(k)
+                k += 1
+
+        for k in sorted(hit):
+            yield self.rects[k], self.word_ends[k] - self.word_starts[k]
+
+
+class UnreadablePage:
+    """Image-only page that OCR could not turn into text."""
+    __slots__ = ()
+    text = ""
+
+UNREADABLE_PAGE = UnreadablePage()
+
+
+def extract_page_layout(page, mode: str = PDF_REDACTION_MODE):
+    if mode == "word":
+        words = page.get_text("words")
+        return WordLayout(words) if words else None
+    layout = CharLayout(page)
+    return layout if layout.text else None
+
+
+def _add_redaction(page, rect, label: str):
+    # Fit the label into the box so tight character-level rects still show it
+    fontsize = min(10, rect.height * 0.9, rect.width / max(1, len(label) * 0.5))
+    page.add_redact_annot(
+        rect,
+        text=label or None,
+        fill=(1, 1, 1),
+        text_color=(0, 0, 0),
+        fontsize=max(fontsize, 1),
+    )
+
+
+def open_pdf(source: bytes | str):
+    """Open from bytes or, for spooled uploads, straight from the file path."""
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _document_layouts(source: bytes | str, mode: str, cached=None, doc=None) -> list:
+    if cached is not None and cached.pages is not None:
+        return cached.pages
+
+    if doc is None:
+        doc = open_pdf(source)
+    with stage_timer("pdf_extract_text"):
+        pages = [extract_page_layout(page, mode) for page in doc]
+
+    # Scanned pages have no text layer; OCR them and feed the word boxes
+    # through the same word-map redaction path.
+    scanned = [i for i, layout in enumerate(pages) if needs_ocr(doc[i], layout)]
+    if scanned:
+        if ocr_available():
+            for i, words in ocr_pages(doc, scanned).items():
+                pages[i] = WordLayout(words) if words else UNREADABLE_PAGE
+        elif PDF_OCR == "on":
+            for i in scanned:
+                pages[i] = UNREADABLE_PAGE
+
+    if cached is not None:
+        cached.set_pages(pages)
+    return pages
+
+
+def _page_entities(layout, page_index: int, pipeline, selected_entities, cached=None):
+    if cached is not None:
+        return cached.entities_for(page_index, layout.text, pipeline, selected_entities)
+    _, entities = pipeline.run(layout.text, selected_entities)
+    return entities
+
+
+def cached_pdf(source: bytes | str, mode: str = PDF_REDACTION_MODE, digest: str = None):
+    from app.core.doc_cache import document_cache, file_hash
+    if digest is None and isinstance(source, str):
+        digest = file_hash(source)
+    return document_cache.document(source, namespace=f"pdf:{mode}", digest=digest)
+
+
+@profiled("pdf.detect")
+def detect_pdf_entity_types(
+    source: bytes | str,
+    pipeline,
+    mode: str = PDF_REDACTION_MODE,
+    cached=None
+) -> set:
+    found = set()
+    for i, layout in enumerate(_document_layouts(source, mode, cached)):
+        if layout is None or not layout.text.strip():
+            continue
+        PAGES_PROCESSED.labels("pdf_detect").inc()
+        found |= _page_entities(layout, i, pipeline, None, cached).entity_types()
+    return found
+
+
+@profiled("pdf.redact")
 def redact_pdf_file(
-    file_bytes: bytes,
+    source: bytes | str,
     pipeline,
-    selected_entities: list[str] | None
+    selected_entities: list[str] | None,
+    mode: str = PDF_REDACTION_MODE,
+    cached=None,
+    pseudonyms=None
 ) -> tuple[BytesIO, int]:
-    doc = fitz.open(stream=file_bytes, filetype="pdf")
+    doc = open_pdf(source)
+    layouts = _document_layouts(source, mode, cached, doc)
     total_entity_count = 0
     
-    for page in doc:
-        words = page.get_text("words")
-        if not words:
+    for i, page in enumerate(doc):
+        PAGES_PROCESSED.labels("pdf").inc()
+        layout = layouts[i]
+        if layout is UNREADABLE_PAGE and OCR_ON_FAILURE == "blank":
+            page.add_redact_annot(page.rect, fill=(0, 0, 0))
+            page.apply_redactions()
             continue
-            
-        full_text = ""
-        word_map = [] 
-        
-        current_idx = 0
-        for w in words:
-            word_str = w[4]
-            rect = fitz.Rect(w[0], w[1], w[2], w[3])
-            
-            start = current_idx
-            end = start + len(word_str)
-            word_map.append((start, end, rect))
-            
-            full_text += word_str + " " 
-            current_idx = end + 1
-
-        if not full_text.strip():
+        if layout is None or not layout.text.strip():
             continue
             
-        _, entities = pipeline.run(full_text)
+        entities = _page_entities(layout, i, pipeline, selected_entities, cached)
         
-        for e in entities:
-            if selected_entities is None or e.entity_type in selected_entities:
-                total_entity_count += 1
-        
-        for e in entities:
-            if selected_entities is not None and e.entity_type not in selected_entities:
-                continue
-            
-            for w_start, w_end, w_rect in word_map:
-                overlap_start = max(e.start, w_start)
-                overlap_end = min(e.end, w_end)
-                
-                if overlap_start < overlap_end:
-                    intersection_len = overlap_end - overlap_start
-                    word_len = w_end - w_start
-                    
-                    if word_len > 0:
-                        ratio = intersection_len / word_len
-                        
-                        if ratio >= 0.5:
-                             page.add_redact_annot(
-                                 w_rect, 
-                                 text="*"*len(full_text[w_start:w_end]), 
-                                 fill=(1, 1, 1), 
-                                 text_color=(0, 0, 0),
-                                 fontsize=10
-                             )
+        entities = entities.select(selected_entities)
+        total_entity_count += len(entities)
+        if not len(entities):
+            continue
+
+        if pseudonyms is None:
+            for rect, n_chars in layout.redaction_rects(entities.starts, entities.ends):
+                _add_redaction(page, rect, "*" * n_chars)
+        else:
+            # The token goes in the first box of each entity, the rest are blanked
+            for entity_type, start, end, _ in entities.spans():
+                label = pseudonyms.token(entity_type, layout.text[start:end])
+                for rect, _ in layout.redaction_rects((start,), (end,)):
+                    _add_redaction(page, rect, label)
+                    label = ""
         
-        page.apply_redactions()
+        # All of the page's annotations are applied in one pass
+        with stage_timer("pdf_apply_redactions"):
+            page.apply_redactions()
         
-    pdf_bytes = doc.tobytes(garbage=4, deflate=True)
+    with stage_timer("pdf_serialize"):
+        pdf_bytes = doc.tobytes(garbage=4, deflate=True)
     return BytesIO(pdf_bytes), total_entity_count
 
+@profiled("pdf.preview")
 def redact_pdf_preview(
-    file_bytes: bytes,
+    source: bytes | str,
     pipeline,
-    selected_entities: list[str] | None
+    selected_entities: list[str] | None,
+    mode: str = PDF_REDACTION_MODE,
+    cached=None,
+    pseudonyms=None
 ) -> str:
-    doc = fitz.open(stream=file_bytes, filetype="pdf")
-    if len(doc) < 1:
+    layouts = _document_layouts(source, mode, cached)
+    if len(layouts) < 1:
         raise ValueError("PDF has no pages")
         
-    page = doc[0] # Process only the first page
-    text = page.get_text()
+    layout = layouts[0] # Process only the first page
+    PAGES_PROCESSED.labels("pdf_preview").inc()
     
-    if not text.strip():
+    if layout is None or not layout.text.strip():
         return ""
 
-    _, entities = pipeline.run(text)
+    text = layout.text
+    entities = _page_entities(layout, 0, pipeline, selected_entities, cached)
     
+    entities = entities.select(selected_entities)
+    if pseudonyms is not None:
+        return pseudonyms.replace(text, entities)
+
     chars = list(text)
-    
-    for e in entities:
-        if selected_entities is not None and e.entity_type not in selected_entities:
-            continue
-            
+    for start, end in zip(entities.starts, entities.ends):
         # Ensure we don't go out of bounds
-        if e.start < 0 or e.end > len(text):
+        if start < 0 or end > len(text):
              continue
 
-        for i in range(e.start, e.end):
-            chars[i] = "*"
+        chars[start:end] = "*" * (end - start)
             
     return "".join(chars)
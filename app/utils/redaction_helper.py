@@ -1,62 +1,47 @@
 from typing import List, Optional
-from app.schemas.redact import DetectedEntity, RedactResponse
-
-def redaction_helper(
-    text: str,
-    pipeline,
-    selected_entities: Optional[List[str]] = None
-) -> RedactResponse:
-
-    redacted_text, entities = pipeline.run(text)
-
+from app.schemas.redact import RedactResponse
+
+def apply_selection(text: str, redacted_text: str, entities, selected_entities, pseudonyms=None):
+    """
+    With no selection the pipeline output is used as is; with one, only the
+    selected entities are masked with asterisks (or pseudonym tokens) over
+    the original text.
+    """
     if not selected_entities:
-        api_entities = [
-            DetectedEntity(
-                entity_type=e.entity_type,
-                start=e.start,
-                end=e.end,
-                score=e.score
-            )
-            for e in entities
-        ]
-
-        return RedactResponse(
-            original_text=text,
-            redacted_text=redacted_text,
-            entities=api_entities
-        )
-
-    filtered_entities = [
-        e for e in entities
-        if e.entity_type in selected_entities
-    ]
+        return redacted_text, entities
+
+    filtered_entities = entities.select(selected_entities)
+    if pseudonyms is not None:
+        return pseudonyms.replace(text, filtered_entities), filtered_entities
 
     redacted_chars = list(text)
 
     text_length = len(text)
 
-    for e in filtered_entities:
-            start = max(0, e.start)
-            end = min(text_length, e.end)
+    for s, e in zip(filtered_entities.starts, filtered_entities.ends):
+            start = max(0, s)
+            end = min(text_length, e)
 
-            for i in range(start, end):
-                redacted_chars[i] = "*"
+            redacted_chars[start:end] = "*" * max(0, end - start)
 
+    return "".join(redacted_chars), filtered_entities
 
-    filtered_redacted_text = "".join(redacted_chars)
 
-    api_entities = [
-        DetectedEntity(
-            entity_type=e.entity_type,
-            start=e.start,
-            end=e.end,
-            score=e.score
-        )
-        for e in filtered_entities
-    ]
+def redaction_helper(
+    text: str,
+    pipeline,
+    selected_entities: Optional[List[str]] = None,
+    pseudonyms=None
+) -> RedactResponse:
+
+    # With a selection the pipeline text is discarded, so only number tokens once
+    redacted_text, entities = pipeline.run(
+        text, selected_entities or None, None if selected_entities else pseudonyms
+    )
+    redacted_text, entities = apply_selection(text, redacted_text, entities, selected_entities, pseudonyms)
 
     return RedactResponse(
         original_text=text,
-        redacted_text=filtered_redacted_text,
-        entities=api_entities
+        redacted_text=redacted_text,
+        entities=entities.to_dicts()
     )
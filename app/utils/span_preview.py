@@ -0,0 +1,139 @@
+# span_preview.py
+"""
+Structured previews: detected spans for a window of pages or paragraphs,
+plus a cursor for the next window. Detections go into the document cache
+entry, so later windows and the final /pdf or /docx call on the same file
+reuse them instead of running the model again.
+
+Cursors are signed with a server key and bound to the client that started
+the preview, so a cache key (the file's hash) alone can't be turned into
+someone else's detections. Spans carry offsets and types, never the text.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+from collections import Counter
+from typing import Optional
+
+from app.core.config import PREVIEW_CURSOR_SECRET
+from app.utils.docx_redactor import redactable_span
+
+UNITS = {"pdf": "page", "docx": "paragraph"}
+
+_KEY = PREVIEW_CURSOR_SECRET.encode("utf-8") if PREVIEW_CURSOR_SECRET else os.urandom(32)
+
+
+class CursorError(ValueError):
+    pass
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(raw: bytes, client: str) -> bytes:
+    return hmac.new(_KEY, client.encode("utf-8") + b"\n" + raw, hashlib.sha256).digest()
+
+
+def encode_cursor(key: str, kind: str, next_index: int, window: int, selected_entities, client: str) -> str:
+    payload = {"k": key, "u": kind, "i": next_index, "w": window, "s": selected_entities}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return f"{_b64(raw)}.{_b64(_sign(raw, client))}"
+
+
+def decode_cursor(cursor: str, client: str) -> dict:
+    try:
+        body, _, signature = cursor.partition(".")
+        raw = _unb64(body)
+        if not hmac.compare_digest(_unb64(signature), _sign(raw, client)):
+            raise ValueError
+        payload = json.loads(raw)
+        if not isinstance(payload, dict) or payload.get("u") not in UNITS:
+            raise ValueError
+        if not str(payload["k"]).startswith(payload["u"] + ":"):
+            raise ValueError
+        selected = payload.get("s")
+        if selected is not None and not (
+            isinstance(selected, list) and all(isinstance(e, str) for e in selected)
+        ):
+            raise ValueError
+        return {
+            "key": str(payload["k"]),
+            "kind": payload["u"],
+            "start": int(payload["i"]),
+            "window": int(payload["w"]),
+            "selected_entities": selected,
+        }
+    except (ValueError, KeyError, TypeError, binascii.Error, UnicodeDecodeError):
+        raise CursorError("Invalid preview cursor")
+
+
+def load_units(kind: str, source, cached) -> list:
+    """Fills cached.pages with the document's pages or paragraphs if not already there."""
+    if kind == "pdf":
+        from app.utils.pdf_redactor import _document_layouts
+        return _document_layouts(source, cached.key.split(":")[1], cached)
+    from app.utils.docx_redactor import document_paragraphs
+    return document_paragraphs(source, cached)
+
+
+def preview_spans(
+    cached,
+    kind: str,
+    pipeline,
+    selected_entities: Optional[list],
+    start: int = 0,
+    window: int = 1,
+    client: str = "",
+) -> dict:
+    """
+    Spans for the next `window` pages/paragraphs with text, starting at
+    index `start` of cached.pages. Offsets are relative to the unit's text;
+    the cursor only works for the same `client`.
+    """
+    units = cached.pages or []
+    spans = []
+    counts = Counter()
+    index = max(0, start)
+    taken = 0
+    while index < len(units) and taken < window:
+        unit = units[index]
+        text = unit.text if unit is not None else ""
+        if text.strip():
+            taken += 1
+            entities = cached.entities_for(index, text, pipeline, selected_entities).select(selected_entities)
+            for entity_type, s, e, score in entities.spans():
+                if kind == "docx" and not redactable_span(s, e, len(text)):
+                    continue
+                spans.append({
+                    "index": index,
+                    "entity_type": entity_type,
+                    "start": s,
+                    "end": e,
+                    "score": round(float(score), 4),
+                })
+                counts[entity_type] += 1
+        index += 1
+
+    # Skip trailing empty units so the cursor is None when nothing is left
+    while index < len(units) and not (units[index] is not None and units[index].text.strip()):
+        index += 1
+
+    return {
+        "unit": UNITS[kind],
+        "units_total": len(units),
+        "window": {"start": max(0, start), "end": index},
+        "spans": spans,
+        "entity_counts": dict(counts),
+        "next_cursor": (
+            encode_cursor(cached.key, kind, index, window, selected_entities, client)
+            if index < len(units) else None
+        ),
+    }
@@ -0,0 +1,238 @@
+# stream_redactor.py
+import asyncio
+import codecs
+import json
+from collections import deque
+from typing import AsyncIterator, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+
+from app.core.config import (
+    STREAM_BATCH_CHARS,
+    STREAM_BATCH_RECORDS,
+    STREAM_MAX_INFLIGHT,
+    STREAM_MAX_RECORD_CHARS,
+)
+from app.core.metrics import QUEUE_DEPTH
+from app.utils.redaction_helper import apply_selection
+
+STREAM_FORMATS = ("ndjson", "lines")
+
+# (metadata passed through to the output, text to redact, error message)
+Record = Tuple[Optional[dict], Optional[str], Optional[str]]
+
+_INFLIGHT = QUEUE_DEPTH.labels("stream_batches")
+
+
+async def iter_line_chunks(body: AsyncIterator[bytes], max_line_chars: int) -> AsyncIterator[List[Optional[str]]]:
+    """
+    Split a byte stream into lines, yielding the complete lines of each
+    received chunk together. A line longer than max_line_chars is dropped
+    and reported as None so the caller can emit an error in its place.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    skipping = False
+
+    async for chunk in body:
+        buffer += decoder.decode(chunk)
+        lines: List[Optional[str]] = []
+        # One split per chunk; only the unfinished last line is carried over
+        complete = buffer.split("\n")
+        buffer = complete.pop()
+        for line in complete:
+            if skipping:
+                skipping = False
+                continue
+            lines.append(line[:-1] if line.endswith("\r") else line)
+
+        if len(buffer) > max_line_chars:
+            if not skipping:
+                lines.append(None)
+                skipping = True
+            buffer = ""
+
+        if lines:
+            yield lines
+
+    buffer += decoder.decode(b"", final=True)
+    if buffer and not skipping:
+        yield [buffer[:-1] if buffer.endswith("\r") else buffer]
+
+
+def parse_record(line: Optional[str], fmt: str) -> Optional[Record]:
+    """None means the line carries no record (blank NDJSON line)."""
+    if line is None:
+        return None, None, f"Record exceeds {STREAM_MAX_RECORD_CHARS} characters"
+
+    if fmt == "lines":
+        text = line
+        meta = None
+    else:
+        if not line.strip():
+            return None
+        try:
+            value = json.loads(line)
+        except json.JSONDecodeError:
+            return None, None, "Invalid JSON"
+
+        if isinstance(value, str):
+            text, meta = value, None
+        elif isinstance(value, dict) and isinstance(value.get("text"), str):
+            text = value["text"]
+            meta = {k: v for k, v in value.items() if k != "text"}
+        else:
+            return None, None, "Record must be a string or an object with a text field"
+
+    if len(text) > STREAM_MAX_RECORD_CHARS:
+        return meta, None, f"Record exceeds {STREAM_MAX_RECORD_CHARS} characters"
+    return meta, text, None
+
+
+class StreamRedaction:
+    """
+    Redacts a line-oriented request body record by record. Records are
+    grouped into pipeline batches that run in the threadpool; at most
+    max_inflight batches run while more of the body is read, and results
+    are written back in input order.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        fmt: str = "lines",
+        selected_entities: Optional[List[str]] = None,
+        include_entities: bool = False,
+        pseudonyms=None,
+        batch_records: int = STREAM_BATCH_RECORDS,
+        batch_chars: int = STREAM_BATCH_CHARS,
+        max_inflight: int = STREAM_MAX_INFLIGHT,
+    ):
+        self.pipeline = pipeline
+        self.fmt = fmt
+        self.selected_entities = selected_entities or None
+        self.include_entities = include_entities
+        # One scope for the whole stream, so a value keeps its token across records
+        self.pseudonyms = pseudonyms
+        self.batch_records = max(1, batch_records)
+        self.batch_chars = batch_chars
+        self.max_inflight = max(1, max_inflight)
+        self.records = 0
+        self.entity_count = 0
+
+    @property
+    def media_type(self) -> str:
+        if self.ndjson_output:
+            return "application/x-ndjson"
+        return "text/plain; charset=utf-8"
+
+    @property
+    def ndjson_output(self) -> bool:
+        # Plain lines have nowhere to put entity metadata
+        return self.fmt == "ndjson" or self.include_entities
+
+    def _render(self, meta, redacted: Optional[str], entities, error: Optional[str]) -> str:
+        if not self.ndjson_output:
+            return (f"[ERROR: {error}]" if error else redacted) + "\n"
+
+        out = dict(meta) if meta else {}
+        if error:
+            out["error"] = error
+        else:
+            out["text"] = redacted
+            if self.include_entities:
+                out["entities"] = entities.to_dicts()
+        return json.dumps(out, ensure_ascii=False) + "\n"
+
+    def redact_batch(self, batch: List[Record]) -> Tuple[bytes, int]:
+        texts = [text for _, text, error in batch if error is None]
+        pseudonyms = self.pseudonyms
+        if texts:
+            results = iter(self.pipeline.run_batch(
+                texts, self.selected_entities, None if self.selected_entities else pseudonyms
+            ))
+        else:
+            results = iter(())
+
+        lines = []
+        entity_count = 0
+        for meta, text, error in batch:
+            if error is not None:
+                lines.append(self._render(meta, None, None, error))
+                continue
+            redacted, entities = next(results)
+            redacted, entities = apply_selection(text, redacted, entities, self.selected_entities, pseudonyms)
+            entity_count += len(entities)
+            lines.append(self._render(meta, redacted, entities, None))
+        return "".join(lines).encode("utf-8"), entity_count
+
+    def _submit(self, pending: deque, batch: List[Record]):
+        _INFLIGHT.inc()
+        future = asyncio.ensure_future(run_in_threadpool(self.redact_batch, batch))
+        future.add_done_callback(lambda _: _INFLIGHT.dec())
+        pending.append(future)
+
+    async def _collect(self, future) -> bytes:
+        payload, entity_count = await future
+        self.entity_count += entity_count
+        return payload
+
+    async def run(self, body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        pending: deque = deque()
+        batch: List[Record] = []
+        batch_chars = 0
+        # JSON escaping can make a line several times longer than its text
+        max_line_chars = STREAM_MAX_RECORD_CHARS * 6 + 1024
+
+        try:
+            async for lines in iter_line_chunks(body, max_line_chars):
+                for line in lines:
+                    record = parse_record(line, self.fmt)
+                    if record is None:
+                        continue
+                    self.records += 1
+                    batch.append(record)
+                    batch_chars += len(record[1] or "")
+
+                    if len(batch) >= self.batch_records or batch_chars >= self.batch_chars:
+                        # Bound memory: wait for the oldest batch before
+                        # starting another one past the in-flight limit.
+                        while len(pending) >= self.max_inflight:
+                            yield await self._collect(pending.popleft())
+                        self._submit(pending, batch)
+                        batch, batch_chars = [], 0
+
+                # Don't hold a partial batch back while the pipeline is idle,
+                # otherwise a slow producer sees no output until it fills one.
+                if batch and not pending:
+                    self._submit(pending, batch)
+                    batch, batch_chars = [], 0
+
+                while pending and pending[0].done():
+                    yield await self._collect(pending.popleft())
+
+            if batch:
+                while len(pending) >= self.max_inflight:
+                    yield await self._collect(pending.popleft())
+                self._submit(pending, batch)
+
+            while pending:
+                yield await self._collect(pending.popleft())
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body is produced while the request body is
+    still being read. The stock response may start a task that listens for
+    disconnects on receive(), which would swallow request body messages;
+    here a disconnect surfaces through request.stream() instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
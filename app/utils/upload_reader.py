@@ -0,0 +1,159 @@
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from app.core.config import (
+    MAX_UPLOAD_SIZE_BYTES,
+    UPLOAD_FORM_OVERHEAD_BYTES,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_SPOOL_THRESHOLD,
+    UPLOAD_TMP_DIR,
+)
+
+
+class SpooledUpload:
+    """
+    An upload read in bounded chunks. Small files stay in memory; larger
+    ones live in a temp file and are passed around by path. The content
+    hash is computed while streaming.
+    """
+
+    def __init__(self, filename: str | None):
+        self.filename = filename or ""
+        self.size = 0
+        self.path: str | None = None
+        self._chunks: list[bytes] = []
+        self._data: bytes | None = None
+        self._hash = hashlib.sha256()
+        self._fh = None
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def source(self) -> bytes | str:
+        """Bytes for in-memory uploads, otherwise the temp file path."""
+        if self.path is not None:
+            return self.path
+        if self._data is None:
+            self._data = b"".join(self._chunks)
+            self._chunks = []
+        return self._data
+
+    async def _append(self, chunk: bytes):
+        self.size += len(chunk)
+        self._hash.update(chunk)
+
+        if self._fh is None and self.size > UPLOAD_SPOOL_THRESHOLD:
+            self._fh = tempfile.NamedTemporaryFile(
+                delete=False,
+                dir=UPLOAD_TMP_DIR,
+                suffix=os.path.splitext(self.filename)[1],
+            )
+            self.path = self._fh.name
+            buffered = b"".join(self._chunks)
+            self._chunks = []
+            await run_in_threadpool(self._fh.write, buffered)
+
+        if self._fh is not None:
+            await run_in_threadpool(self._fh.write, chunk)
+        else:
+            self._chunks.append(chunk)
+
+    def _finish(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def close(self):
+        self._finish()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self._chunks = []
+        self._data = None
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File size exceeds {max_bytes / (1024 * 1024):g} MB limit"
+    )
+
+
+class UploadSizeLimit:
+    """
+    ASGI middleware bounding multipart request bodies. Starlette spools
+    every file part to disk while parsing the form, before the route (and
+    read_upload's own check) runs; this refuses an oversize body from its
+    Content-Length, or as soon as a chunked body passes the limit, so the
+    parser never sees the excess.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_SIZE_BYTES,
+                 overhead: int = UPLOAD_FORM_OVERHEAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.limit = max_bytes + overhead
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.limit:
+            error = _too_large(self.max_bytes)
+            response = JSONResponse(status_code=error.status_code, content={"detail": error.detail})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.limit:
+                    raise _too_large(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload(
+    file: UploadFile,
+    max_bytes: int = MAX_UPLOAD_SIZE_BYTES,
+) -> SpooledUpload:
+    upload = SpooledUpload(file.filename)
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if upload.size + len(chunk) > max_bytes:
+                raise _too_large(max_bytes)
+            await upload._append(chunk)
+        upload._finish()
+    except BaseException:
+        upload.close()
+        raise
+    return upload
+
+
+def as_file(source: bytes | str):
+    """Something Document(), pd.read_csv() and friends can open: a path or a BytesIO."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BytesIO(source)
+    return source
@@ -0,0 +1,220 @@
+# generators.py
+import io
+import random
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+
+FIRST_NAMES = [
+    "John", "Mary", "Robert", "Patricia", "Michael", "Linda", "David", "Susan",
+    "James", "Karen", "Daniel", "Nancy", "Thomas", "Lisa", "Steven", "Angela",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson", "Taylor",
+]
+STREETS = ["Baker Street", "Maple Avenue", "Oak Drive", "Cedar Lane", "Elm Court", "Pine Road"]
+CITIES = ["Springfield", "Riverside", "Fairview", "Madison", "Georgetown", "Franklin"]
+CREDENTIALS = ["MD", "DO", "NP", "PA", "RN"]
+BOILERPLATE = [
+    "This document is provided for claims processing purposes only.",
+    "Coverage is subject to the terms and conditions of the policy in force.",
+    "please retain a copy of this notice for your records.",
+    "the information below was reviewed according to standard procedures.",
+    "no further action is required unless otherwise noted.",
+]
+
+
+# (entity_type, start, end) spans planted in generated text
+Span = Tuple[str, int, int]
+
+
+@dataclass
+class Sample:
+    text: str
+    spans: List[Span] = field(default_factory=list)
+
+
+class _Builder:
+    def __init__(self):
+        self.parts: List[str] = []
+        self.spans: List[Span] = []
+        self.length = 0
+
+    def add(self, value: str, entity_type: str | None = None):
+        if entity_type:
+            self.spans.append((entity_type, self.length, self.length + len(value)))
+        self.parts.append(value)
+        self.length += len(value)
+
+    def build(self) -> Sample:
+        return Sample("".join(self.parts), self.spans)
+
+
+def _name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def insurance_paragraph(rng: random.Random) -> Sample:
+    b = _Builder()
+    kind = rng.randrange(6)
+    if kind == 0:
+        b.add("Patient Name: ")
+        b.add(_name(rng), "PERSON")
+        b.add(" was seen on ")
+        b.add(f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/20{rng.randint(10, 25)}", "DATE_TIME")
+        b.add(". MRN ")
+        b.add(f"MRN{rng.randint(100000, 999999)}", "MEDICAL_RECORD_NUMBER")
+        b.add(".")
+    elif kind == 1:
+        b.add("Contact the policy holder at ")
+        b.add(f"{rng.choice(FIRST_NAMES).lower()}.{rng.choice(LAST_NAMES).lower()}@example.com", "EMAIL_ADDRESS")
+        b.add(" or ")
+        b.add(f"({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}", "PHONE_NUMBER")
+        b.add(".")
+    elif kind == 2:
+        b.add("Mailing address: ")
+        b.add(f"{rng.randint(1, 9999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}", "ADDRESS")
+        b.add(". SSN on file ")
+        b.add(f"***-**-{rng.randint(1000, 9999)}", "US_SSN")
+        b.add(", card ")
+        b.add(f"**** {rng.randint(1000, 9999)}", "CREDIT_CARD")
+        b.add(".")
+    elif kind == 3:
+        b.add("Reviewed by: ")
+        b.add(f"{_name(rng)}, {rng.choice(CREDENTIALS)}", "PERSON")
+        b.add(". Fax results to ")
+        b.add(f"fax: {rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(1000, 9999)}", "FAX_NUMBER")
+        b.add(".")
+    elif kind == 4:
+        name = _name(rng)
+        b.add(name, "PERSON")
+        b.add("'s claim was approved by the primary care provider ")
+        b.add(_name(rng), "PERSON")
+        b.add(".")
+    else:
+        b.add(rng.choice(BOILERPLATE))
+    return b.build()
+
+
+def insurance_text(rng: random.Random, paragraphs: int) -> Sample:
+    b = _Builder()
+    for i in range(paragraphs):
+        if i:
+            b.add("\n")
+        para = insurance_paragraph(rng)
+        offset = b.length
+        b.add(para.text)
+        b.spans.extend((t, s + offset, e + offset) for t, s, e in para.spans)
+    return b.build()
+
+
+def noisy_text(rng: random.Random, paragraphs: int, rate: float = 0.05) -> Sample:
+    """
+    insurance_text() as it often comes out of PDFs and word processors:
+    no-break spaces, typographic dashes, ligatures, zero-width characters
+    and line-break hyphenation. Planted spans are shifted to match.
+    """
+    sample = insurance_text(rng, paragraphs)
+    text = sample.text
+    parts: List[str] = []
+    # new_at[i] = offset of original character i in the noisy text
+    new_at = []
+    length = 0
+    i = 0
+    while i < len(text):
+        new_at.append(length)
+        c = text[i]
+        pair = text[i:i + 2]
+        if pair in ("fi", "fl") and rng.random() < rate * 4:
+            out = "\ufb01" if pair == "fi" else "\ufb02"
+            new_at.append(length)
+            i += 1
+        elif c == " " and rng.random() < rate:
+            out = "\u00a0"
+        elif c == "-" and rng.random() < rate * 4:
+            out = "\u2011"
+        elif c.islower() and text[i + 1:i + 2].islower() and rng.random() < rate / 4:
+            out = c + rng.choice(("\u200b", "\u00ad", "-\n"))
+        else:
+            out = c
+        parts.append(out)
+        length += len(out)
+        i += 1
+    new_at.append(length)
+    spans = [(t, new_at[s], new_at[e - 1] + 1) for t, s, e in sample.spans]
+    return Sample("".join(parts), spans)
+
+
+def insurance_pdf(rng: random.Random, pages: int, lines_per_page: int = 30) -> Tuple[bytes, List[Sample]]:
+    import fitz
+
+    doc = fitz.open()
+    samples: List[Sample] = []
+    for _ in range(pages):
+        page = doc.new_page()
+        sample = insurance_text(rng, lines_per_page)
+        y = 50
+        for line in sample.text.split("\n"):
+            page.insert_text((40, y), line, fontsize=9)
+            y += 24
+        samples.append(sample)
+    return doc.tobytes(), samples
+
+
+def scanned_pdf(rng: random.Random, pages: int, dpi: int = 150) -> Tuple[bytes, List[Sample]]:
+    """Image-only PDF: each text page is rasterized and re-inserted as a picture."""
+    import fitz
+
+    text_bytes, samples = insurance_pdf(rng, pages)
+    src = fitz.open(stream=text_bytes, filetype="pdf")
+    doc = fitz.open()
+    for page in src:
+        pix = page.get_pixmap(dpi=dpi)
+        new_page = doc.new_page(width=page.rect.width, height=page.rect.height)
+        new_page.insert_image(new_page.rect, pixmap=pix)
+    return doc.tobytes(), samples
+
+
+def insurance_docx(rng: random.Random, paragraphs: int, tables: int, rows: int = 10) -> Tuple[bytes, List[Sample]]:
+    from docx import Document
+
+    doc = Document()
+    samples: List[Sample] = []
+    for _ in range(paragraphs):
+        sample = insurance_paragraph(rng)
+        doc.add_paragraph(sample.text)
+        samples.append(sample)
+    for _ in range(tables):
+        table = doc.add_table(rows=rows, cols=4)
+        for row in table.rows:
+            row.cells[0].text = _name(rng)
+            row.cells[1].text = f"{rng.choice(FIRST_NAMES).lower()}@example.com"
+            row.cells[2].text = f"{rng.randint(1, 9999)} {rng.choice(STREETS)}"
+            row.cells[3].text = rng.choice(BOILERPLATE)
+        doc.add_paragraph(insurance_paragraph(rng).text)
+
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue(), samples
+
+
+def wide_csv(rng: random.Random, rows: int, extra_columns: int = 20) -> Tuple[bytes, List[str]]:
+    import csv
+
+    headers = ["name", "email", "phone", "address", "notes"] + [f"col_{i}" for i in range(extra_columns)]
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(headers)
+    for _ in range(rows):
+        writer.writerow(
+            [
+                _name(rng),
+                f"{rng.choice(FIRST_NAMES).lower()}@example.com",
+                f"({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}",
+                f"{rng.randint(1, 9999)} {rng.choice(STREETS)}",
+                insurance_paragraph(rng).text,
+            ]
+            + [str(rng.randint(0, 100000)) for _ in range(extra_columns)]
+        )
+    return out.getvalue().encode("utf-8"), ["name", "email", "phone", "address"]
@@ -0,0 +1,392 @@
+# run.py
+"""
+Benchmark harness for the redaction pipeline and file redactors.
+
+    python -m benchmarks.run --stub-detector --targets pipeline,regex,pdf
+    python -m benchmarks.run --output results/$(git rev-parse --short HEAD).json
+
+Every run is seeded, so two runs with the same arguments process identical
+inputs and their JSON results can be compared directly.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+from benchmarks import generators
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def _measure(fn: Callable[[], object], iterations: int, warmup: int) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _span_recall(planted, detected) -> float:
+    if not planted:
+        return 1.0
+    hits = 0
+    for _, start, end in planted:
+        if any(e.start < end and start < e.end for e in detected):
+            hits += 1
+    return hits / len(planted)
+
+
+# -------------------------------
+# Targets
+# -------------------------------
+# Each target builds its inputs once and returns the callable to time, the
+# number of work units per call and the unit name used for throughput.
+
+def build_pipeline(args):
+    from app.core.pipeline import PIIPipeline
+
+    detector = None
+    if args.stub_detector:
+        from benchmarks.stubs import StubDetector
+        detector = StubDetector()
+    return PIIPipeline(detector=detector)
+
+
+def target_pipeline(args, rng, pipeline):
+    sample = generators.insurance_text(rng, args.paragraphs)
+
+    def run():
+        return pipeline.run(sample.text)
+
+    _, entities = pipeline.run(sample.text)
+    extra = {"recall": round(_span_recall(sample.spans, entities), 4), "planted": len(sample.spans)}
+    return run, len(sample.text), "chars", extra
+
+
+def target_regex(args, rng, pipeline):
+    from app.services.detector import regex_detect
+
+    sample = generators.insurance_text(rng, args.paragraphs)
+
+    def run():
+        return regex_detect(sample.text)
+
+    return run, len(sample.text), "chars", {}
+
+
+def target_normalize(args, rng, pipeline):
+    """
+    Normalizer cost on noisy text, plus regex recall on the raw text
+    versus the normalized text with spans mapped back.
+    """
+    from app.services.detector import regex_detect
+    from app.services.normalizer import normalize_text
+
+    sample = generators.noisy_text(rng, args.paragraphs)
+    clean = generators.insurance_text(rng, args.paragraphs).text
+
+    def run():
+        return normalize_text(sample.text)
+
+    normalized, offsets = normalize_text(sample.text)
+    mapped = regex_detect(normalized)
+    if offsets is not None:
+        offsets.remap(mapped, sample.text)
+    regex_types = {"EMAIL_ADDRESS", "PHONE_NUMBER", "US_SSN", "CREDIT_CARD", "FAX_NUMBER"}
+    planted = [s for s in sample.spans if s[0] in regex_types]
+    clean_ms = statistics.fmean(_measure(lambda: normalize_text(clean), args.iterations, args.warmup)) * 1000
+    extra = {
+        "breakpoints": len(offsets.norm_at) if offsets is not None else 0,
+        "clean_text_ms": round(clean_ms, 3),
+        "regex_recall_raw": round(_span_recall(planted, regex_detect(sample.text)), 4),
+        "regex_recall_normalized": round(_span_recall(planted, mapped), 4),
+        "planted": len(planted),
+    }
+    return run, len(sample.text), "chars", extra
+
+
+def target_pdf(args, rng, pipeline):
+    from app.utils.pdf_redactor import redact_pdf_file
+
+    pdf_bytes, _ = generators.insurance_pdf(rng, args.pages)
+
+    def run():
+        return redact_pdf_file(source=pdf_bytes, pipeline=pipeline, selected_entities=None)
+
+    return run, args.pages, "pages", {"input_bytes": len(pdf_bytes)}
+
+
+def target_docx(args, rng, pipeline):
+    from app.utils.docx_redactor import redact_docx_paragraphwise
+
+    docx_bytes, _ = generators.insurance_docx(rng, args.paragraphs, args.tables)
+
+    def run():
+        return redact_docx_paragraphwise(
+            source=docx_bytes, pipeline=pipeline, selected_entities=None
+        )
+
+    return run, args.paragraphs, "paragraphs", {"input_bytes": len(docx_bytes)}
+
+
+def target_csv(args, rng, pipeline):
+    from app.services.file_extractors.csv_extractor import extract_redacted_csv_data
+
+    csv_bytes, columns = generators.wide_csv(rng, args.rows)
+
+    def run():
+        return extract_redacted_csv_data(csv_bytes, columns)
+
+    return run, args.rows, "rows", {"input_bytes": len(csv_bytes)}
+
+
+def target_ocr(args, rng, pipeline):
+    from app.utils import pdf_ocr
+    from app.utils.pdf_redactor import redact_pdf_file
+
+    if not pdf_ocr.ocr_available():
+        raise SystemExit("ocr target needs Tesseract (set TESSDATA_PREFIX or PDF_OCR=on)")
+
+    pdf_bytes, _ = generators.scanned_pdf(rng, args.pages)
+
+    def run():
+        # Measure OCR itself, not the page-hash cache
+        pdf_ocr._cache.clear()
+        return redact_pdf_file(source=pdf_bytes, pipeline=pipeline, selected_entities=None)
+
+    return run, args.pages, "pages", {"input_bytes": len(pdf_bytes), "ocr_workers": pdf_ocr.OCR_WORKERS}
+
+
+# Planted types regex_detect finds on its own; gating cannot lose these.
+REGEX_COVERED_TYPES = {"US_SSN", "CREDIT_CARD", "FAX_NUMBER"}
+
+
+def target_gating(args, rng, pipeline):
+    from app.services.gating import may_contain_model_pii
+
+    segments = [generators.insurance_paragraph(rng) for _ in range(args.segments)]
+    texts = [s.text for s in segments]
+
+    def run():
+        return [may_contain_model_pii(t) for t in texts]
+
+    decisions = run()
+    planted = kept = 0
+    for sample, decision in zip(segments, decisions):
+        n = sum(1 for t, _, _ in sample.spans if t not in REGEX_COVERED_TYPES)
+        planted += n
+        if decision:
+            kept += n
+
+    extra = {
+        "skip_rate": round(1 - sum(decisions) / len(decisions), 4) if decisions else 0.0,
+        "recall": round(kept / planted, 4) if planted else 1.0,
+        "planted": planted,
+    }
+    return run, len(texts), "segments", extra
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def target_concurrency(args, rng, pipeline):
+    """
+    Throughput vs latency: `clients` threads issue requests against a
+    pipeline limited to `slots` inference slots, for every combination.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from app.core.concurrency import InferenceSlots, thread_budget
+
+    texts = [generators.insurance_paragraph(rng).text for _ in range(args.requests)]
+    original = pipeline.slots
+    curve = []
+    try:
+        for slots in _int_list(args.slots):
+            pipeline.slots = InferenceSlots(slots=slots, threads=thread_budget(slots), wait_seconds=0)
+            for text in texts[:slots]:
+                pipeline.run(text)
+
+            for clients in _int_list(args.clients):
+                def one(text):
+                    start = time.perf_counter()
+                    pipeline.run(text)
+                    return time.perf_counter() - start
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=clients) as pool:
+                    latencies = sorted(pool.map(one, texts))
+                wall = time.perf_counter() - start
+                curve.append({
+                    "slots": slots,
+                    "threads_per_slot": pipeline.slots.threads,
+                    "clients": clients,
+                    "requests_per_s": round(len(texts) / wall, 2),
+                    "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+                    "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+                    "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+                })
+                print(f"concurrency: slots={slots} clients={clients} done", file=sys.stderr)
+            pipeline.slots.shutdown()
+    finally:
+        pipeline.slots = original
+
+    text = texts[0]
+
+    def run():
+        return pipeline.run(text)
+
+    return run, 1, "requests", {"curve": curve}
+
+
+TARGETS: Dict[str, Callable] = {
+    "pipeline": target_pipeline,
+    "regex": target_regex,
+    "normalize": target_normalize,
+    "pdf": target_pdf,
+    "docx": target_docx,
+    "csv": target_csv,
+    "gating": target_gating,
+    "ocr": target_ocr,
+    "concurrency": target_concurrency,
+}
+MODEL_TARGETS = {"pipeline", "pdf", "docx", "ocr", "concurrency"}
+# Run only when asked for explicitly
+OPT_IN_TARGETS = {"ocr", "concurrency"}
+
+
+def run_target(name: str, args, pipeline) -> dict:
+    rng = random.Random(f"{args.seed}:{name}")
+    fn, units, unit_name, extra = TARGETS[name](args, rng, pipeline)
+
+    latencies = sorted(_measure(fn, args.iterations, args.warmup))
+    total = sum(latencies)
+
+    return {
+        "target": name,
+        "iterations": len(latencies),
+        "units_per_call": units,
+        "unit": unit_name,
+        "throughput_per_s": round(units * len(latencies) / total, 2) if total else None,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 3),
+            "p50": round(_percentile(latencies, 50) * 1000, 3),
+            "p90": round(_percentile(latencies, 90) * 1000, 3),
+            "p99": round(_percentile(latencies, 99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3),
+        },
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        **extra,
+    }
+
+
+def _run_isolated(name: str, args) -> dict:
+    # Fresh interpreter per target so peak RSS is attributable to that target alone.
+    cmd = [sys.executable, "-m", "benchmarks.run", "--targets", name, "--no-isolate"]
+    for key in ("iterations", "warmup", "seed", "paragraphs", "pages", "tables", "rows", "segments",
+                "requests", "clients", "slots"):
+        cmd += [f"--{key}", str(getattr(args, key))]
+    if args.stub_detector:
+        cmd.append("--stub-detector")
+    out = subprocess.check_output(cmd, text=True)
+    return json.loads(out)["results"][0]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PII redaction pipeline")
+    parser.add_argument(
+        "--targets",
+        default=",".join(t for t in TARGETS if t not in OPT_IN_TARGETS),
+        help="Comma-separated subset of: " + ", ".join(TARGETS),
+    )
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--paragraphs", type=int, default=40, help="Paragraphs per text sample / DOCX")
+    parser.add_argument("--pages", type=int, default=5, help="Pages per generated PDF")
+    parser.add_argument("--tables", type=int, default=5, help="Tables per generated DOCX")
+    parser.add_argument("--rows", type=int, default=5000, help="Rows per generated CSV")
+    parser.add_argument("--segments", type=int, default=2000, help="Independent segments for the gating target")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per point of the concurrency curve")
+    parser.add_argument("--clients", default="1,2,4,8,16", help="Concurrent client threads to sweep (concurrency target)")
+    parser.add_argument("--slots", default="1,2,4", help="Inference slot counts to sweep (concurrency target)")
+    parser.add_argument("--stub-detector", action="store_true", help="Replace GLiNER with a regex stub")
+    parser.add_argument("--isolate", dest="isolate", action="store_true", help="Run each target in its own process")
+    parser.add_argument("--no-isolate", dest="isolate", action="store_false")
+    parser.set_defaults(isolate=False)
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = [n for n in names if n not in TARGETS]
+    if unknown:
+        raise SystemExit(f"Unknown targets: {', '.join(unknown)}")
+
+    results = []
+    if args.isolate:
+        results = [_run_isolated(name, args) for name in names]
+    else:
+        pipeline = build_pipeline(args) if MODEL_TARGETS.intersection(names) else None
+        for name in names:
+            results.append(run_target(name, args, pipeline))
+            print(f"{name}: done", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as fh:
+            fh.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
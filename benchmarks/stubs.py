@@ -0,0 +1,37 @@
+# stubs.py
+import re
+from typing import Any, Dict, List, Optional
+
+from app.core.config import GLINER_LABELS
+
+
+_CAPITALIZED_PAIR = re.compile(r"\b[A-Z][a-z]+ [A-Z][a-z]+\b")
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+_PHONE = re.compile(r"\(\d{3}\) \d{3}-\d{4}")
+
+
+class StubDetector:
+    """
+    Stands in for GLiNERDetector so the non-model stages can be benchmarked
+    without downloading or loading the model. Output shape matches
+    GLiNER.predict_entities.
+    """
+
+    def __init__(self):
+        self.labels = GLINER_LABELS
+        self.score_threshold = 0.0
+
+    def detect(self, text: str, labels: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        if not text.strip():
+            return []
+        labels = self.labels if labels is None else labels
+        out = []
+        for label, pattern in (("person", _CAPITALIZED_PAIR), ("email", _EMAIL), ("phone number", _PHONE)):
+            if label not in labels:
+                continue
+            for m in pattern.finditer(text):
+                out.append({"start": m.start(), "end": m.end(), "label": label, "score": 0.9, "text": m.group()})
+        return out
+
+    def detect_batch(self, texts: List[str], labels: Optional[List[str]] = None) -> List[List[Dict[str, Any]]]:
+        return [self.detect(text, labels) for text in texts]
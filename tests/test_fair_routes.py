@@ -0,0 +1,83 @@
+import random
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.api.routes as routes
+from app.auth.dependencies import get_current_user
+from app.core.concurrency import InferenceSlots
+from app.core.pipeline import PIIPipeline
+from app.services.pseudonymizer import Pseudonymizer
+from benchmarks.generators import insurance_pdf
+from benchmarks.stubs import StubDetector
+
+
+class _User:
+    id = 1
+
+
+async def _no_db(fn, *args, **kwargs):
+    return True
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_interactive_call_gets_through_while_bulk_pdf_waits(monkeypatch):
+    monkeypatch.setattr(routes, "run_db", _no_db)
+    slots = InferenceSlots(slots=1, threads=1, wait_seconds=20)
+    app = FastAPI()
+    app.include_router(routes.router)
+    app.state.pii_pipeline = PIIPipeline(detector=StubDetector(), slots=slots)
+    app.state.pseudonymizer = Pseudonymizer(secret="test")
+    app.dependency_overrides[get_current_user] = lambda: _User()
+    queued = lambda: slots._scheduler.stats()["queued"]
+
+    # Take the only slot so both requests have to queue for it
+    release = threading.Event()
+    holder = threading.Thread(target=slots.run, args=(release.wait,))
+    holder.start()
+    assert _wait_for(lambda: slots._scheduler.stats()["free_slots"] == 0)
+
+    finished = {}
+
+    def post(name, *args, **kwargs):
+        finished[name] = (client.post(*args, **kwargs).status_code, time.monotonic())
+
+    pdf = insurance_pdf(random.Random(1), 3)[0]
+    try:
+        with TestClient(app) as client:
+            bulk = threading.Thread(
+                target=post, args=("pdf", "/pdf"), kwargs={"files": {"file": ("a.pdf", pdf, "application/pdf")}}
+            )
+            bulk.start()
+            assert _wait_for(lambda: queued() == 1)
+
+            # The event loop must still be serving requests while /pdf waits
+            interactive = threading.Thread(
+                target=post, args=("detect", "/detect/entities"),
+                kwargs={"data": {"text": "Call John Smith at john.smith@example.com"}},
+            )
+            interactive.start()
+            assert _wait_for(lambda: queued() == 2, timeout=5)
+
+            release.set()
+            interactive.join(20)
+            bulk.join(20)
+    finally:
+        release.set()
+        holder.join()
+        slots.shutdown()
+
+    assert finished["detect"][0] == 200
+    assert finished["pdf"][0] == 200
+    # Weighted fair queuing hands the freed slot to the interactive call first
+    assert finished["detect"][1] < finished["pdf"][1]
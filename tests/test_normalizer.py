@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from app.core.pipeline import PIIPipeline
+from app.services.entities import EntityBatch
+from app.services.normalizer import normalize_text
+from benchmarks.generators import insurance_text, noisy_text
+from benchmarks.stubs import StubDetector
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_remap_returns_planted_spans_exactly(seed):
+    # noisy_text() is insurance_text() with noise added, so normalizing it
+    # gives back the clean text and the planted spans line up with it
+    clean = insurance_text(random.Random(seed), 30)
+    noisy = noisy_text(random.Random(seed), 30, rate=0.2)
+    normalized, offsets = normalize_text(noisy.text)
+    assert normalized == clean.text
+    assert offsets is not None
+
+    found = EntityBatch(normalized)
+    for entity_type, start, end in clean.spans:
+        found.append(entity_type, start, end, 1.0)
+    offsets.remap(found, noisy.text)
+
+    assert [(t, s, e) for t, s, e, _ in found.spans()] == noisy.spans
+    assert found.text == noisy.text
+
+
+def test_span_edges_next_to_dropped_characters_and_ligatures():
+    original = "Call Jo\u00adhn Gri\ufb03n\u200b today"
+    normalized, offsets = normalize_text(original)
+    assert normalized == "Call John Griffin today"
+
+    found = EntityBatch(normalized)
+    found.append("PERSON", 5, 17, 1.0)  # "John Griffin"
+    found.append("PERSON", 10, 14, 1.0)  # "Grif", ends inside the ligature
+    offsets.remap(found, original)
+    (_, s1, e1, _), (_, s2, e2, _) = found.spans()
+
+    # The zero-width space after the name stays outside the span
+    assert original[s1:e1] == "Jo\u00adhn Gri\ufb03n"
+    # A span ending inside a ligature covers all of it
+    assert original[s2:e2] == "Gri\ufb03"
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pipeline_maps_detections_back_to_the_noisy_original(seed):
+    noisy = noisy_text(random.Random(seed), 60, rate=0.2)
+    pipeline = PIIPipeline(detector=StubDetector(), normalize=True)
+    _, entities = pipeline.run(noisy.text)
+
+    planted = {(s, e) for t, s, e in noisy.spans if t == "EMAIL_ADDRESS"}
+    found = {(s, e) for t, s, e, _ in entities.spans() if t == "EMAIL_ADDRESS"}
+    assert planted
+    assert found == planted
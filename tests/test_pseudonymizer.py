@@ -0,0 +1,89 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from app.core.pipeline import PIIPipeline
+from app.services.file_extractors.csv_parallel import detect_columns, redact_cells, shutdown_pool
+from app.services.pseudonymizer import DeferredScope, PseudonymScope, Pseudonymizer, SqliteTokenMap
+from benchmarks.stubs import StubDetector
+
+CELLS = [
+    "Call John Smith at john.smith@example.com",
+    None,
+    "Mary Jones spoke to John Smith",
+    "   ",
+    "Mary Jones: mary.jones@example.com, JOHN SMITH",
+]
+
+
+@pytest.fixture
+def pipeline():
+    return PIIPipeline(detector=StubDetector())
+
+
+def test_same_value_same_token_across_sqlite_connections(tmp_path):
+    path = str(tmp_path / "tokens.sqlite")
+    first, second = SqliteTokenMap(path), SqliteTokenMap(path)
+    try:
+        a = PseudonymScope("tenant:acme", b"secret", first)
+        b = PseudonymScope("tenant:acme", b"secret", second)
+        assert a.token("PERSON", "John Smith") == "[NAME_1]"
+        assert b.token("PERSON", "john  smith") == "[NAME_1]"
+        assert b.token("PERSON", "Mary Jones") == "[NAME_2]"
+        assert a.token("PERSON", "Mary Jones") == "[NAME_2]"
+        # Numbering is per scope
+        assert PseudonymScope("tenant:other", b"secret", second).token("PERSON", "Mary Jones") == "[NAME_1]"
+    finally:
+        first.close()
+        second.close()
+
+
+def test_concurrent_connections_never_share_a_number(tmp_path):
+    path = str(tmp_path / "tokens.sqlite")
+    maps = [SqliteTokenMap(path) for _ in range(4)]
+    tokens = [{} for _ in maps]
+
+    def assign(i):
+        scope = PseudonymScope("tenant:acme", b"secret", maps[i])
+        for n in range(50):
+            tokens[i][n] = scope.token("PERSON", f"Person {n}")
+
+    threads = [threading.Thread(target=assign, args=(i,)) for i in range(len(maps))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for m in maps:
+        m.close()
+
+    assert all(t == tokens[0] for t in tokens)
+    assert len(set(tokens[0].values())) == 50
+
+
+def test_deferred_placeholders_resolve_like_direct_tokens(pipeline):
+    direct, direct_count = redact_cells(pipeline, CELLS, None, Pseudonymizer(secret="x").document_scope())
+
+    deferred = DeferredScope()
+    cells, count = redact_cells(pipeline, CELLS, None, deferred)
+    scope = Pseudonymizer(secret="x").document_scope()
+    resolved = [scope.resolve(cell, deferred.pending) if cell else cell for cell in cells]
+
+    assert resolved == direct
+    assert count == direct_count
+    assert "[NAME_1]" in resolved[0] and resolved[0].count("[NAME_1]") == 1
+    # No placeholder survives
+    assert not any("\ue000" in cell for cell in resolved if cell)
+
+
+def test_csv_workers_resolve_placeholders_in_cells(pipeline):
+    frames = [pd.DataFrame({"notes": CELLS * 10, "id": range(50)}) for _ in range(2)]
+    counts = []
+    for df, workers in zip(frames, (0, 2)):
+        scope = Pseudonymizer(secret="x").document_scope()
+        counts.append(detect_columns(df, ["notes"], pipeline, workers=workers, block_rows=7, pseudonyms=scope))
+    shutdown_pool()
+
+    assert counts[0] == counts[1]
+    assert frames[1]["notes"].tolist() == frames[0]["notes"].tolist()
+    assert frames[1]["notes"].isna().sum() == 10
@@ -0,0 +1,63 @@
+import random
+
+from app.core.config import MIN_TRIMMED_SPAN
+from app.services.detector import resolve_overlaps
+from app.services.entities import EntityBatch
+
+
+def _resolve(text, spans):
+    batch = EntityBatch(text)
+    for entity_type, start, end, score in spans:
+        batch.append(entity_type, start, end, score)
+    return [(t, s, e) for t, s, e, _ in resolve_overlaps(text, batch).spans()]
+
+
+def _covered(spans):
+    return {i for _, s, e in spans for i in range(s, e)}
+
+
+def test_nested_winner_keeps_head_and_tail_of_enclosing_span():
+    text = "Acme Insurance Company of New York"
+    out = _resolve(text, [("ORGANIZATION", 0, 34, 0.8), ("PERSON", 0, 4, 0.9)])
+    assert ("PERSON", 0, 4) in out
+    assert ("ORGANIZATION", 4, 34) in out
+    assert _covered(out) == set(range(34))
+
+
+def test_enclosing_address_keeps_text_after_inner_name():
+    text = "Mailing address 221 Baker Street John Smith Springfield IL 62704"
+    out = _resolve(text, [("ADDRESS", 16, 64, 0.8), ("PERSON", 33, 43, 0.9)])
+    assert ("PERSON", 33, 43) in out
+    assert any(t == "ADDRESS" and s <= 44 and e == 64 for t, s, e in out)
+    assert set(range(44, 64)) <= _covered(out)
+
+
+def test_three_way_overlap_never_overlaps():
+    text = "123-45-6789 Acme Co John"
+    out = _resolve(text, [
+        ("US_SSN", 0, 10, 0.9),
+        ("ORGANIZATION", 5, 20, 0.9),
+        ("PERSON", 8, 12, 0.9),
+    ])
+    out.sort(key=lambda s: s[1])
+    for (_, _, end), (_, start, _) in zip(out, out[1:]):
+        assert end <= start
+    assert ("US_SSN", 0, 10) in out
+    assert set(range(0, 20)) <= _covered(out)
+
+
+def test_random_overlaps_are_disjoint_and_cover_input():
+    rng = random.Random(7)
+    types = ["US_SSN", "PERSON", "ADDRESS", "ORGANIZATION", "EMAIL_ADDRESS"]
+    text = "".join(rng.choice("abcdefgh") for _ in range(200))
+    for _ in range(200):
+        spans = []
+        for _ in range(rng.randint(1, 8)):
+            s = rng.randrange(190)
+            spans.append((rng.choice(types), s, s + rng.randint(1, 40), rng.random()))
+        out = sorted(_resolve(text, spans), key=lambda s: s[1])
+        for (_, _, end), (_, start, _) in zip(out, out[1:]):
+            assert end <= start
+        # Nothing detected is left uncovered except trimmed slivers
+        missing = _covered((t, s, min(e, 200)) for t, s, e, _ in spans) - _covered(out)
+        assert len(missing) < MIN_TRIMMED_SPAN * 2 * len(spans)
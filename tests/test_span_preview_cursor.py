@@ -0,0 +1,32 @@
+import base64
+import json
+
+import pytest
+
+from app.utils.span_preview import CursorError, decode_cursor, encode_cursor
+
+KEY = "pdf:exact:" + "ab" * 32
+
+
+def test_cursor_round_trips_for_the_same_client():
+    cursor = encode_cursor(KEY, "pdf", 3, 2, ["PERSON"], "10.0.0.1")
+    state = decode_cursor(cursor, "10.0.0.1")
+    assert (state["key"], state["start"], state["window"], state["selected_entities"]) == (KEY, 3, 2, ["PERSON"])
+
+
+def test_cursor_is_bound_to_the_client():
+    cursor = encode_cursor(KEY, "pdf", 3, 2, None, "10.0.0.1")
+    with pytest.raises(CursorError):
+        decode_cursor(cursor, "10.0.0.2")
+
+
+def test_forged_and_tampered_cursors_are_rejected():
+    payload = {"k": KEY, "u": "pdf", "i": 0, "w": 1, "s": None}
+    forged = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+    with pytest.raises(CursorError):
+        decode_cursor(forged, "10.0.0.1")
+
+    body, signature = encode_cursor(KEY, "pdf", 3, 2, None, "10.0.0.1").split(".")
+    other = encode_cursor("pdf:exact:" + "cd" * 32, "pdf", 0, 2, None, "10.0.0.1").split(".")[0]
+    with pytest.raises(CursorError):
+        decode_cursor(f"{other}.{signature}", "10.0.0.1")